@@ -7,6 +7,7 @@ from sqlmodel import SQLModel
 from alembic import context
 
 # These imports are needed for migrations
+from common.db.models import Heartbeat
 from users.models import *
 from events.models import *
 from participations.models import *
@@ -0,0 +1,61 @@
+"""participation status
+
+Revision ID: 03fa4fa47ee7
+Revises: 78a5c920c075
+Create Date: 2026-10-19 02:40:49.865433
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "03fa4fa47ee7"
+down_revision: Union[str, Sequence[str], None] = "78a5c920c075"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Values of participations.models.ParticipationStatus
+CONFIRMED, PENDING, WAIT_LIST = 1, 2, 3
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("participation", sa.Column("status", sa.SmallInteger()))
+    # A row with no flag set is in an impossible state, it is kept in the waiting
+    # list rather than lost
+    op.execute(
+        "UPDATE participation SET status = CASE "
+        f"WHEN confirmed THEN {CONFIRMED} "
+        f"WHEN pending THEN {PENDING} "
+        f"ELSE {WAIT_LIST} END"
+    )
+    with op.batch_alter_table("participation") as batch_op:
+        batch_op.alter_column("status", existing_type=sa.SmallInteger(), nullable=False)
+        batch_op.drop_column("confirmed")
+        batch_op.drop_column("pending")
+        batch_op.drop_column("wait_list")
+        batch_op.create_index(
+            "ix_participation_line_status",
+            ["representation_id", "offer_id", "status", "waiting_at"],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("participation") as batch_op:
+        batch_op.drop_index("ix_participation_line_status")
+        for flag in ("confirmed", "pending", "wait_list"):
+            batch_op.add_column(
+                sa.Column(flag, sa.Boolean(), server_default=sa.false(), nullable=False)
+            )
+    op.execute(
+        "UPDATE participation SET "
+        f"confirmed = status = {CONFIRMED}, "
+        f"pending = status = {PENDING}, "
+        f"wait_list = status = {WAIT_LIST}"
+    )
+    with op.batch_alter_table("participation") as batch_op:
+        batch_op.drop_column("status")
@@ -0,0 +1,62 @@
+"""participation outbox
+
+Revision ID: 4c1e7a9d2b6f
+Revises: dd18d9f77c6d
+Create Date: 2026-10-19 09:12:41.508213
+
+"""
+
+from typing import Sequence, Union
+
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+from common.db.models import UUIDString
+from config import COMPACT_KEYS
+
+# revision identifiers, used by Alembic.
+revision: str = "4c1e7a9d2b6f"
+down_revision: Union[str, Sequence[str], None] = "dd18d9f77c6d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "participation_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("participation_id", sa.Integer(), nullable=False),
+        # Same storage as the user ids (see COMPACT_KEYS)
+        sa.Column("user_id", UUIDString(compact=COMPACT_KEYS), nullable=False),
+        sa.Column(
+            "representation_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False
+        ),
+        sa.Column("offer_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("from_status", sa.SmallInteger(), nullable=True),
+        sa.Column("to_status", sa.SmallInteger(), nullable=True),
+        sa.Column(
+            "reason", sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        # The ids are never reused, even once the outbox is pruned
+        sqlite_autoincrement=True,
+    )
+    op.create_table(
+        "outbox_offset",
+        sa.Column(
+            "consumer", sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False
+        ),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("consumer"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("outbox_offset")
+    op.drop_table("participation_outbox")
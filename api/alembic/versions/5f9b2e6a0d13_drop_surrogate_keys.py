@@ -0,0 +1,40 @@
+"""drop surrogate keys
+
+Revision ID: 5f9b2e6a0d13
+Revises: e3a5c8d17f42
+Create Date: 2026-10-19 14:52:40.117864
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5f9b2e6a0d13"
+down_revision: Union[str, Sequence[str], None] = "e3a5c8d17f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The integer keys added by the compact keys migration, referenced by nothing
+SURROGATE_TABLES = ("offer", "representation")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in SURROGATE_TABLES:
+        op.drop_index(op.f(f"ix_{table}_seq"), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("seq")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in SURROGATE_TABLES:
+        op.add_column(table, sa.Column("seq", sa.Integer(), nullable=True))
+        op.execute(
+            f"UPDATE {table} SET seq = "
+            f"(SELECT COUNT(*) FROM {table} AS other WHERE other.id <= {table}.id)"
+        )
+        op.create_index(op.f(f"ix_{table}_seq"), table, ["seq"], unique=True)
@@ -0,0 +1,75 @@
+"""compact keys
+
+Revision ID: 6be0c1f98f64
+Revises: fbb360f473a5
+Create Date: 2026-10-19 02:52:21.622999
+
+"""
+
+from typing import Callable, Sequence, Union
+from uuid import UUID
+
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+from config import COMPACT_KEYS
+
+# revision identifiers, used by Alembic.
+revision: str = "6be0c1f98f64"
+down_revision: Union[str, Sequence[str], None] = "fbb360f473a5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SURROGATE_TABLES = ("offer", "representation")
+USER_ID_COLUMNS = (("user", "id"), ("participation", "user_id"))
+
+
+def compact_user_ids() -> bool:
+    # PostgreSQL already stores them in native uuid columns
+    return COMPACT_KEYS and op.get_bind().dialect.name != "postgresql"
+
+
+def convert_user_ids(type_: sa.types.TypeEngine, convert: Callable) -> None:
+    bind = op.get_bind()
+    for table, column in USER_ID_COLUMNS:
+        # The values are converted before the type, as the copy of the table made
+        # by the batch operation casts them
+        ids = bind.execute(
+            sa.text(f'SELECT DISTINCT {column} FROM "{table}"')
+        ).scalars()
+        updates = [{"old": value, "new": convert(value)} for value in ids]
+        if updates:
+            bind.execute(
+                sa.text(f'UPDATE "{table}" SET {column} = :new WHERE {column} = :old'),
+                updates,
+            )
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, type_=type_, existing_nullable=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in SURROGATE_TABLES:
+        op.add_column(table, sa.Column("seq", sa.Integer(), nullable=True))
+        # Number the existing rows in the order of their public ids
+        op.execute(
+            f"UPDATE {table} SET seq = "
+            f"(SELECT COUNT(*) FROM {table} AS other WHERE other.id <= {table}.id)"
+        )
+        op.create_index(op.f(f"ix_{table}_seq"), table, ["seq"], unique=True)
+    if compact_user_ids():
+        convert_user_ids(sa.LargeBinary(16), lambda value: UUID(value).bytes)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if compact_user_ids():
+        convert_user_ids(
+            sqlmodel.sql.sqltypes.AutoString(),
+            lambda value: str(UUID(bytes=value)),
+        )
+    for table in SURROGATE_TABLES:
+        op.drop_index(op.f(f"ix_{table}_seq"), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("seq")
@@ -0,0 +1,35 @@
+"""add version columns
+
+Revision ID: 78a5c920c075
+Revises: 02fe4c08c914
+Create Date: 2026-10-19 02:38:10.484069
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "78a5c920c075"
+down_revision: Union[str, Sequence[str], None] = "02fe4c08c914"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("inventory", "participation"):
+        op.add_column(
+            table,
+            sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("participation", "inventory"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("version")
@@ -0,0 +1,33 @@
+"""heartbeat
+
+Revision ID: 899c6b79b825
+Revises: 6be0c1f98f64
+Create Date: 2026-10-19 02:57:38.945620
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "899c6b79b825"
+down_revision: Union[str, Sequence[str], None] = "6be0c1f98f64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "heartbeat",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("beat_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("heartbeat")
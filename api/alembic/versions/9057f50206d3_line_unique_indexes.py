@@ -0,0 +1,40 @@
+"""line unique indexes
+
+Revision ID: 9057f50206d3
+Revises: 03fa4fa47ee7
+Create Date: 2026-10-19 02:42:34.360807
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9057f50206d3"
+down_revision: Union[str, Sequence[str], None] = "03fa4fa47ee7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "uq_inventory_line",
+        "inventory",
+        ["representation_id", "offer_id"],
+        unique=True,
+    )
+    op.create_index(
+        "uq_participation_user_line",
+        "participation",
+        ["user_id", "representation_id", "offer_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_participation_user_line", table_name="participation")
+    op.drop_index("uq_inventory_line", table_name="inventory")
@@ -0,0 +1,48 @@
+"""export job
+
+Revision ID: a8d4f1c6e290
+Revises: 5f9b2e6a0d13
+Create Date: 2026-10-19 15:18:52.604127
+
+"""
+
+from typing import Sequence, Union
+
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a8d4f1c6e290"
+down_revision: Union[str, Sequence[str], None] = "5f9b2e6a0d13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "export_job",
+        sa.Column("id", sqlmodel.sql.sqltypes.AutoString(length=32), nullable=False),
+        sa.Column("event_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "export_format", sqlmodel.sql.sqltypes.AutoString(length=8), nullable=False
+        ),
+        sa.Column(
+            "list_filter", sqlmodel.sql.sqltypes.AutoString(length=16), nullable=True
+        ),
+        sa.Column(
+            "status", sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False
+        ),
+        sa.Column("rows", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("error", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("export_job")
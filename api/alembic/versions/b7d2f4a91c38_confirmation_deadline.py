@@ -0,0 +1,94 @@
+"""confirmation deadline
+
+Revision ID: b7d2f4a91c38
+Revises: 4c1e7a9d2b6f
+Create Date: 2026-10-19 10:03:27.194652
+
+"""
+
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import CONFIRMATION_WINDOW
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2f4a91c38"
+down_revision: Union[str, Sequence[str], None] = "4c1e7a9d2b6f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Value of participations.models.ParticipationStatus.PENDING
+PENDING = 2
+
+offer = sa.table(
+    "offer",
+    sa.column("id", sa.String()),
+    sa.column("confirmation_window", sa.Integer()),
+)
+participation = sa.table(
+    "participation",
+    sa.column("id", sa.Integer()),
+    sa.column("offer_id", sa.String()),
+    sa.column("status", sa.SmallInteger()),
+    sa.column("pending_at", sa.DateTime()),
+    sa.column("pending_expires_at", sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "offer",
+        sa.Column(
+            "confirmation_window",
+            sa.Integer(),
+            server_default=str(CONFIRMATION_WINDOW),
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "participation", sa.Column("pending_expires_at", sa.DateTime(), nullable=True)
+    )
+    # The participations pending before the migration get the window of their
+    # offer, the former hour unless CONFIRMATION_WINDOW is set
+    connection = op.get_bind()
+    pending = connection.execute(
+        sa.select(
+            participation.c.id, participation.c.pending_at, offer.c.confirmation_window
+        )
+        .join(offer, offer.c.id == participation.c.offer_id)
+        .where(
+            participation.c.status == PENDING,
+            participation.c.pending_at.is_not(None),
+        )
+    ).all()
+    if pending:
+        connection.execute(
+            participation.update()
+            .where(participation.c.id == sa.bindparam("participation_id"))
+            .values(pending_expires_at=sa.bindparam("expires_at")),
+            [
+                {
+                    "participation_id": participation_id,
+                    "expires_at": pending_at + timedelta(seconds=window),
+                }
+                for participation_id, pending_at, window in pending
+            ],
+        )
+    op.create_index(
+        "ix_participation_pending_expiry",
+        "participation",
+        ["status", "pending_expires_at"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_participation_pending_expiry", table_name="participation")
+    with op.batch_alter_table("participation") as batch_op:
+        batch_op.drop_column("pending_expires_at")
+    with op.batch_alter_table("offer") as batch_op:
+        batch_op.drop_column("confirmation_window")
@@ -0,0 +1,32 @@
+"""archive confirmation deadline
+
+Revision ID: c94e1b7f3a25
+Revises: a8d4f1c6e290
+Create Date: 2026-10-19 15:52:08.317640
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c94e1b7f3a25"
+down_revision: Union[str, Sequence[str], None] = "a8d4f1c6e290"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "participation_archive",
+        sa.Column("pending_expires_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("participation_archive") as batch_op:
+        batch_op.drop_column("pending_expires_at")
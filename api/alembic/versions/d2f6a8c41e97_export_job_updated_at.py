@@ -0,0 +1,45 @@
+"""export job updated at
+
+Revision ID: d2f6a8c41e97
+Revises: c94e1b7f3a25
+Create Date: 2026-10-19 17:21:40.918254
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f6a8c41e97"
+down_revision: Union[str, Sequence[str], None] = "c94e1b7f3a25"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+export_job = sa.table(
+    "export_job",
+    sa.column("created_at", sa.DateTime()),
+    sa.column("finished_at", sa.DateTime()),
+    sa.column("updated_at", sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("export_job", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.execute(
+        export_job.update().values(
+            updated_at=sa.func.coalesce(
+                export_job.c.finished_at, export_job.c.created_at
+            )
+        )
+    )
+    with op.batch_alter_table("export_job") as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("export_job") as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,75 @@
+"""participation archive
+
+Revision ID: dd18d9f77c6d
+Revises: 899c6b79b825
+Create Date: 2026-10-19 03:00:13.032705
+
+"""
+
+from typing import Sequence, Union
+
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+from common.db.models import UUIDString
+from config import COMPACT_KEYS
+
+# revision identifiers, used by Alembic.
+revision: str = "dd18d9f77c6d"
+down_revision: Union[str, Sequence[str], None] = "899c6b79b825"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "participation_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("period", sqlmodel.sql.sqltypes.AutoString(length=7), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.Column("status", sa.SmallInteger(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("confirmed_at", sa.DateTime(), nullable=True),
+        sa.Column("pending_at", sa.DateTime(), nullable=True),
+        sa.Column("waiting_at", sa.DateTime(), nullable=True),
+        # Same storage as the user ids (see COMPACT_KEYS)
+        sa.Column("user_id", UUIDString(compact=COMPACT_KEYS), nullable=False),
+        sa.Column("offer_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "representation_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ["offer_id"],
+            ["offer.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["representation_id"],
+            ["representation.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_participation_archive_user_period",
+        "participation_archive",
+        ["user_id", "period"],
+    )
+    op.create_index(
+        "ix_participation_archive_period", "participation_archive", ["period"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_participation_archive_period", table_name="participation_archive"
+    )
+    op.drop_index(
+        "ix_participation_archive_user_period", table_name="participation_archive"
+    )
+    op.drop_table("participation_archive")
@@ -0,0 +1,53 @@
+"""native uuid columns
+
+Revision ID: fbb360f473a5
+Revises: 9057f50206d3
+Create Date: 2026-10-19 02:47:12.514846
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "fbb360f473a5"
+down_revision: Union[str, Sequence[str], None] = "9057f50206d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def alter_user_ids(type_: sa.types.TypeEngine, using: str) -> None:
+    op.drop_constraint(
+        "participation_user_id_fkey", "participation", type_="foreignkey"
+    )
+    op.alter_column(
+        "user", "id", type_=type_, postgresql_using=f"id::{using}", nullable=False
+    )
+    op.alter_column(
+        "participation",
+        "user_id",
+        type_=type_,
+        postgresql_using=f"user_id::{using}",
+        nullable=False,
+    )
+    op.create_foreign_key(
+        "participation_user_id_fkey", "participation", "user", ["user_id"], ["id"]
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite has no UUID type, the ids stay strings there
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    alter_user_ids(postgresql.UUID(as_uuid=False), "uuid")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    alter_user_ids(sa.String(), "varchar")
@@ -1,10 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from participations.routes import router as participations_router
 from users.routes import router as users_router
 from events.routes import router as events_router
+from common.routes import router as common_router
+from waiting_room.routes import router as waiting_room_router
+from waiting_room.room import WaitingRoomMiddleware, waiting_room
+from common.ratelimit import (
+    RateLimitMiddleware,
+    admission_controller,
+    rate_limiter,
+)
+from common.prewarm import warm_up
+from events.export import exporter
+from participations.bulk_cancel import bulk_canceller
+from participations import notifications
+from common.db.replica import get_replica_router
+from config import get_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the engine of the database when the app starts rather than when it is
+    imported, warm the worker up in the background (see common.prewarm), start
+    measuring the lag of the read replica, and close the connections and the export
+    processes, once the bulk cancellations are over and the queued notifications
+    are sent, when it stops
+    """
+    engine = get_engine()
+    replica_router = get_replica_router()
+    replica_router.start()
+    warming_up = asyncio.create_task(asyncio.to_thread(warm_up, engine))
+    yield
+    await warming_up
+    replica_router.shutdown(timeout=10)
+    bulk_canceller.shutdown(timeout=10)
+    exporter.shutdown()
+    if notifications.dispatcher is not None:
+        notifications.dispatcher.shutdown(timeout=10)
+    engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(WaitingRoomMiddleware, room=waiting_room)
+app.add_middleware(
+    RateLimitMiddleware, limiter=rate_limiter, admission=admission_controller
+)
 
 app.include_router(participations_router)
 app.include_router(users_router)
 app.include_router(events_router)
+app.include_router(common_router)
+app.include_router(waiting_room_router)
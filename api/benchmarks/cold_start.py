@@ -0,0 +1,117 @@
+"""
+Latency of the first requests of a freshly started server, with and without the
+warm up of common.prewarm.
+
+For each round, a server is started on a fresh copy of the test database with
+one line of an upcoming representation, and the first join-event and
+check-waiting-status requests are timed once /ready answers. The database file
+stays in the page cache of the system between the rounds: what is measured is
+the cost of the connections, of the statements and of the SQLite page cache of
+the connections.
+
+Usage (from the api folder):
+    python -m benchmarks.cold_start --rounds 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+from sqlmodel import Session
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from participations.models import Participation, ParticipationStatus
+
+
+def wait_until_ready(base_url: str, timeout: float = 30) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if httpx.get(f"{base_url}/ready").status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"The server at {base_url} did not get ready")
+
+
+def timed_post(client: httpx.Client, path: str, payload: dict) -> float:
+    start = time.perf_counter()
+    client.post(path, json=payload).raise_for_status()
+    return time.perf_counter() - start
+
+
+def bench(prewarm: bool, port: int) -> dict:
+    url = temporary_database()
+    engine = sqlite_engine(url)
+    (buyer, waiting), representation_id, offer_id = seed_line(engine, 2, stock=1)
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    with Session(engine) as session:
+        session.add(
+            Participation(
+                user_id=waiting,
+                quantity=1,
+                status=ParticipationStatus.WAIT_LIST,
+                waiting_at=datetime.now(),
+                **line,
+            )
+        )
+        session.commit()
+    engine.dispose()
+    env = {**os.environ, "DB_URL": url, "WEB_CONCURRENCY": "1", "PORT": str(port)}
+    env.update(
+        PREWARM=str(prewarm).lower(),
+        RATE_LIMIT_STORE="none",
+        ADMISSION_MAX_IN_FLIGHT="0",
+    )
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+        ready = time.perf_counter() - start
+        with httpx.Client(base_url=base_url) as client:
+            join = timed_post(
+                client,
+                "/participations/join-event",
+                {"user_id": buyer, "quantity": 1, **line},
+            )
+            rank = timed_post(
+                client,
+                "/participations/check-waiting-status",
+                {"user_id": waiting, **line},
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    os.remove(url.removeprefix("sqlite:///"))
+    return {"ready": ready, "join-event": join, "check-waiting-status": rank}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    for prewarm in (False, True):
+        rounds = [bench(prewarm, args.port) for _ in range(args.rounds)]
+        medians = {
+            name: statistics.median(result[name] for result in rounds)
+            for name in rounds[0]
+        }
+        print(
+            f"{'with' if prewarm else 'without'} warm up: "
+            + ", ".join(
+                f"{name} {value * 1000:.1f} ms" for name, value in medians.items()
+            )
+        )
@@ -0,0 +1,128 @@
+"""
+Index size and join latency of the participation keys, before and after their
+compaction.
+
+The participation table of the app is reproduced in an in-memory SQLite database
+for each key layout: user ids as 36 characters strings or as 16 bytes
+(COMPACT_KEYS), and lines referenced by their public string ids or by the
+integer surrogate keys of the offers and representations. The size of each
+index is read from dbstat, and the latency is the one of the join of the
+participations of a user with the user, the offer and the representation.
+
+Usage (from the api folder):
+    python -m benchmarks.compact_keys --users 50000 --lines 200
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from uuid import UUID, uuid4
+
+INDEXES = ("uq_participation_user_line", "ix_participation_line_status")
+
+
+def build(
+    user_ids: list[UUID], lines: int, compact_users: bool, surrogate_lines: bool
+) -> sqlite3.Connection:
+    user_type = "BLOB" if compact_users else "VARCHAR"
+    line_type = "INTEGER" if surrogate_lines else "VARCHAR"
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(f"""
+        CREATE TABLE user (id {user_type} PRIMARY KEY, email VARCHAR);
+        CREATE TABLE offer (id {line_type} PRIMARY KEY, name VARCHAR);
+        CREATE TABLE representation (id {line_type} PRIMARY KEY, name VARCHAR);
+        CREATE TABLE participation (
+            id INTEGER PRIMARY KEY, user_id {user_type},
+            representation_id {line_type}, offer_id {line_type},
+            status SMALLINT, waiting_at DATETIME
+        );
+        """)
+
+    def line_id(prefix: str, index: int) -> int | str:
+        return index if surrogate_lines else f"{prefix}_{index:03d}"
+
+    def user_key(user_id: UUID) -> bytes | str:
+        return user_id.bytes if compact_users else str(user_id)
+
+    connection.executemany(
+        "INSERT INTO user VALUES (?, 'bench@test.com')",
+        [(user_key(user_id),) for user_id in user_ids],
+    )
+    for table, prefix in (("offer", "off"), ("representation", "rep")):
+        connection.executemany(
+            f"INSERT INTO {table} VALUES (?, ?)",
+            [(line_id(prefix, i), table) for i in range(lines)],
+        )
+    rows = {
+        (user_id, random.randrange(lines), random.randrange(lines))
+        for user_id in user_ids
+        for _ in range(4)
+    }
+    connection.executemany(
+        "INSERT INTO participation "
+        "(user_id, representation_id, offer_id, status, waiting_at) "
+        "VALUES (?, ?, ?, 3, '2025-01-01 10:00:00')",
+        [
+            (user_key(user_id), line_id("rep", rep), line_id("off", off))
+            for user_id, rep, off in rows
+        ],
+    )
+    connection.executescript("""
+        CREATE UNIQUE INDEX uq_participation_user_line
+            ON participation (user_id, representation_id, offer_id);
+        CREATE INDEX ix_participation_line_status
+            ON participation (representation_id, offer_id, status, waiting_at);
+        ANALYZE;
+        """)
+    return connection
+
+
+def bench(
+    user_ids: list[UUID], lines: int, compact_users: bool, surrogate_lines: bool
+) -> dict:
+    random.seed(0)
+    connection = build(user_ids, lines, compact_users, surrogate_lines)
+    sizes = dict(
+        connection.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+    )
+    query = (
+        "SELECT COUNT(*) FROM participation "
+        "JOIN user ON user.id = participation.user_id "
+        "JOIN offer ON offer.id = participation.offer_id "
+        "JOIN representation ON representation.id = participation.representation_id "
+        "WHERE participation.user_id = ?"
+    )
+    sample = user_ids[:5000]
+    start = time.perf_counter()
+    for user_id in sample:
+        key = user_id.bytes if compact_users else str(user_id)
+        connection.execute(query, (key,)).fetchone()
+    elapsed = time.perf_counter() - start
+    return {
+        "user ids": "16 bytes" if compact_users else "36 chars",
+        "line ids": "integer" if surrogate_lines else "string",
+        **{f"{name} KiB": sizes[name] / 1024 for name in INDEXES},
+        "join µs": elapsed / len(sample) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+    user_ids = [uuid4() for _ in range(args.users)]
+    for compact_users in (False, True):
+        for surrogate_lines in (False, True):
+            result = bench(user_ids, args.lines, compact_users, surrogate_lines)
+            print(
+                " | ".join(
+                    (
+                        f"{key}: {value:.1f}"
+                        if isinstance(value, float)
+                        else f"{key}: {value}"
+                    )
+                    for key, value in result.items()
+                )
+            )
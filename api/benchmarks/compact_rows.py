@@ -0,0 +1,129 @@
+"""
+Memory and time per row of the participation listing of an event.
+
+An event is seeded with one participation per user. Its listing is loaded as the
+ORM path of GET /events/{id}/participations does, the Participation instances
+with their lazy loaded relationships then the ParticipationSerializer models the
+response is validated into, then as the rows of the statement, then as the
+compact rows of participations.rows. The memory held by each result set is
+measured with tracemalloc, on a fresh copy of the test database.
+
+Usage (from the api folder):
+    python -m benchmarks.compact_rows --rows 1000 10000
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlmodel import Session, insert, select
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from events.models import Representation
+from participations.models import Participation, ParticipationStatus
+from participations.rows import (
+    PARTICIPATION_ROWS,
+    event_conditions,
+    event_participation_rows,
+)
+from participations.serializers import ParticipationSerializer
+
+
+def seed(engine: Engine, rows: int) -> str:
+    """
+    Create an event with one confirmed participation per user
+    :return: The id of the event
+    """
+    user_ids, representation_id, offer_id = seed_line(engine, rows, stock=rows)
+    with Session(engine) as session:
+        session.exec(
+            insert(Participation),
+            params=[
+                {
+                    "user_id": user_id,
+                    "representation_id": representation_id,
+                    "offer_id": offer_id,
+                    "status": ParticipationStatus.CONFIRMED,
+                    "confirmed_at": datetime(2025, 1, 1),
+                    "quantity": 1,
+                    "version": 1,
+                }
+                for user_id in user_ids
+            ],
+        )
+        session.commit()
+        return session.get(Representation, representation_id).event_id
+
+
+def orm(session: Session, event_id: str) -> list:
+    participations = session.exec(
+        select(Participation)
+        .join(Representation)
+        .where(Representation.event_id == event_id)
+    ).all()
+    return [
+        ParticipationSerializer.from_orm(participation)
+        for participation in participations
+    ]
+
+
+def statement_rows(session: Session, event_id: str) -> list:
+    return session.exec(
+        PARTICIPATION_ROWS.where(*event_conditions(event_id, None))
+    ).all()
+
+
+def measure(
+    engine: Engine, event_id: str, load: Callable[[Session, str], list]
+) -> dict:
+    """
+    Load a listing in a new session, timed, then again in a new session, traced
+    :return: The bytes held per row once it is loaded, the peak bytes per row while
+    it is loaded, and the time per row
+    """
+    with Session(engine) as session:
+        start = time.perf_counter()
+        result = load(session, event_id)
+        elapsed = time.perf_counter() - start
+    del result
+    with Session(engine) as session:
+        gc.collect()
+        tracemalloc.start()
+        result = load(session, event_id)
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "held": held / len(result),
+            "peak": peak / len(result),
+            "time": elapsed / len(result),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+    paths = {
+        "orm": orm,
+        "statement rows": statement_rows,
+        "compact rows": event_participation_rows,
+    }
+    for row_count in args.rows:
+        url = temporary_database()
+        engine = sqlite_engine(url)
+        event_id = seed(engine, row_count)
+        for name, load in paths.items():
+            # Warm up, then measure
+            measure(engine, event_id, load)
+            result = measure(engine, event_id, load)
+            print(
+                f"{row_count} rows, {name}: {result['held']:.0f} B/row held, "
+                f"{result['peak']:.0f} B/row peak, {result['time'] * 1e6:.1f} µs/row"
+            )
+        engine.dispose()
+        os.remove(url.removeprefix("sqlite:///"))
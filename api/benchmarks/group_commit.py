@@ -0,0 +1,80 @@
+"""
+Throughput of the waiting list joins, with and without group commit.
+
+Concurrent clients add every user to the waiting list of a sold out line, on a
+fresh copy of the test database: first each join in its own transaction, then
+through the group commit writer (see common.db.group_commit). The joins per
+second are reported.
+
+Usage (from the api folder):
+    python -m benchmarks.group_commit --users 2000 --clients 32
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+
+from benchmarks.utils import seed_line, temporary_database
+from common.db.engine import setup_sqlite_transactions
+from common.db.group_commit import GroupCommitWriter
+from common.db.locks import line_lock
+from participations.routes import add_to_waiting_list
+
+
+def bench(
+    group_commit: bool, users: int, clients: int, synchronous: str, max_delay: float
+) -> float:
+    url = temporary_database()
+    # A connection per client, as in the server
+    engine = create_engine(url, connect_args={"timeout": 30}, pool_size=clients)
+    setup_sqlite_transactions(engine, "WAL")
+
+    @event.listens_for(engine, "connect")
+    def set_synchronous(dbapi_connection, connection_record) -> None:
+        dbapi_connection.execute(f"PRAGMA synchronous={synchronous}")
+
+    user_ids, representation_id, offer_id = seed_line(engine, users, stock=0)
+    line = (representation_id, offer_id)
+    writer = GroupCommitWriter(engine, max_batch=256, max_delay=max_delay)
+
+    def join(user_id: str) -> None:
+        data_dict = {
+            "user_id": user_id,
+            "representation_id": representation_id,
+            "offer_id": offer_id,
+            "quantity": 1,
+        }
+        if group_commit:
+            writer.submit(line, lambda session: add_to_waiting_list(session, data_dict))
+            return
+        with Session(engine) as session:
+            line_lock(session, *line)
+            add_to_waiting_list(session, data_dict)
+            session.commit()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(join, user_ids))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    os.remove(url.removeprefix("sqlite:///"))
+    return users / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--synchronous", default="FULL")
+    parser.add_argument("--max-delay", type=float, default=0.002)
+    args = parser.parse_args()
+    for group_commit in (False, True):
+        joins_per_second = bench(
+            group_commit, args.users, args.clients, args.synchronous, args.max_delay
+        )
+        name = "group commit" if group_commit else "one commit per join"
+        print(f"{name}: {joins_per_second:.0f} joins/s")
@@ -0,0 +1,132 @@
+"""
+Multi-process stress test of the server mode (serve.py).
+
+For each number of workers, a server is started on a fresh copy of the test
+database, then concurrent clients buy every ticket of one line, the users left
+without ticket join the waiting list, check their rank, and part of the buyers
+cancel. The throughput is reported, and the final state of the line is checked
+against the inventory: nothing may be oversold or promoted twice.
+
+Usage (from the api folder):
+    python -m benchmarks.multiworker_stress --workers 1 2 4 --users 400
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from sqlmodel import Session, func, select
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from events.models import Inventory
+from participations.models import Participation, ParticipationStatus
+
+
+def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/events/")
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server at {base_url} did not start")
+
+
+def run_phase(
+    base_url: str, path: str, payloads: list[dict], clients: int
+) -> tuple[float, list[int]]:
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+
+        def post(payload: dict) -> int:
+            return client.post(path, json=payload).status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            codes = list(pool.map(post, payloads))
+        return time.perf_counter() - start, codes
+
+
+def check_line(url: str, stock: int, cancelled: int) -> None:
+    with Session(sqlite_engine(url)) as session:
+        available = session.exec(select(Inventory.available_stock)).one()
+        quantities = {
+            status: session.exec(
+                select(func.coalesce(func.sum(Participation.quantity), 0)).where(
+                    Participation.status == status
+                )
+            ).one()
+            for status in (ParticipationStatus.CONFIRMED, ParticipationStatus.PENDING)
+        }
+    sold = sum(quantities.values())
+    assert available >= 0, f"Negative stock: {available}"
+    assert sold + available == stock, f"Stock mismatch: {sold} + {available}"
+    assert (
+        quantities[ParticipationStatus.PENDING] <= cancelled
+    ), "More promotions than cancellations"
+
+
+def bench(workers: int, users: int, stock: int, clients: int, port: int) -> dict:
+    url = temporary_database()
+    user_ids, representation_id, offer_id = seed_line(sqlite_engine(url), users, stock)
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    env = {**os.environ, "DB_URL": url, "WEB_CONCURRENCY": str(workers)}
+    env["PORT"] = str(port)
+    # The raw write path is measured, without the rate limiting and the admission
+    # control of the participation routes
+    env.update(RATE_LIMIT_STORE="none", ADMISSION_MAX_IN_FLIGHT="0")
+    server = subprocess.Popen(
+        [sys.executable, "serve.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(base_url)
+        joins = [{"user_id": user_id, "quantity": 1, **line} for user_id in user_ids]
+        join_time, codes = run_phase(
+            base_url, "/participations/join-event", joins, clients
+        )
+        buyers = [joins[i] for i, code in enumerate(codes) if code == 201]
+        waiting = [joins[i] for i, code in enumerate(codes) if code != 201]
+        wait_time, _ = run_phase(
+            base_url, "/participations/join-waiting-list", waiting, clients
+        )
+        rank_payloads = [{"user_id": p["user_id"], **line} for p in waiting]
+        rank_time, _ = run_phase(
+            base_url, "/participations/check-waiting-status", rank_payloads, clients
+        )
+        cancels = [{"user_id": p["user_id"], **line} for p in buyers[: stock // 2]]
+        cancel_time, _ = run_phase(base_url, "/participations/cancel", cancels, clients)
+    finally:
+        server.terminate()
+        server.wait()
+    check_line(url, stock, len(cancels))
+    os.remove(url.removeprefix("sqlite:///"))
+    total = len(joins) + len(waiting) + len(rank_payloads) + len(cancels)
+    elapsed = join_time + wait_time + rank_time + cancel_time
+    return {
+        "workers": workers,
+        "join-event/s": len(joins) / join_time,
+        "check-waiting-status/s": len(rank_payloads) / rank_time,
+        "cancel/s": len(cancels) / cancel_time,
+        "total req/s": total / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    for worker_count in args.workers:
+        result = bench(worker_count, args.users, args.stock, args.clients, args.port)
+        print(" | ".join(f"{key}: {value:.1f}" for key, value in result.items()))
@@ -0,0 +1,123 @@
+"""
+Delivery of the notifications of a large promotion.
+
+A block of places is cancelled on a sold out line, promoting every user of its
+waiting list at once, on a fresh copy of the test database. The cancel handler is
+called directly with a dispatcher whose transport takes a fixed time per batch,
+as an SMTP server would. The latency of the cancel, the time until every
+notification is sent and their throughput are reported per concurrency.
+
+Usage (from the api folder):
+    python -m benchmarks.notifications --waiting 500 --concurrency 1 4 16
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from participations import notifications
+from participations.models import Participation, ParticipationStatus
+from participations.notifications import NotificationDispatcher
+from participations.routes import cancel
+from participations.serializers import ParticipationPostLightSerializer
+
+
+class LatencyTransport:
+    """
+    Transport taking a fixed time per batch, and a shorter one per message
+    """
+
+    def __init__(self, batch_latency: float, message_latency: float):
+        self.batch_latency = batch_latency
+        self.message_latency = message_latency
+
+    async def send(self, messages: list[dict]) -> None:
+        await asyncio.sleep(self.batch_latency + self.message_latency * len(messages))
+
+
+def seed(engine: Engine, waiting: int) -> dict:
+    """
+    Create a sold out line, a user holding as many places as users are waiting
+    :return: The cancel of the user holding the places
+    """
+    user_ids, representation_id, offer_id = seed_line(engine, waiting + 1, stock=0)
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    with Session(engine) as session:
+        session.add(
+            Participation(
+                user_id=user_ids[0],
+                status=ParticipationStatus.CONFIRMED,
+                confirmed_at=datetime(2025, 1, 1),
+                quantity=waiting,
+                **line,
+            )
+        )
+        for minute, user_id in enumerate(user_ids[1:]):
+            session.add(
+                Participation(
+                    user_id=user_id,
+                    status=ParticipationStatus.WAIT_LIST,
+                    waiting_at=datetime(2025, 1, 1) + timedelta(minutes=minute),
+                    quantity=1,
+                    **line,
+                )
+            )
+        session.commit()
+    return {"user_id": user_ids[0], **line}
+
+
+def bench(waiting: int, concurrency: int, batch_size: int, latency: float) -> dict:
+    url = temporary_database()
+    engine = sqlite_engine(url)
+    data = ParticipationPostLightSerializer(**seed(engine, waiting))
+    dispatcher = NotificationDispatcher(
+        LatencyTransport(latency, latency / 100),
+        max_queue=waiting,
+        batch_size=batch_size,
+        max_delay=0.01,
+        concurrency=concurrency,
+        max_retries=0,
+        backoff=0,
+    )
+    notifications.dispatcher = dispatcher
+    try:
+        with Session(engine) as session:
+            start = time.perf_counter()
+            cancel(data, session=session)
+            cancelled = time.perf_counter() - start
+        dispatcher.flush()
+        delivered = time.perf_counter() - start
+    finally:
+        dispatcher.shutdown(timeout=10)
+        notifications.dispatcher = None
+        engine.dispose()
+        os.remove(url.removeprefix("sqlite:///"))
+    return {
+        "cancel": cancelled,
+        "delivered": delivered,
+        "per second": waiting / delivered,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--waiting", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Seconds to send a batch"
+    )
+    args = parser.parse_args()
+    for concurrency in args.concurrency:
+        result = bench(args.waiting, concurrency, args.batch_size, args.latency)
+        print(
+            f"concurrency {concurrency}: cancel {result['cancel'] * 1e3:.1f} ms | "
+            f"all sent after {result['delivered']:.2f} s | "
+            f"{result['per second']:.0f} notifications/s"
+        )
@@ -0,0 +1,97 @@
+"""
+Overhead of the rate limiting middleware of the participation routes.
+
+The same request is sent many times, straight to the ASGI callable, to an app
+answering immediately: once without the middleware, then through it with each
+store of token buckets, with the admission control. The time per request is
+reported, the overhead is its difference with the bare app.
+
+Usage (from the api folder):
+    python -m benchmarks.ratelimit_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+from common.ratelimit import (
+    AdmissionController,
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    SharedBucketStore,
+)
+
+
+async def bare_app(scope, receive, send) -> None:
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def run(app, requests: int, users: int) -> float:
+    bodies = [
+        json.dumps(
+            {"user_id": str(uuid4()), "representation_id": "rep", "offer_id": "off"}
+        ).encode()
+        for _ in range(users)
+    ]
+
+    async def send(message: dict) -> None:
+        pass
+
+    start = time.perf_counter()
+    for i in range(requests):
+        body = bodies[i % users]
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/participations/join-event",
+            "client": (f"10.0.{i % 256}.1", 5000),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def limiter(store) -> RateLimiter:
+    # Buckets large enough never to reject: only their cost is measured
+    return RateLimiter(store, 1e6, 10**9, 1e6, 10**9)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    shared_path = tempfile.mkstemp(prefix="buckets-", suffix=".sqlite")[1]
+    apps = {
+        "no middleware": bare_app,
+        "memory buckets": RateLimitMiddleware(bare_app, limiter(MemoryBucketStore())),
+        "memory buckets + admission": RateLimitMiddleware(
+            bare_app,
+            limiter(MemoryBucketStore()),
+            AdmissionController(max_in_flight=16, retry_after=1),
+        ),
+        "shared buckets": RateLimitMiddleware(
+            bare_app, limiter(SharedBucketStore(shared_path))
+        ),
+    }
+    baseline = None
+    for name, app in apps.items():
+        per_request = asyncio.run(run(app, args.requests, args.users))
+        baseline = per_request if baseline is None else baseline
+        print(
+            f"{name}: {per_request * 1e6:.1f} µs/request, "
+            f"overhead {(per_request - baseline) * 1e6:.1f} µs"
+        )
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(shared_path + suffix):
+            os.remove(shared_path + suffix)
@@ -0,0 +1,79 @@
+"""
+Import time of the app, from the -X importtime report of the interpreter.
+
+The app is imported in fresh interpreters, the median of the cumulative import
+time of the app module is reported with the modules costing the most, split
+between the modules of this project and the third-party ones. The script exits
+with an error when the median exceeds the startup budget.
+
+Usage (from the api folder):
+    python -m benchmarks.startup_time --runs 5 --budget 1500
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+API_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import a module in a new interpreter
+    :param module: The name of the module
+    :return: The self and cumulative import time, in microseconds, of each module
+    imported, by name
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=API_FOLDER,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def is_project_module(name: str) -> bool:
+    top_level = name.split(".", 1)[0]
+    return os.path.isdir(os.path.join(API_FOLDER, top_level)) or os.path.isfile(
+        os.path.join(API_FOLDER, f"{top_level}.py")
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--budget", type=float, default=1500, help="Milliseconds, for the median"
+    )
+    args = parser.parse_args()
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    median = statistics.median(run[args.module][1] for run in runs) / 1000
+    last = runs[-1]
+    project = sum(
+        self_time for name, (self_time, _) in last.items() if is_project_module(name)
+    )
+    total = sum(self_time for self_time, _ in last.values())
+    print(f"import {args.module}: {median:.0f} ms (median of {args.runs})")
+    print(
+        f"project modules: {project / 1000:.0f} ms, "
+        f"third-party and standard modules: {(total - project) / 1000:.0f} ms"
+    )
+    print("costliest modules (self time of the last run):")
+    for name, (self_time, cumulative) in sorted(
+        last.items(), key=lambda item: item[1][0], reverse=True
+    )[: args.top]:
+        print(f"  {self_time / 1000:7.1f} ms  {name} ({cumulative / 1000:.1f} ms)")
+    if median > args.budget:
+        sys.exit(f"Over the startup budget of {args.budget:.0f} ms")
@@ -0,0 +1,104 @@
+"""
+CPU time per request of the hot participation routes.
+
+The handlers of join-event, check-waiting-status and cancel are called directly,
+without the HTTP layer, on a fresh copy of the test database: each round makes a
+user join a line, reads the rank of a user on its waiting list, and cancels the
+join. The CPU time per request is reported with the compiled statement cache of
+the engine, and without it: the difference is the compilation saved by the cache.
+
+Usage (from the api folder):
+    python -m benchmarks.statement_cache --rounds 2000
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from common.db.engine import setup_sqlite_transactions
+from participations.models import Participation, ParticipationStatus
+from participations.routes import cancel, check_waiting_status, join_event
+from participations.serializers import (
+    CheckWaitingListRankSerializer,
+    ParticipationPostLightSerializer,
+    ParticipationPostSerializer,
+)
+
+
+def seed(engine: Engine, users: int) -> tuple[list[str], str, dict]:
+    """
+    Create a line with a user on its waiting list, asking for more than a cancel
+    frees so that it is never promoted
+    :return: The ids of the other users, of the waiting user, and the line
+    """
+    (waiting, *user_ids), representation_id, offer_id = seed_line(
+        engine, users + 1, stock=users
+    )
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    with Session(engine) as session:
+        session.add(
+            Participation(
+                user_id=waiting,
+                quantity=2,
+                status=ParticipationStatus.WAIT_LIST,
+                waiting_at=datetime.now(),
+                **line,
+            )
+        )
+        session.commit()
+    return user_ids, waiting, line
+
+
+def bench(engine: Engine, rounds: int, user_ids: list[str], waiting: str, line: dict):
+    timings = {"join-event": 0.0, "check-waiting-status": 0.0, "cancel": 0.0}
+    rank = CheckWaitingListRankSerializer(user_id=waiting, **line)
+    for i in range(rounds):
+        user_id = user_ids[i % len(user_ids)]
+        join = ParticipationPostSerializer(user_id=user_id, quantity=1, **line)
+        leave = ParticipationPostLightSerializer(user_id=user_id, **line)
+        for name, call in (
+            ("join-event", lambda session: join_event(join, session=session)),
+            (
+                "check-waiting-status",
+                lambda session: check_waiting_status(rank, session=session),
+            ),
+            ("cancel", lambda session: cancel(leave, session=session)),
+        ):
+            with Session(engine) as session:
+                start = time.process_time()
+                call(session)
+                timings[name] += time.process_time() - start
+    return {name: total / rounds for name, total in timings.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+    url = temporary_database()
+    engine = sqlite_engine(url)
+    setup_sqlite_transactions(engine, "WAL")
+    user_ids, waiting, line = seed(engine, args.users)
+    # Warm up
+    bench(engine, len(user_ids), user_ids, waiting, line)
+    cached = bench(engine, args.rounds, user_ids, waiting, line)
+    uncached = bench(
+        engine.execution_options(compiled_cache=None),
+        args.rounds,
+        user_ids,
+        waiting,
+        line,
+    )
+    for name in cached:
+        print(
+            f"{name}: {cached[name] * 1e6:.0f} µs CPU/request, "
+            f"{uncached[name] * 1e6:.0f} µs without the compiled cache"
+        )
+    engine.dispose()
+    os.remove(url.removeprefix("sqlite:///"))
@@ -0,0 +1,112 @@
+"""
+Latency of the waiting list ranks of a user waiting in many lines.
+
+A user waits, behind other users, in every line of an event with many
+representations. Its ranks are read once per line with check-waiting-status, as
+the app used to, then all at once with GET /users/{id}/participations. The
+handlers are called directly, on a fresh copy of the test database.
+
+Usage (from the api folder):
+    python -m benchmarks.user_participations --lines 10 50 --waiting 20
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from benchmarks.utils import seed_line, sqlite_engine, temporary_database
+from events.models import Inventory, Representation
+from participations.models import Participation, ParticipationStatus
+from participations.routes import check_waiting_status
+from participations.serializers import CheckWaitingListRankSerializer
+from users.routes import get_user_participations
+
+
+def seed(engine: Engine, lines: int, waiting: int) -> tuple[str, list[dict]]:
+    """
+    Create the lines of an event, each with a waiting list of the given length
+    :return: The id of the user waiting in every line, and the lines
+    """
+    user_ids, representation_id, offer_id = seed_line(engine, waiting, stock=0)
+    with Session(engine) as session:
+        representation = session.get(Representation, representation_id)
+        line_dicts = [{"representation_id": representation_id, "offer_id": offer_id}]
+        for i in range(1, lines):
+            start = representation.start_datetime + timedelta(days=i)
+            session.add(
+                Representation(
+                    id=f"rep_bench_{i}",
+                    event_id=representation.event_id,
+                    start_datetime=start,
+                    end_datetime=start + timedelta(hours=3),
+                )
+            )
+            session.add(
+                Inventory(
+                    id=f"inv_bench_{i}",
+                    offer_id=offer_id,
+                    representation_id=f"rep_bench_{i}",
+                    total_stock=0,
+                    available_stock=0,
+                )
+            )
+            line_dicts.append(
+                {"representation_id": f"rep_bench_{i}", "offer_id": offer_id}
+            )
+        for line in line_dicts:
+            for minute, user_id in enumerate(user_ids):
+                session.add(
+                    Participation(
+                        user_id=user_id,
+                        status=ParticipationStatus.WAIT_LIST,
+                        waiting_at=datetime(2025, 1, 1) + timedelta(minutes=minute),
+                        quantity=1,
+                        **line,
+                    )
+                )
+        session.commit()
+    # The user in the middle of every waiting list
+    return user_ids[waiting // 2], line_dicts
+
+
+def bench(engine: Engine, rounds: int, user_id: str, lines: list[dict]) -> dict:
+    ranks = [CheckWaitingListRankSerializer(user_id=user_id, **line) for line in lines]
+    timings = {"per line": 0.0, "all lines": 0.0}
+    for _ in range(rounds):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            for rank in ranks:
+                check_waiting_status(rank, session=session)
+            timings["per line"] += time.perf_counter() - start
+        with Session(engine) as session:
+            start = time.perf_counter()
+            get_user_participations(user_id, session=session)
+            timings["all lines"] += time.perf_counter() - start
+    return {name: total / rounds for name, total in timings.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--waiting", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    for line_count in args.lines:
+        url = temporary_database()
+        engine = sqlite_engine(url)
+        user_id, lines = seed(engine, line_count, args.waiting)
+        # Warm up
+        bench(engine, 1, user_id, lines)
+        result = bench(engine, args.rounds, user_id, lines)
+        print(
+            f"{line_count} lines: "
+            + " | ".join(
+                f"{name}: {value * 1e3:.2f} ms" for name, value in result.items()
+            )
+        )
+        engine.dispose()
+        os.remove(url.removeprefix("sqlite:///"))
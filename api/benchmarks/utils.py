@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine
+from sqlmodel import Session, create_engine
+
+from events.models import Event, Inventory, Offer, OfferType, Representation
+from users.models import Organization, User
+
+EMPTY_DATABASE = "data/db/test-database"
+
+
+def temporary_database() -> str:
+    """
+    Copy the empty, migrated, test database into a temporary file
+    :return: The url of the copy
+    """
+    path = tempfile.mkstemp(prefix="benchmark-", suffix=".sqlite")[1]
+    shutil.copyfile(EMPTY_DATABASE, path)
+    return f"sqlite:///{path}"
+
+
+def seed_line(
+    engine: Engine, users: int, stock: int, start: datetime | None = None
+) -> tuple[list[str], str, str]:
+    """
+    Create an event with one representation and one offer, the inventory of the
+    line and the given number of users
+    :param engine: An engine to the database to fill
+    :param users: Number of users to create
+    :param stock: Available stock of the line
+    :param start: Start of the representation, in a week by default
+    :return: The ids of the users, the id of the representation and of the offer
+    """
+    start = start or datetime.now() + timedelta(days=7)
+    with Session(engine) as session:
+        organization = Organization(name="Benchmark")
+        offer_type = OfferType(label="ticket")
+        session.add_all([organization, offer_type])
+        session.flush()
+        event = Event(
+            id="ev_bench",
+            title="Benchmark",
+            description="Benchmark",
+            thumbnail_url="https://example.com/bench.jpg",
+            organization_id=organization.id,
+            venue_name="Bench",
+            venue_address="Bench",
+            timezone="Europe/Paris",
+        )
+        representation = Representation(
+            id="rep_bench",
+            event_id=event.id,
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=3),
+        )
+        offer = Offer(
+            id="off_bench",
+            event_id=event.id,
+            name="Benchmark",
+            type_id=offer_type.id,
+            max_quantity_per_order=10,
+            description="Benchmark",
+        )
+        inventory = Inventory(
+            id="inv_bench",
+            offer_id=offer.id,
+            representation_id=representation.id,
+            total_stock=stock,
+            available_stock=stock,
+        )
+        session.add_all([event, representation, offer, inventory])
+        user_instances = [
+            User(
+                email=f"bench{i}@test.com",
+                firstname=f"Bench{i}",
+                lastname="Test",
+                birthdate=datetime(1994, 1, 1),
+                address="test",
+            )
+            for i in range(users)
+        ]
+        session.add_all(user_instances)
+        session.commit()
+        return [user.id for user in user_instances], representation.id, offer.id
+
+
+def sqlite_engine(url: str) -> Engine:
+    return create_engine(url, connect_args={"timeout": 30})
@@ -0,0 +1,389 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+
+def cache_key(route: str, **params: Any) -> str:
+    """
+    Build a cache key from a route name and its parameters
+    :param route: The name of the route the response belongs to
+    :param params: The parameters the response depends on
+    :return: A stable string key, independent of the order of the parameters
+    """
+    if not params:
+        return route
+    query = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    return f"{route}?{query}"
+
+
+class MemoryCacheBackend:
+    """
+    Process local LRU store, bounded by the total size of the stored values
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[bytes, frozenset[str]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        # Number of invalidations of each tag
+        self._versions: dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def versions(self, tags: Iterable[str]) -> dict[str, int]:
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        tags: Iterable[str] = (),
+        versions: dict[str, int] | None = None,
+    ) -> None:
+        with self._lock:
+            if versions is not None and any(
+                self._versions.get(tag, 0) != version
+                for tag, version in versions.items()
+            ):
+                return
+            self._store(key, value, frozenset(tags))
+
+    def _store(self, key: str, value: bytes, tags: frozenset[str]) -> None:
+        self._discard(key)
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = (value, tags)
+        self._size += len(value)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in self._tags.pop(tag, set()):
+                    self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._size = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        value, tags = entry
+        self._size -= len(value)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SharedCacheBackend:
+    """
+    LRU store kept in a SQLite file, so that every worker process of the app
+    shares the same entries. It is a local stand-in for a Redis instance.
+    The reads only take the write lock of the file to record the access to an
+    entry once per touch_interval, so that the hits of the workers are not
+    serialized: the eviction order is approximate within that interval.
+    """
+
+    def __init__(self, path: str, max_bytes: int, touch_interval: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed_at INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at "
+                "ON cache_entry (accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_tag ("
+                "tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_tag_version ("
+                "tag TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @property
+    def size(self) -> int:
+        row = (
+            self._connection()
+            .execute("SELECT COALESCE(SUM(size), 0) FROM cache_entry")
+            .fetchone()
+        )
+        return row[0]
+
+    def __len__(self) -> int:
+        return (
+            self._connection().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        )
+
+    def get(self, key: str) -> bytes | None:
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, accessed_at FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, accessed_at = row
+        now = time.time_ns()
+        if now - accessed_at > self.touch_interval * 1e9:
+            with connection:
+                connection.execute(
+                    "UPDATE cache_entry SET accessed_at = ? "
+                    "WHERE key = ? AND accessed_at = ?",
+                    (now, key, accessed_at),
+                )
+        return value
+
+    def _versions(
+        self, connection: sqlite3.Connection, tags: list[str]
+    ) -> dict[str, int]:
+        placeholders = ", ".join("?" for _ in tags)
+        versions = dict.fromkeys(tags, 0)
+        versions.update(
+            connection.execute(
+                "SELECT tag, version FROM cache_tag_version "
+                f"WHERE tag IN ({placeholders})",
+                tags,
+            ).fetchall()
+        )
+        return versions
+
+    def versions(self, tags: Iterable[str]) -> dict[str, int]:
+        return self._versions(self._connection(), list(set(tags)))
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        tags: Iterable[str] = (),
+        versions: dict[str, int] | None = None,
+    ) -> None:
+        if len(value) > self.max_bytes:
+            return
+        connection = self._connection()
+        with connection:
+            if versions is not None:
+                # Checked under the write lock, so that no invalidation happens
+                # between the check and the write
+                connection.execute("BEGIN IMMEDIATE")
+                if self._versions(connection, list(versions)) != versions:
+                    return
+            connection.execute("DELETE FROM cache_tag WHERE key = ?", (key,))
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, size, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time_ns()),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO cache_tag (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in set(tags)],
+            )
+            self._evict(connection)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        tags = list(set(tags))
+        if not tags:
+            return
+        placeholders = ", ".join("?" for _ in tags)
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO cache_tag_version (tag, version) VALUES (?, 1) "
+                "ON CONFLICT (tag) DO UPDATE SET version = version + 1",
+                [(tag,) for tag in tags],
+            )
+            connection.execute(
+                "DELETE FROM cache_entry WHERE key IN "
+                f"(SELECT key FROM cache_tag WHERE tag IN ({placeholders}))",
+                tags,
+            )
+            connection.execute(
+                "DELETE FROM cache_tag WHERE key NOT IN (SELECT key FROM cache_entry)"
+            )
+
+    def clear(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM cache_entry")
+            connection.execute("DELETE FROM cache_tag")
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entry"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = connection.execute(
+            "SELECT key, size FROM cache_entry ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM cache_entry WHERE key = ?", evicted)
+        connection.executemany("DELETE FROM cache_tag WHERE key = ?", evicted)
+
+
+CacheBackend = MemoryCacheBackend | SharedCacheBackend
+
+
+class ResponseCache:
+    """
+    Cache of rendered JSON responses, invalidated through tags.
+    A response built while one of its tags is invalidated is not stored: it may
+    have been read from the database before the commit which invalidated it.
+    """
+
+    def __init__(self, backend: CacheBackend | None):
+        self.backend = backend
+
+    def respond(
+        self, key: str, loader: Callable[[], Any], tags: Iterable[str] = ()
+    ) -> Response:
+        """
+        Serve the response stored for the given key, or build it with the loader
+        and store it
+        :param key: The key of the response, see cache_key
+        :param loader: Callable returning the content of the response, it may raise
+        an HTTPException, in which case nothing is stored
+        :param tags: Tags of the data the response depends on, the loader must not
+        use a transaction which read the database before the call
+        :return: The JSON response
+        """
+        versions = None
+        if self.backend is not None:
+            body = self.backend.get(key)
+            if body is not None:
+                return Response(content=body, media_type="application/json")
+            versions = self.backend.versions(tags)
+        response = JSONResponse(content=jsonable_encoder(loader()))
+        if self.backend is not None:
+            self.backend.set(key, bytes(response.body), tags, versions)
+        return response
+
+    def lookup(self, key: str) -> bytes | None:
+        return None if self.backend is None else self.backend.get(key)
+
+    def versions(self, tags: Iterable[str]) -> dict[str, int] | None:
+        """
+        Get the versions of tags, to be taken before reading the data of a response
+        stored with store
+        """
+        return None if self.backend is None else self.backend.versions(tags)
+
+    def store(
+        self,
+        key: str,
+        body: bytes,
+        tags: Iterable[str] = (),
+        versions: dict[str, int] | None = None,
+    ) -> None:
+        """
+        Store a response
+        :param key: The key of the response, see cache_key
+        :param body: The JSON body
+        :param tags: Tags of the data the response depends on
+        :param versions: Versions of the tags taken before the data was read, see
+        versions. Nothing is stored if one of the tags was invalidated since.
+        """
+        if self.backend is not None:
+            self.backend.set(key, body, tags, versions)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        if self.backend is not None:
+            self.backend.invalidate(tags)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def conditional_response(body: bytes, if_none_match: str | None) -> Response:
+    """
+    Build the JSON response of a body, tagged with its ETag, or a 304 response
+    when the client already has it
+    :param body: The JSON body
+    :param if_none_match: The If-None-Match header of the request
+    :return: The response
+    """
+    tag = etag(body)
+    if if_none_match is not None and tag in (
+        value.strip().removeprefix("W/") for value in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers={"ETag": tag})
+    return Response(content=body, media_type="application/json", headers={"ETag": tag})
+
+
+def build_backend(kind: str, max_bytes: int, shared_path: str) -> CacheBackend | None:
+    """
+    Build the cache backend described by the configuration
+    :param kind: "memory", "shared" or "none"
+    :param max_bytes: Maximum total size of the cached values
+    :param shared_path: Path of the SQLite file used by the shared backend
+    :return: The backend, or None if caching is disabled
+    """
+    if kind == "none":
+        return None
+    if kind == "shared":
+        return SharedCacheBackend(shared_path, max_bytes)
+    return MemoryCacheBackend(max_bytes)
@@ -0,0 +1,81 @@
+import importlib
+from typing import Any
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel
+from sqlmodel.sql.expression import SelectOfScalar
+
+from config import DB_DIALECT
+
+# Dialects supporting INSERT ... ON CONFLICT. The module of a dialect is only
+# imported when it is used, the one of PostgreSQL is costly to import
+UPSERT_DIALECTS = frozenset({"postgresql", "sqlite"})
+
+
+class DialectQueries:
+    """
+    Query paths specific to a database dialect, chosen once at startup (see
+    queries below)
+    """
+
+    def __init__(self, dialect_name: str):
+        self.dialect_name = dialect_name
+        self.upsert_insert = (
+            importlib.import_module(f"sqlalchemy.dialects.{dialect_name}").insert
+            if dialect_name in UPSERT_DIALECTS
+            else None
+        )
+        self.skip_locked = dialect_name == "postgresql"
+
+    def insert_ignoring_conflict(
+        self,
+        session: Session,
+        model: type[SQLModel],
+        values: dict[str, Any],
+        conflict_columns: list[str],
+    ) -> SQLModel | None:
+        """
+        Insert a row, unless it conflicts with an existing one on a unique index.
+        The conflict is detected by the database in the INSERT itself (ON CONFLICT
+        DO NOTHING) when the dialect supports it, else by a savepoint.
+        :param session: An active session to a database
+        :param model: The model of the row
+        :param values: The values of the row
+        :param conflict_columns: The columns of the unique index
+        :return: The inserted instance, None if it conflicted
+        """
+        if self.upsert_insert is None:
+            instance = model(**values)
+            try:
+                with session.begin_nested():
+                    session.add(instance)
+            except IntegrityError:
+                return None
+            return instance
+        statement = (
+            self.upsert_insert(model)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=conflict_columns)
+            .returning(model)
+        )
+        return session.scalars(statement).first()
+
+    def lock_first(self, query: SelectOfScalar) -> SelectOfScalar:
+        """
+        Make a query select only its first row, locked for update. On PostgreSQL,
+        rows locked by a concurrent transaction are skipped rather than waited for.
+        On SQLite, the write lock of the transaction is enough.
+        """
+        return self.lock_rows(query.limit(1))
+
+    def lock_rows(self, query: SelectOfScalar) -> SelectOfScalar:
+        """
+        Make a query lock the rows it selects for update, skipping those locked by a
+        concurrent transaction on PostgreSQL (see lock_first)
+        """
+        if self.skip_locked:
+            query = query.with_for_update(skip_locked=True)
+        return query
+
+
+queries = DialectQueries(DB_DIALECT)
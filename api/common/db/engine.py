@@ -0,0 +1,24 @@
+from sqlalchemy import Engine, event
+
+SQLITE_BEGIN_OPTION = "sqlite_begin"
+
+
+def setup_sqlite_transactions(engine: Engine, journal_mode: str | None) -> None:
+    """
+    Take over the emission of BEGIN from pysqlite, so that a transaction can be
+    started with BEGIN IMMEDIATE (see line_lock), and set the journal mode of
+    the database
+    :param engine: An engine to a SQLite database
+    :param journal_mode: The journal mode to set on every connection, if any
+    """
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+        if journal_mode:
+            dbapi_connection.execute(f"PRAGMA journal_mode={journal_mode}")
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection) -> None:
+        mode = connection.get_execution_options().get(SQLITE_BEGIN_OPTION, "DEFERRED")
+        connection.exec_driver_sql(f"BEGIN {mode}")
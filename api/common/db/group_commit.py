@@ -0,0 +1,130 @@
+"""
+Group commit of the writes on the lines.
+
+Instead of committing its own transaction, a request hands its write to the
+writer thread and waits for its result. The writer gathers the writes submitted
+concurrently, runs them in a single transaction, each one in its own savepoint,
+and commits them together: a batch pays one commit, hence one sync to the disk,
+instead of one per request. The error raised by a write (a failed check, a
+duplicate participation) rolls back its savepoint only and is raised back to the
+request which submitted it.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from common.db.locks import lines_lock
+from common.metrics import metrics
+from config import (
+    GROUP_COMMIT,
+    GROUP_COMMIT_MAX_BATCH,
+    GROUP_COMMIT_MAX_DELAY,
+    get_engine,
+)
+
+Write = Callable[[Session], Any]
+
+
+class PendingWrite:
+    def __init__(self, line: tuple[str, str], write: Write):
+        self.line = line
+        self.write = write
+        self.future: Future = Future()
+
+
+class GroupCommitWriter:
+    """
+    Writer of the batches, on the given engine, or on the engine of the app when
+    there is none
+    """
+
+    def __init__(self, engine: Engine | None, max_batch: int, max_delay: float):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue[PendingWrite] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, line: tuple[str, str], write: Write) -> Any:
+        """
+        Run a write in the next batch, and wait for its commit
+        :param line: The ids of the representation and of the offer written
+        :param write: Function making the write in the session of the batch, without
+        committing it
+        :return: The result of the write, its instances stay loaded once committed
+        :raise: The error raised by the write, or by the commit of its batch
+        """
+        self._start()
+        pending = PendingWrite(line, write)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit", daemon=True
+                )
+                self._thread.start()
+
+    def _next_batch(self) -> list[PendingWrite]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(
+                    self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self.write_batch(self._next_batch())
+
+    def write_batch(self, batch: list[PendingWrite]) -> None:
+        """
+        Run the writes of a batch in one transaction, and resolve their futures
+        """
+        results = []
+        try:
+            with Session(
+                self.engine or get_engine(), expire_on_commit=False
+            ) as session:
+                lines_lock(session, [pending.line for pending in batch])
+                for pending in batch:
+                    try:
+                        with session.begin_nested():
+                            result = pending.write(session)
+                    except Exception as error:
+                        pending.future.set_exception(error)
+                    else:
+                        results.append((pending, result))
+                session.commit()
+        except Exception as error:
+            # The lock or the commit failed: none of the writes was made
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(error)
+            return
+        metrics.increment("group_commit.batches")
+        metrics.increment("group_commit.writes", len(results))
+        for pending, result in results:
+            pending.future.set_result(result)
+
+
+group_writer = (
+    GroupCommitWriter(None, GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_MAX_DELAY)
+    if GROUP_COMMIT
+    else None
+)
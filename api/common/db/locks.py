@@ -0,0 +1,59 @@
+import zlib
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from common.db.engine import SQLITE_BEGIN_OPTION
+from config import LINE_LOCKING
+
+
+def line_key(representation_id: str, offer_id: str) -> int:
+    """
+    Get a stable 32 bits key for the line of a representation and an offer, the
+    same in every process
+    """
+    return zlib.crc32(f"{representation_id}:{offer_id}".encode())
+
+
+def line_lock(session: Session, representation_id: str, offer_id: str) -> None:
+    """
+    Start the transaction of the session with exclusive write access to the line
+    (inventory and waiting list) of the given representation and offer, across
+    every process using the database.
+    On SQLite, the transaction is started with BEGIN IMMEDIATE, which takes the
+    database write lock upfront. On PostgreSQL, a transaction level advisory lock
+    is taken on the line.
+    It must be called before any other statement of the transaction.
+    In optimistic mode (see LINE_LOCKING), no lock is taken: concurrent writes on
+    the line are detected through the version columns and retried (see
+    common.db.utils.retry_on_conflict).
+    :param session: An active session to a database
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    """
+    if LINE_LOCKING == "optimistic":
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        session.connection(execution_options={SQLITE_BEGIN_OPTION: "IMMEDIATE"})
+    elif dialect == "postgresql":
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            {"key": line_key(representation_id, offer_id)},
+        )
+
+
+def lines_lock(session: Session, lines: list[tuple[str, str]]) -> None:
+    """
+    Start the transaction of the session with exclusive write access to several
+    lines, see line_lock. The locks are taken in the order of their keys, so that
+    two transactions locking the same lines cannot deadlock. On SQLite, the lock
+    of the first line is the database write lock, which covers the others.
+    :param session: An active session to a database
+    :param lines: The ids of the representation and of the offer of each line
+    """
+    lines = sorted(set(lines), key=lambda line: line_key(*line))
+    if session.get_bind().dialect.name == "sqlite":
+        lines = lines[:1]
+    for representation_id, offer_id in lines:
+        line_lock(session, representation_id, offer_id)
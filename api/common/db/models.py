@@ -1,6 +1,16 @@
 from datetime import datetime
+from enum import IntEnum
+from uuid import UUID
 
+from sqlalchemy import (
+    UUID as SQL_UUID,
+    LargeBinary,
+    SmallInteger,
+    TypeDecorator,
+)
+from sqlalchemy.orm import declared_attr
 from sqlmodel import SQLModel, Field
+from sqlmodel.sql.sqltypes import AutoString
 
 
 class Model(SQLModel):
@@ -9,3 +19,81 @@ class Model(SQLModel):
 
 class ItemModel(SQLModel):
     id: str = Field(primary_key=True)
+
+
+class Heartbeat(SQLModel, table=True):
+    """
+    Single row table, whose timestamp is written on the primary database and
+    read on its replicas to measure their lag (see common.db.replica)
+    """
+
+    id: int = Field(default=1, primary_key=True)
+    beat_at: datetime
+
+
+class VersionedModel(SQLModel):
+    """
+    Mixin for the models whose updates must not overwrite a concurrent update:
+    the version is checked and incremented by every UPDATE, a stale one raises a
+    StaleDataError (see common.db.utils.retry_on_conflict)
+    """
+
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+    @declared_attr
+    def __mapper_args__(cls) -> dict:
+        return {"version_id_col": cls.__table__.c.version}
+
+
+class IntEnumType(TypeDecorator):
+    """
+    Column type storing an IntEnum as a small integer
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class: type[IntEnum]):
+        super().__init__()
+        self.enum_class = enum_class
+
+    def process_bind_param(self, value: IntEnum | int | None, dialect) -> int | None:
+        return None if value is None else int(value)
+
+    def process_result_value(self, value: int | None, dialect) -> IntEnum | None:
+        return None if value is None else self.enum_class(value)
+
+
+class UUIDString(TypeDecorator):
+    """
+    Column type for UUIDs handled as strings: a native UUID column on PostgreSQL,
+    a string on the databases without UUID type, like SQLite, or its 16 bytes
+    when compact (see COMPACT_KEYS)
+    """
+
+    impl = AutoString
+    cache_ok = True
+
+    def __init__(self, compact: bool = False):
+        super().__init__()
+        self.compact = compact
+
+    def _stores_bytes(self, dialect) -> bool:
+        return self.compact and dialect.name != "postgresql"
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(SQL_UUID(as_uuid=False))
+        if self.compact:
+            return dialect.type_descriptor(LargeBinary(16))
+        return dialect.type_descriptor(AutoString())
+
+    def process_bind_param(self, value: str | None, dialect) -> str | bytes | None:
+        if value is None or not self._stores_bytes(dialect):
+            return value
+        return UUID(value).bytes
+
+    def process_result_value(self, value: str | bytes | None, dialect) -> str | None:
+        if isinstance(value, bytes):
+            return str(UUID(bytes=value))
+        return value
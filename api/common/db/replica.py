@@ -0,0 +1,210 @@
+"""
+Routing of the reads tolerating staleness to a read replica.
+
+The lag of the replica is the age of the last heartbeat it has received. The lag
+is measured every DB_READ_CHECK_INTERVAL seconds by a background thread of each
+worker, which writes the heartbeat on the primary only when no other worker
+wrote it during the interval: the primary gets about one heartbeat per interval
+whatever the number of workers, rather than one write per worker. sync_replica
+writes it too. The reads only look the last measure up, aged by the time
+elapsed since it was taken. A local SQLite replica can be kept in sync with:
+    python -m common.db.replica data/db/replica --every 1
+"""
+
+import argparse
+import functools
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import Engine, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from common.db.models import Heartbeat
+from common.metrics import metrics
+from config import (
+    DB_READ_CHECK_INTERVAL,
+    DB_READ_MAX_LAG,
+    get_engine,
+    get_read_engine,
+)
+
+REPLICA_METRICS_PREFIX = "replica."
+
+
+def beat(primary: Engine, min_age: float = 0) -> bool:
+    """
+    Write the current time in the heartbeat of a database, unless it was written
+    less than min_age seconds ago
+    :param primary: An engine to the primary database
+    :param min_age: Seconds since the last heartbeat under which none is written
+    :return: Whether the heartbeat was written
+    """
+    now = datetime.now()
+    with Session(primary) as session:
+        beat_at = session.exec(
+            select(Heartbeat.beat_at).where(Heartbeat.id == 1)
+        ).first()
+    if beat_at is not None and (now - beat_at).total_seconds() < min_age:
+        return False
+    # In a new transaction: on SQLite, a write after a read of the same
+    # transaction fails once another worker committed in between
+    with Session(primary) as session:
+        if beat_at is None:
+            session.add(Heartbeat(id=1, beat_at=now))
+            written = True
+        else:
+            # Only the first of the workers finding it old writes it
+            written = (
+                session.execute(
+                    update(Heartbeat)
+                    .where(Heartbeat.id == 1, Heartbeat.beat_at == beat_at)
+                    .values(beat_at=now)
+                ).rowcount
+                == 1
+            )
+        session.commit()
+    return written
+
+
+class ReplicaRouter:
+    """
+    Pick the engine of the reads: the replica when it is reachable and its lag
+    is below the tolerated one, else the primary
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replica: Engine | None,
+        max_lag: float,
+        check_interval: float,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # The last lag measured, and when it was measured
+        self._measure: tuple[float | None, float] | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def measure(self) -> float | None:
+        """
+        Measure the lag of the replica, writing a heartbeat on the primary unless
+        another worker wrote it during the check interval
+        :return: The lag in seconds, None if it could not be measured
+        """
+        try:
+            beat(self.primary, self.check_interval)
+            with Session(self.replica) as session:
+                beat_at = session.exec(
+                    select(Heartbeat.beat_at).where(Heartbeat.id == 1)
+                ).first()
+        except SQLAlchemyError:
+            beat_at = None
+        lag = (
+            None
+            if beat_at is None
+            else max((datetime.now() - beat_at).total_seconds(), 0.0)
+        )
+        self._measure = (lag, time.monotonic())
+        return lag
+
+    def lag(self) -> float | None:
+        """
+        Get the lag of the replica from its last measure, without querying
+        :return: The lag in seconds, None if it was not measured
+        """
+        measure = self._measure
+        if measure is None or measure[0] is None:
+            return None
+        lag, measured_at = measure
+        # The replica may have fallen behind since
+        return lag + time.monotonic() - measured_at
+
+    def start(self) -> None:
+        """
+        Start measuring the lag every check interval, in a background thread
+        """
+        if self.replica is None or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="replica-lag", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self.measure()
+            if self._stopped.wait(self.check_interval):
+                return
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """
+        Stop measuring the lag
+        :param timeout: Seconds to wait for the thread to stop
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def engine_for_read(self, max_lag: float | None = None) -> Engine:
+        """
+        Get the engine to use for a read
+        :param max_lag: The staleness tolerated by the read, in seconds, the one
+        of the router by default
+        :return: The engine of the replica, or of the primary
+        """
+        if self.replica is None:
+            return self.primary
+        max_lag = self.max_lag if max_lag is None else max_lag
+        lag = self.lag()
+        if lag is None or lag > max_lag:
+            metrics.increment(f"{REPLICA_METRICS_PREFIX}fallbacks")
+            return self.primary
+        metrics.increment(f"{REPLICA_METRICS_PREFIX}reads")
+        return self.replica
+
+
+def sync_replica(primary: Engine, replica_path: str) -> None:
+    """
+    Copy a primary SQLite database into a replica file, with the backup API
+    :param primary: An engine to the primary SQLite database
+    :param replica_path: The path of the replica
+    """
+    beat(primary)
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+@functools.cache
+def get_replica_router() -> ReplicaRouter:
+    """
+    Get the router of the app, built with its engines on first use
+    """
+    return ReplicaRouter(
+        get_engine(), get_read_engine(), DB_READ_MAX_LAG, DB_READ_CHECK_INTERVAL
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a SQLite read replica")
+    parser.add_argument("replica_path")
+    parser.add_argument("--every", type=float, help="Seconds between two syncs")
+    args = parser.parse_args()
+    while True:
+        sync_replica(get_engine(), args.replica_path)
+        if args.every is None:
+            break
+        time.sleep(args.every)
@@ -1,7 +1,18 @@
-from sqlalchemy.exc import NoResultFound
+import functools
+import random
+import time
+from typing import Callable
+
+from fastapi import HTTPException
+from sqlalchemy.exc import NoResultFound, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
 from sqlmodel import SQLModel, Session
 
 from common.db.models import ItemModel, Model
+from common.metrics import metrics
+from config import OPTIMISTIC_BACKOFF, OPTIMISTIC_RETRIES
+
+OPTIMISTIC_METRICS_PREFIX = "optimistic."
 
 
 def create(instance: SQLModel, session: Session) -> SQLModel:
@@ -25,3 +36,70 @@ def get_instance_by_id(
     except NoResultFound:
         return None
     return instance
+
+
+def is_write_conflict(error: Exception) -> bool:
+    """
+    Tell if an error comes from a write that conflicted with a concurrent one: a
+    stale version (see VersionedModel), or the SQLite write lock held by another
+    transaction
+    """
+    if isinstance(error, StaleDataError):
+        return True
+    return isinstance(error, OperationalError) and "database is locked" in str(
+        error.orig
+    )
+
+
+def retry_on_conflict(route: Callable) -> Callable:
+    """
+    Decorator for the routes updating versioned models: when the write of the
+    route conflicts with a concurrent one, the transaction is rolled back and the
+    route is run again after a bounded, jittered, exponential backoff.
+    Once OPTIMISTIC_RETRIES retries are exhausted, a 409 error is returned.
+    The session of the route must be passed as the "session" keyword argument,
+    which is how FastAPI calls routes.
+    :param route: The route to retry
+    :return: The decorated route
+    """
+    prefix = f"{OPTIMISTIC_METRICS_PREFIX}{route.__name__}"
+
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        session = kwargs["session"]
+        for attempt in range(OPTIMISTIC_RETRIES + 1):
+            metrics.increment(f"{prefix}.attempts")
+            try:
+                return route(*args, **kwargs)
+            except (StaleDataError, OperationalError) as error:
+                if not is_write_conflict(error):
+                    raise
+                session.rollback()
+                metrics.increment(f"{prefix}.conflicts")
+            if attempt < OPTIMISTIC_RETRIES:
+                metrics.increment(f"{prefix}.retries")
+                time.sleep(OPTIMISTIC_BACKOFF * 2**attempt * random.uniform(0.5, 1))
+        metrics.increment(f"{prefix}.failures")
+        raise HTTPException(
+            status_code=409,
+            detail="This item is in high demand, please try again",
+        )
+
+    return wrapper
+
+
+def conflict_rates() -> dict[str, dict[str, float]]:
+    """
+    Get, for every route decorated with retry_on_conflict, its counters of
+    attempts, conflicts, retries and failures, and its conflict and retry rates
+    """
+    routes: dict[str, dict[str, float]] = {}
+    for name, value in metrics.snapshot(OPTIMISTIC_METRICS_PREFIX).items():
+        route, counter = name.removeprefix(OPTIMISTIC_METRICS_PREFIX).rsplit(".", 1)
+        routes.setdefault(route, {})[counter] = value
+    for counters in routes.values():
+        attempts = counters.get("attempts", 0)
+        calls = attempts - counters.get("retries", 0)
+        counters["conflict_rate"] = counters.get("conflicts", 0) / attempts
+        counters["retry_rate"] = counters.get("retries", 0) / calls if calls else 0
+    return routes
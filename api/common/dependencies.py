@@ -1,8 +1,32 @@
+import secrets
+
+from fastapi import Header, HTTPException
 from sqlmodel import Session
 
-from config import engine
+from common.db.replica import get_replica_router
+from config import ADMIN_TOKEN, get_engine
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
+        yield session
+
+
+def get_read_session():
+    """
+    Session for the reads tolerating staleness, on the read replica when it is
+    fresh enough (see common.db.replica)
+    """
+    with Session(get_replica_router().engine_for_read()) as session:
         yield session
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """
+    Restrict a route to the holders of the ADMIN_TOKEN, the route is disabled when
+    no token is configured
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(
+        (x_admin_token or "").encode(), ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Admin access required")
@@ -0,0 +1,34 @@
+import threading
+from collections import defaultdict
+
+
+class Counters:
+    """
+    Thread safe, process local, named counters
+    """
+
+    def __init__(self):
+        self._values: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._values[name] += value
+
+    def get(self, name: str) -> int:
+        return self._values.get(name, 0)
+
+    def snapshot(self, prefix: str = "") -> dict[str, int]:
+        with self._lock:
+            return {
+                name: value
+                for name, value in sorted(self._values.items())
+                if name.startswith(prefix)
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+metrics = Counters()
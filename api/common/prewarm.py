@@ -0,0 +1,128 @@
+"""
+Warm up of a worker before it reports itself ready.
+
+Right after a start, the first requests pay for opening the connections of the
+pool, compiling their statements, reading the pages of the database from the
+disk and building the cached catalogue responses. The warm up does all of it
+once, for the lines of the upcoming representations, while GET /ready answers
+503. It answers 200 once the worker is warm.
+"""
+
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from common.metrics import metrics
+from config import PREWARM, PREWARM_CONNECTIONS, PREWARM_HORIZON_DAYS
+from events.availability import availability_key, build_availability
+from events.cache import catalogue_cache
+from events.models import Inventory, Offer, Representation
+from participations.routes import participation_check, waiting_list_rank
+
+# User of the hot queries, which has no participation
+WARM_UP_USER_ID = str(UUID(int=0))
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.report: dict = {}
+
+    def set_ready(self, report: dict) -> None:
+        self.report = report
+        self.ready = True
+
+
+def open_connections(engine: Engine, count: int) -> int:
+    """
+    Open connections of the pool of an engine at once, so that they are kept in it
+    :param engine: The engine
+    :param count: The number of connections, at most the size of the pool
+    :return: The number of connections opened
+    """
+    connections = []
+    try:
+        for _ in range(count):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def warm_lines(session: Session, horizon: timedelta) -> tuple[int, int]:
+    """
+    Load the lines of the representations starting within the horizon, run the hot
+    queries of the participation routes once on each of them, and build the
+    availability documents of their events
+    :param session: An active session to a database
+    :param horizon: How far ahead the representations are warmed up
+    :return: The number of lines, and of events
+    """
+    now = datetime.now()
+    lines = session.exec(
+        select(Representation, Offer, Inventory)
+        .join(Inventory, Inventory.representation_id == Representation.id)
+        .join(Offer, Offer.id == Inventory.offer_id)
+        .where(
+            Representation.start_datetime >= now,
+            Representation.start_datetime < now + horizon,
+        )
+    ).all()
+    for representation, offer, _ in lines:
+        try:
+            participation_check(
+                WARM_UP_USER_ID, offer.id, representation.id, 1, session
+            )
+        except HTTPException:
+            pass
+        waiting_list_rank(session, representation.id, offer.id, now)
+    event_ids = {representation.event_id for representation, _, _ in lines}
+    for event_id in event_ids:
+        if catalogue_cache.lookup(availability_key(event_id)) is None:
+            build_availability(session, event_id)
+    return len(lines), len(event_ids)
+
+
+def prewarm(engine: Engine, connections: int, horizon_days: float) -> dict:
+    """
+    Warm up a worker, see the module documentation
+    :param engine: The engine of the app
+    :param connections: The number of connections to open in the pool
+    :param horizon_days: How many days ahead the representations are warmed up
+    :return: What was warmed up, and how long it took
+    """
+    start = time.perf_counter()
+    opened = open_connections(engine, connections)
+    with Session(engine) as session:
+        lines, events = warm_lines(session, timedelta(days=horizon_days))
+    return {
+        "connections": opened,
+        "lines": lines,
+        "events": events,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def warm_up(engine: Engine) -> None:
+    """
+    Warm up the worker when it is enabled, then mark it ready. A failed warm up
+    only costs latency to the first requests, the worker is ready anyway.
+    """
+    report = {}
+    if PREWARM:
+        try:
+            report = prewarm(engine, PREWARM_CONNECTIONS, PREWARM_HORIZON_DAYS)
+        except Exception as error:
+            metrics.increment("prewarm.failures")
+            report = {"error": str(error)}
+    readiness.set_ready(report)
+
+
+readiness = Readiness()
@@ -0,0 +1,413 @@
+"""
+Rate limiting and admission control of the participation routes.
+
+The token buckets limit the requests of each user and of each client IP, the
+admission controller caps the write requests processed at once on each line
+(representation and offer). Both answer 429 with a Retry-After header instead of
+letting the requests queue for the database write lock.
+
+The shared store waits for the lock of its SQLite file: the middleware takes its
+tokens in a thread rather than on the event loop, and lets the request through
+when the lock is not acquired in time, the rate limit being a protection of the
+database rather than a guarantee.
+"""
+
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi.responses import JSONResponse
+
+from common.metrics import metrics
+from config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_RETRY_AFTER,
+    RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_IP_RATE,
+    RATE_LIMIT_SHARED_PATH,
+    RATE_LIMIT_STORE,
+    RATE_LIMIT_USER_BURST,
+    RATE_LIMIT_USER_RATE,
+)
+
+RATE_LIMITED_PATHS = frozenset(
+    {
+        "/participations/check-waiting-status",
+        "/participations/join-event",
+        "/participations/join-waiting-list",
+    }
+)
+ADMITTED_PATHS = frozenset(
+    {
+        "/participations/join-event",
+        "/participations/join-waiting-list",
+        "/participations/leave-waiting-list",
+        "/participations/cancel",
+        "/participations/confirm",
+    }
+)
+
+
+Bucket = tuple[str, float, int]
+
+
+def refill(
+    tokens: float, elapsed: float, rate: float, burst: int
+) -> tuple[float, float]:
+    """
+    Take a token from a bucket
+    :param tokens: The tokens left in the bucket at its last update
+    :param elapsed: Seconds since its last update
+    :param rate: Tokens added per second
+    :param burst: Capacity of the bucket
+    :return: The tokens left, and the seconds to wait for a token if there was none
+    """
+    tokens = min(burst, tokens + elapsed * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    """
+    Process local token buckets, the least recently used ones are dropped past
+    max_keys
+    """
+
+    # Taking a token never waits, it is done on the event loop
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets: list[Bucket]) -> float:
+        """
+        Take a token from each of several buckets, or from none of them if one is
+        empty
+        :param buckets: The key, the rate and the burst of each bucket
+        :return: 0 if the tokens were taken, else the seconds to wait
+        """
+        now = time.monotonic()
+        with self._lock:
+            taken = []
+            for key, rate, burst in buckets:
+                tokens, updated_at = self._buckets.get(key, (burst, now))
+                tokens, wait = refill(tokens, now - updated_at, rate, burst)
+                if wait:
+                    return wait
+                taken.append((key, tokens))
+            for key, tokens in taken:
+                self._buckets.pop(key, None)
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedBucketStore:
+    """
+    Token buckets kept in a SQLite file, shared by every worker process of the app
+    """
+
+    # Taking a token waits for the lock of the file, it is done in a thread
+    blocking = True
+
+    def __init__(self, path: str, timeout: float = 1.0):
+        """
+        :param path: Path of the SQLite file
+        :param timeout: Seconds the lock of the file is waited for, after which the
+        request is let through
+        """
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def take(self, buckets: list[Bucket]) -> float:
+        """
+        Take a token from each of several buckets, or from none of them if one is
+        empty, in one transaction, see MemoryBucketStore.take
+        """
+        connection = self._connection()
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                now = time.time()
+                taken = []
+                for key, rate, burst in buckets:
+                    row = connection.execute(
+                        "SELECT tokens, updated_at FROM bucket WHERE key = ?", (key,)
+                    ).fetchone()
+                    tokens, updated_at = row or (burst, now)
+                    tokens, wait = refill(tokens, now - updated_at, rate, burst)
+                    if wait:
+                        return wait
+                    taken.append((key, tokens, now))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO bucket (key, tokens, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    taken,
+                )
+        except sqlite3.OperationalError as error:
+            if "database is locked" not in str(error):
+                raise
+            # Fail open: a busy store does not reject, nor hold, the requests
+            metrics.increment("ratelimit.store_timeouts")
+        return 0.0
+
+    def clear(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM bucket")
+
+
+BucketStore = MemoryBucketStore | SharedBucketStore
+
+
+class RateLimiter:
+    """
+    Token buckets per user and per client IP
+    """
+
+    def __init__(
+        self,
+        store: BucketStore,
+        user_rate: float,
+        user_burst: int,
+        ip_rate: float,
+        ip_burst: int,
+    ):
+        self.store = store
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+
+    def check(self, ip: str | None, user_id: str | None) -> float:
+        """
+        Take a token from the buckets of a request, from none of them if one of
+        them rejects it
+        :param ip: The IP of the client
+        :param user_id: The user the request is made for, if known
+        :return: 0 if the request is allowed, else the seconds to wait
+        """
+        buckets = []
+        if ip is not None:
+            buckets.append((f"ip:{ip}", self.ip_rate, self.ip_burst))
+        if user_id is not None:
+            buckets.append((f"user:{user_id}", self.user_rate, self.user_burst))
+        return self.store.take(buckets) if buckets else 0.0
+
+    def clear(self) -> None:
+        self.store.clear()
+
+    async def check_async(self, ip: str | None, user_id: str | None) -> float:
+        """
+        Take a token from the buckets of a request, see check, without blocking the
+        event loop on a shared store
+        """
+        return await run_blocking(self.store.blocking, self.check, ip, user_id)
+
+
+class AdmissionController:
+    """
+    Cap of the write requests processed at once on each line, by this process
+    """
+
+    def __init__(self, max_in_flight: int, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self._in_flight: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def enter(self, line: tuple) -> bool:
+        """
+        Admit a request on a line, unless the line is already at capacity
+        :param line: The ids of the representation and of the offer of the line
+        :return: Whether the request is admitted, it must then leave once processed
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(line, 0)
+            if in_flight >= self.max_in_flight:
+                return False
+            self._in_flight[line] = in_flight + 1
+            return True
+
+    def leave(self, line: tuple) -> None:
+        with self._lock:
+            in_flight = self._in_flight.pop(line) - 1
+            if in_flight:
+                self._in_flight[line] = in_flight
+
+    def in_flight(self, line: tuple) -> int:
+        return self._in_flight.get(line, 0)
+
+
+async def run_blocking(blocking: bool, function: Callable, *args):
+    """
+    Call a function from the event loop, in a thread if it may block
+    :param blocking: Whether the function may wait, for a lock or for I/O
+    :param function: The function
+    :return: What the function returns
+    """
+    if blocking:
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+
+async def buffer_body(receive: Callable) -> tuple[bytes, Callable]:
+    """
+    Read the whole body of a request
+    :param receive: The ASGI receive callable of the request
+    :return: The body, and a receive callable replaying it to the app
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay() -> dict:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
+
+
+def too_many_requests(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying the rate limiter and the admission controller to the
+    participation routes, from the user and the line in their JSON body
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: RateLimiter | None = None,
+        admission: AdmissionController | None = None,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send) -> None:
+        path = scope.get("path")
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or (path not in RATE_LIMITED_PATHS and path not in ADMITTED_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+        body, receive = await buffer_body(receive)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            # Left to the validation of the route
+            payload = {}
+        if self.limiter is not None and path in RATE_LIMITED_PATHS:
+            client = scope.get("client")
+            user_id = payload.get("user_id")
+            wait = await self.limiter.check_async(
+                client[0] if client else None,
+                None if user_id is None else str(user_id),
+            )
+            if wait:
+                metrics.increment("ratelimit.rejected")
+                response = too_many_requests("Too many requests", wait)
+                await response(scope, receive, send)
+                return
+        if self.admission is None or path not in ADMITTED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        line = (payload.get("representation_id"), payload.get("offer_id"))
+        if not all(isinstance(line_id, str) for line_id in line):
+            # Left to the validation of the route
+            await self.app(scope, receive, send)
+            return
+        if not self.admission.enter(line):
+            metrics.increment("admission.rejected")
+            response = too_many_requests(
+                "This item is in high demand, please try again",
+                self.admission.retry_after,
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.leave(line)
+
+
+def build_rate_limiter(kind: str, shared_path: str) -> RateLimiter | None:
+    """
+    Build the rate limiter described by the configuration
+    :param kind: "memory", "shared" or "none"
+    :param shared_path: Path of the SQLite file used by the shared store
+    :return: The rate limiter, or None if rate limiting is disabled
+    """
+    if kind == "none":
+        return None
+    store = SharedBucketStore(shared_path) if kind == "shared" else MemoryBucketStore()
+    return RateLimiter(
+        store,
+        RATE_LIMIT_USER_RATE,
+        RATE_LIMIT_USER_BURST,
+        RATE_LIMIT_IP_RATE,
+        RATE_LIMIT_IP_BURST,
+    )
+
+
+rate_limiter = build_rate_limiter(RATE_LIMIT_STORE, RATE_LIMIT_SHARED_PATH)
+admission_controller = (
+    AdmissionController(ADMISSION_MAX_IN_FLIGHT, ADMISSION_RETRY_AFTER)
+    if ADMISSION_MAX_IN_FLIGHT > 0
+    else None
+)
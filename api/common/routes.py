@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException
+
+from common.db.utils import conflict_rates
+from common.metrics import metrics
+from common.prewarm import readiness
+from participations import notifications
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    return {
+        "counters": metrics.snapshot(),
+        "optimistic_concurrency": conflict_rates(),
+        "notifications": (
+            None
+            if notifications.dispatcher is None
+            else notifications.dispatcher.stats()
+        ),
+    }
+
+
+@router.get("/ready")
+def get_ready():
+    """
+    API route telling whether the worker is warm, and can be sent traffic
+    """
+    if not readiness.ready:
+        raise HTTPException(status_code=503, detail="The worker is warming up")
+    return {"ready": True, "warm_up": readiness.report}
@@ -1,10 +1,13 @@
+import functools
 import os
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 
-from sqlmodel import create_engine
-
 from exceptions import UnsetVarError
 
+if TYPE_CHECKING:
+    from sqlalchemy import Engine
+
 load_dotenv()
 
 DEBUG = True
@@ -15,4 +18,207 @@ except KeyError as kerr:
         "You must set the DB_URL env variable (see .env file)"
     ) from kerr
 
-engine = create_engine(DB_URL, echo=DEBUG)
+# Seconds a connection waits for the SQLite write lock held by another worker
+DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", 30))
+DB_JOURNAL_MODE = os.environ.get("DB_JOURNAL_MODE", "WAL")
+# Store the user ids of a SQLite database as 16 bytes instead of 36 characters.
+# It must be set when migrating the database (see the compact keys migration) and
+# must not change afterwards, unless migrating down and up again
+COMPACT_KEYS = os.environ.get("COMPACT_KEYS", "false").lower() in ("1", "true")
+
+# Name of the dialect of the database, known without creating the engine
+DB_DIALECT = DB_URL.split(":", 1)[0].split("+", 1)[0]
+
+# Read replica used by the routes tolerating stale reads (see common.db.replica),
+# for instance a copy kept in sync from the primary SQLite file, or a read-only
+# connection to it: "sqlite:///file:data/db/database?mode=ro&uri=true"
+DB_READ_URL = os.environ.get("DB_READ_URL")
+# Seconds of lag above which the reads fall back to the primary
+DB_READ_MAX_LAG = float(os.environ.get("DB_READ_MAX_LAG", 5))
+# Seconds between two measures of the lag, taken in the background
+DB_READ_CHECK_INTERVAL = float(os.environ.get("DB_READ_CHECK_INTERVAL", 1))
+
+# Coordination of the writes on a line: "pessimistic" takes a lock on the line
+# (see common.db.locks.line_lock), "optimistic" relies on the version columns
+# and retries the conflicting writes
+LINE_LOCKING = os.environ.get("LINE_LOCKING", "pessimistic")
+OPTIMISTIC_RETRIES = int(os.environ.get("OPTIMISTIC_RETRIES", 5))
+# Seconds, doubled at each retry
+OPTIMISTIC_BACKOFF = float(os.environ.get("OPTIMISTIC_BACKOFF", 0.01))
+
+# Multi-process server mode (see serve.py)
+HOST = os.environ.get("HOST", "127.0.0.1")
+PORT = int(os.environ.get("PORT", 8000))
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Response cache of the catalogue routes: "memory", "shared" or "none"
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 16 * 1024 * 1024))
+CACHE_SHARED_PATH = os.environ.get("CACHE_SHARED_PATH", "data/cache/responses")
+
+# Token buckets of the participation routes (see common.ratelimit): "memory",
+# "shared" (a SQLite file shared by the workers) or "none"
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_SHARED_PATH = os.environ.get(
+    "RATE_LIMIT_SHARED_PATH", "data/cache/ratelimit"
+)
+# Requests per second, and bursts, allowed per user and per client IP
+RATE_LIMIT_USER_RATE = float(os.environ.get("RATE_LIMIT_USER_RATE", 5))
+RATE_LIMIT_USER_BURST = int(os.environ.get("RATE_LIMIT_USER_BURST", 10))
+RATE_LIMIT_IP_RATE = float(os.environ.get("RATE_LIMIT_IP_RATE", 100))
+RATE_LIMIT_IP_BURST = int(os.environ.get("RATE_LIMIT_IP_BURST", 200))
+# Write requests processed at once on a line by a worker, 0 for no limit
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 16))
+# Seconds a client rejected by the admission control is asked to wait
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+
+# Virtual waiting room in front of join-event (see waiting_room)
+WAITING_ROOM_ENABLED = os.environ.get("WAITING_ROOM_ENABLED", "false").lower() in (
+    "1",
+    "true",
+)
+# Store of the queues: "memory" (this process only) or "shared" (a SQLite file
+# shared by the workers), required with several workers
+WAITING_ROOM_STORE = os.environ.get(
+    "WAITING_ROOM_STORE", "shared" if WORKERS > 1 else "memory"
+)
+WAITING_ROOM_SHARED_PATH = os.environ.get(
+    "WAITING_ROOM_SHARED_PATH", "data/cache/waiting_room"
+)
+# Key signing the tokens, the same for every worker and shard, required with
+# several workers
+WAITING_ROOM_SECRET = os.environ.get("WAITING_ROOM_SECRET", "")
+WAITING_ROOM_TOKEN_TTL = int(os.environ.get("WAITING_ROOM_TOKEN_TTL", 3600))
+# Shard of the queue positions counter served by this instance (its workers share
+# the store), out of the number of shards
+WAITING_ROOM_SHARD = int(os.environ.get("WAITING_ROOM_SHARD", 0))
+WAITING_ROOM_SHARDS = int(os.environ.get("WAITING_ROOM_SHARDS", 1))
+# Users admitted per second and per representation: the rate starts at the
+# initial one, then adapts to the latency of join-event between the bounds
+WAITING_ROOM_RATE = float(os.environ.get("WAITING_ROOM_RATE", 10))
+WAITING_ROOM_MIN_RATE = float(os.environ.get("WAITING_ROOM_MIN_RATE", 1))
+WAITING_ROOM_MAX_RATE = float(os.environ.get("WAITING_ROOM_MAX_RATE", 200))
+# Seconds
+WAITING_ROOM_TARGET_LATENCY = float(os.environ.get("WAITING_ROOM_TARGET_LATENCY", 0.1))
+
+# Group commit of the participation inserts (see common.db.group_commit): the
+# concurrent joins are written by a single writer, in one transaction per batch of
+# at most GROUP_COMMIT_MAX_BATCH joins, gathered during GROUP_COMMIT_MAX_DELAY
+# seconds at most
+GROUP_COMMIT = os.environ.get("GROUP_COMMIT", "false").lower() in ("1", "true")
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 64))
+GROUP_COMMIT_MAX_DELAY = float(os.environ.get("GROUP_COMMIT_MAX_DELAY", 0.002))
+
+
+# Seconds a participation promoted from a waiting list has to be confirmed, for
+# the offers created without their own confirmation window (see
+# participations.expiry)
+CONFIRMATION_WINDOW = int(os.environ.get("CONFIRMATION_WINDOW", 3600))
+
+
+# Fast lane of the rank and of the promotion of the waiting lists (see
+# participations.fast_lane), and compact rows of the participation listings (see
+# participations.rows), instead of their ORM paths
+FAST_LANE = os.environ.get("FAST_LANE", "true").lower() in ("1", "true")
+
+
+# Admin routes (bulk cancellation), called with this token in the X-Admin-Token
+# header, they are disabled without one. The bulk cancellation runs in
+# transactions of at most BULK_CANCEL_BATCH_SIZE participations
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+BULK_CANCEL_BATCH_SIZE = int(os.environ.get("BULK_CANCEL_BATCH_SIZE", 500))
+
+
+# Exports of the participations of an event (see events.export): at most
+# EXPORT_MAX_CONCURRENT running at once per worker, read in chunks of
+# EXPORT_CHUNK_SIZE rows formatted by a pool of EXPORT_PROCESSES processes, into
+# files of EXPORT_DIR kept EXPORT_TTL seconds. The directory must be shared by the
+# workers (a shared volume with several hosts), which serve the files of each other
+EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", 2))
+EXPORT_PROCESSES = int(os.environ.get("EXPORT_PROCESSES", 2))
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "data/exports")
+EXPORT_TTL = int(os.environ.get("EXPORT_TTL", 3600))
+
+
+# Sales analytics of an event (see events.analytics): default width of the time
+# buckets, and size of the cache of the computed analytics
+ANALYTICS_BUCKET_SECONDS = int(os.environ.get("ANALYTICS_BUCKET_SECONDS", 60))
+ANALYTICS_CACHE_MAX_BYTES = int(
+    os.environ.get("ANALYTICS_CACHE_MAX_BYTES", 4 * 1024 * 1024)
+)
+
+
+# Outbox of the participation transitions (see participations.outbox): entries
+# read per batch, seconds a gap in the ids is waited for before it is skipped, and
+# seconds between two reads of a consumer tailing an empty outbox
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_GAP_GRACE = float(os.environ.get("OUTBOX_GAP_GRACE", 5))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 1))
+
+
+# Notifications of the participations promoted from a waiting list (see
+# participations.notifications): "none", "file" (one JSON message per line in
+# NOTIFICATIONS_FILE) or "smtp". They are queued, at most NOTIFICATIONS_QUEUE_SIZE,
+# sent in batches of NOTIFICATIONS_BATCH_SIZE gathered for at most
+# NOTIFICATIONS_MAX_DELAY seconds, NOTIFICATIONS_CONCURRENCY batches at once, and
+# retried NOTIFICATIONS_MAX_RETRIES times, after NOTIFICATIONS_BACKOFF seconds
+# doubled on each retry
+NOTIFICATIONS = os.environ.get("NOTIFICATIONS", "none")
+NOTIFICATIONS_FILE = os.environ.get(
+    "NOTIFICATIONS_FILE", "data/notifications/messages.ndjson"
+)
+NOTIFICATIONS_QUEUE_SIZE = int(os.environ.get("NOTIFICATIONS_QUEUE_SIZE", 10000))
+NOTIFICATIONS_BATCH_SIZE = int(os.environ.get("NOTIFICATIONS_BATCH_SIZE", 100))
+NOTIFICATIONS_MAX_DELAY = float(os.environ.get("NOTIFICATIONS_MAX_DELAY", 0.05))
+NOTIFICATIONS_CONCURRENCY = int(os.environ.get("NOTIFICATIONS_CONCURRENCY", 4))
+NOTIFICATIONS_MAX_RETRIES = int(os.environ.get("NOTIFICATIONS_MAX_RETRIES", 3))
+NOTIFICATIONS_BACKOFF = float(os.environ.get("NOTIFICATIONS_BACKOFF", 0.5))
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 25))
+SMTP_SENDER = os.environ.get("SMTP_SENDER", "no-reply@localhost")
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "false").lower() in ("1", "true")
+
+
+# Warm up of the app before it reports itself ready (see common.prewarm): the
+# connections opened in the pool, and the days ahead of the representations whose
+# lines are loaded
+PREWARM = os.environ.get("PREWARM", "true").lower() in ("1", "true")
+PREWARM_CONNECTIONS = int(os.environ.get("PREWARM_CONNECTIONS", 5))
+PREWARM_HORIZON_DAYS = float(os.environ.get("PREWARM_HORIZON_DAYS", 7))
+
+# The engines are created on first use rather than at import (see the lifespan of
+# the app), which keeps the start of the processes importing the configuration
+# cheap: config.engine and config.read_engine are still available as attributes
+
+
+@functools.cache
+def get_engine() -> "Engine":
+    from sqlmodel import create_engine
+
+    from common.db.engine import setup_sqlite_transactions
+
+    if DB_DIALECT == "sqlite":
+        engine = create_engine(
+            DB_URL, echo=DEBUG, connect_args={"timeout": DB_BUSY_TIMEOUT}
+        )
+        setup_sqlite_transactions(engine, DB_JOURNAL_MODE)
+        return engine
+    return create_engine(DB_URL, echo=DEBUG)
+
+
+@functools.cache
+def get_read_engine() -> "Engine | None":
+    from sqlmodel import create_engine
+
+    return create_engine(DB_READ_URL, echo=DEBUG) if DB_READ_URL else None
+
+
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,220 @@
+"""
+Sales analytics of an event, for its organizer.
+
+The status, the quantity and the timestamps of every participation of the event
+are read in a single statement into the columns of a DataFrame, from which every
+line (representation, offer) gets, with vectorized aggregations rather than loops
+over ORM instances:
+- its sales curve: the confirmed quantity per time bucket, and its running total
+- the growth of its waiting list: the participations joining it per time bucket,
+  and their running total
+- its funnel: the participations which waited, were promoted, are confirmed, and
+  the conversion of the promoted ones into confirmed ones
+
+The analytics are cached under the watermark of the participations of the event:
+their count, the sum of their versions and the last id of the outbox. Every route
+or job changing a participation writes an outbox entry, whose id is never reused
+(the table is AUTOINCREMENT), unlike the ids of the participations, so any change
+moves the watermark, and the cached analytics are only served while it stands
+still. The count and the versions catch the writes bypassing the outbox.
+
+pandas is imported on the first analytics computed, not with the app, to keep the
+start of the workers short.
+"""
+
+from typing import TYPE_CHECKING
+
+from sqlmodel import Session, func, select
+
+from common.cache import MemoryCacheBackend, ResponseCache, cache_key
+from config import ANALYTICS_CACHE_MAX_BYTES
+from events.models import Representation
+from participations.models import (
+    Participation,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+analytics_cache = ResponseCache(MemoryCacheBackend(ANALYTICS_CACHE_MAX_BYTES))
+
+LINE = ["representation_id", "offer_id"]
+ANALYTICS_COLUMNS = (
+    Participation.representation_id,
+    Participation.offer_id,
+    Participation.status,
+    Participation.quantity,
+    Participation.confirmed_at,
+    Participation.pending_at,
+    Participation.waiting_at,
+)
+
+
+def watermark(session: Session, event_id: str) -> str:
+    """
+    Get the watermark of the participations of an event, moved by any change of
+    one of them
+    :param session: An active session to a database
+    :param event_id: The id of the event
+    """
+    count, versions = session.exec(
+        select(func.count(), func.sum(Participation.version))
+        .join(Representation)
+        .where(Representation.event_id == event_id)
+    ).one()
+    # The last id of the primary key, read from its index
+    last_entry = session.exec(select(func.max(ParticipationOutbox.id))).one()
+    return f"{count}-{versions or 0}-{last_entry or 0}"
+
+
+def load_frame(session: Session, event_id: str) -> "pd.DataFrame":
+    """
+    Read the participations of an event into columns
+    :param session: An active session to a database
+    :param event_id: The id of the event
+    :return: A row per participation, with the columns of ANALYTICS_COLUMNS
+    """
+    import pandas as pd
+
+    result = session.exec(
+        select(*ANALYTICS_COLUMNS)
+        .join(Representation)
+        .where(Representation.event_id == event_id)
+    )
+    frame = pd.DataFrame.from_records(
+        list(result.tuples()), columns=[column.key for column in ANALYTICS_COLUMNS]
+    )
+    for column in ("confirmed_at", "pending_at", "waiting_at"):
+        frame[column] = pd.to_datetime(frame[column])
+    frame["status"] = frame["status"].astype("int64")
+    frame["quantity"] = frame["quantity"].astype("int64")
+    return frame
+
+
+def time_series(frame: "pd.DataFrame", column: str, bucket: int) -> "pd.DataFrame":
+    """
+    Aggregate the participations per line and per time bucket of a timestamp
+    :param frame: The participations, see load_frame
+    :param column: The timestamp bucketed
+    :param bucket: Width of the buckets, in seconds
+    :return: A row per line and bucket with a timestamp in it, with the number of
+    participations, their quantity, and the running totals of both in the line
+    """
+    frame = frame[frame[column].notna()]
+    series = (
+        frame.assign(at=frame[column].dt.floor(f"{bucket}s"))
+        .groupby([*LINE, "at"])
+        .agg(participations=("quantity", "size"), quantity=("quantity", "sum"))
+        .reset_index()
+    )
+    totals = series.groupby(LINE)[["participations", "quantity"]].cumsum()
+    series["cumulative_participations"] = totals["participations"]
+    series["cumulative_quantity"] = totals["quantity"]
+    return series
+
+
+def funnel(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Count the participations of each line at each step towards the confirmation
+    :param frame: The participations, see load_frame
+    :return: A row per line, with the participations which joined the waiting list,
+    those still waiting, those promoted, those still pending, those confirmed, and
+    the share of the promoted ones confirmed
+    """
+    steps = frame.assign(
+        waited=frame["waiting_at"].notna(),
+        waiting=frame["status"] == ParticipationStatus.WAIT_LIST,
+        promoted=frame["pending_at"].notna(),
+        pending=frame["status"] == ParticipationStatus.PENDING,
+        confirmed=frame["status"] == ParticipationStatus.CONFIRMED,
+    )
+    steps["promoted_confirmed"] = steps["promoted"] & steps["confirmed"]
+    counts = (
+        steps.groupby(LINE)[
+            [
+                "waited",
+                "waiting",
+                "promoted",
+                "pending",
+                "confirmed",
+                "promoted_confirmed",
+            ]
+        ]
+        .sum()
+        .reset_index()
+    )
+    counts["conversion"] = (
+        counts["promoted_confirmed"] / counts["promoted"].where(counts["promoted"] > 0)
+    ).round(4)
+    return counts.drop(columns="promoted_confirmed")
+
+
+def records(frame: "pd.DataFrame") -> list[dict]:
+    """
+    Get the rows of a DataFrame as JSON compatible dicts
+    """
+    if "at" in frame:
+        frame = frame.assign(at=frame["at"].dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict("records")
+
+
+def build_analytics(session: Session, event_id: str, bucket: int) -> dict:
+    """
+    Compute the analytics of an event
+    :param session: An active session to a database
+    :param event_id: The id of the event
+    :param bucket: Width of the time buckets, in seconds
+    :return: The sales curve, the growth of the waiting list and the funnel of each
+    line of the event
+    """
+    frame = load_frame(session, event_id)
+    confirmed = frame[frame["status"] == ParticipationStatus.CONFIRMED]
+    lines = {}
+    for name, table in (
+        ("sales", time_series(confirmed, "confirmed_at", bucket)),
+        ("waiting_list", time_series(frame, "waiting_at", bucket)),
+    ):
+        for line_id, rows in table.groupby(LINE):
+            lines.setdefault(line_id, {})[name] = records(rows.drop(columns=LINE))
+    for row in records(funnel(frame)):
+        line_id = (row.pop("representation_id"), row.pop("offer_id"))
+        lines.setdefault(line_id, {})["funnel"] = row
+    return {
+        "event_id": event_id,
+        "bucket_seconds": bucket,
+        "lines": [
+            {
+                "representation_id": representation_id,
+                "offer_id": offer_id,
+                "sales": line.get("sales", []),
+                "waiting_list": line.get("waiting_list", []),
+                "funnel": line["funnel"],
+            }
+            for (representation_id, offer_id), line in sorted(lines.items())
+        ],
+    }
+
+
+def event_analytics(session: Session, event_id: str, bucket: int):
+    """
+    Serve the analytics of an event, computed again only once its participations
+    changed
+    :param session: An active session to a database
+    :param event_id: The id of the event
+    :param bucket: Width of the time buckets, in seconds
+    :return: The JSON response
+    """
+    # Read before the participations: the analytics are at least as recent as the
+    # watermark they are cached under
+    key = cache_key(
+        "event_analytics",
+        event_id=event_id,
+        bucket=bucket,
+        watermark=watermark(session, event_id),
+    )
+    return analytics_cache.respond(
+        key, lambda: build_analytics(session, event_id, bucket)
+    )
@@ -0,0 +1,126 @@
+"""
+Availability document of an event: for each line (representation and offer) on
+sale, the available and total stock, and the length of the waiting list.
+
+The document is stored in the catalogue cache. It is built in full on a miss, in
+one query, and tagged with the stock tag of each offer of the event: the commits
+changing an inventory or a participation invalidate the documents of the offers
+of their lines, without querying the database. Structural changes of the event
+(new representations or offers) invalidate it through the event tag.
+
+The document is not patched cell by cell on each commit, although it was the
+intent: a cell read after a commit may be patched in after the cell of a more
+recent commit, and a cell read before a commit patched in after its
+invalidation, leaving a stale document served until the next change. A document
+is thus dropped on each change of one of its lines and rebuilt on the next read,
+its versions guarding against a build racing a commit.
+"""
+
+import json
+
+from sqlalchemy import ColumnElement, event
+from sqlalchemy.orm import Session as OrmSession, object_session
+from sqlmodel import Session, func, select
+
+from common.cache import cache_key
+from events.cache import catalogue_cache, event_tag, stock_tag
+from events.models import Inventory, Offer
+from participations.models import Participation, ParticipationStatus
+
+LINES_INFO_KEY = "availability_lines"
+
+
+def availability_key(event_id: str) -> str:
+    return cache_key("event_availability", pk=event_id)
+
+
+def line_cells(session: Session, *conditions: ColumnElement) -> list[dict]:
+    """
+    Get the availability of the lines matching the given conditions
+    :param session: An active session to a database
+    :param conditions: Conditions on the inventory and the offer of the lines
+    :return: The cell of the document of each line
+    """
+    waiting_list = (
+        select(func.count())
+        .select_from(Participation)
+        .where(
+            Participation.representation_id == Inventory.representation_id,
+            Participation.offer_id == Inventory.offer_id,
+            Participation.status == ParticipationStatus.WAIT_LIST,
+        )
+        .scalar_subquery()
+    )
+    rows = session.exec(
+        select(
+            Inventory.representation_id,
+            Inventory.offer_id,
+            Inventory.available_stock,
+            Inventory.total_stock,
+            waiting_list.label("waiting_list"),
+        )
+        .join(Offer, Offer.id == Inventory.offer_id)
+        .where(*conditions)
+        .order_by(Inventory.representation_id, Inventory.offer_id)
+    ).all()
+    return [dict(row._mapping) for row in rows]
+
+
+def build_availability(session: Session, event_id: str) -> bytes:
+    """
+    Build the availability document of an event in full, and store it
+    :param session: An active session to a database
+    :param event_id: The id of the event
+    :return: The JSON document
+    """
+    offer_ids = set(session.exec(select(Offer.id).where(Offer.event_id == event_id)))
+    tags = (event_tag(event_id), *(stock_tag(offer_id) for offer_id in offer_ids))
+    versions = catalogue_cache.versions(tags)
+    # The lines are read in a transaction begun after the versions were taken: a
+    # commit changing them invalidates the versions unless the read sees it
+    with Session(session.get_bind()) as build_session:
+        cells = line_cells(build_session, Offer.event_id == event_id)
+    body = json.dumps({"event_id": event_id, "lines": cells}).encode()
+    if {cell["offer_id"] for cell in cells} <= offer_ids:
+        # Otherwise an offer created since is not in the tags
+        catalogue_cache.store(availability_key(event_id), body, tags, versions)
+    return body
+
+
+def line_changed(session: OrmSession, representation_id: str, offer_id: str) -> None:
+    """
+    Mark a line to be invalidated once the session commits. It is done for
+    every inventory or participation flushed by the session, but must be done by
+    hand for the bulk statements, which bypass the mapper events.
+    :param session: The session changing the line
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    """
+    session.info.setdefault(LINES_INFO_KEY, set()).add((representation_id, offer_id))
+
+
+def _collect_lines(mapper, connection, target: Inventory | Participation) -> None:
+    session = object_session(target)
+    if session is not None:
+        line_changed(session, target.representation_id, target.offer_id)
+
+
+for model in (Inventory, Participation):
+    for event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, event_name, _collect_lines)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_committed(session: OrmSession) -> None:
+    if session.in_nested_transaction():
+        # Released savepoint, the lines are invalidated once the transaction commits
+        return
+    lines = session.info.pop(LINES_INFO_KEY, None)
+    if lines:
+        catalogue_cache.invalidate({stock_tag(offer_id) for _, offer_id in lines})
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_rolled_back(session: OrmSession) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop(LINES_INFO_KEY, None)
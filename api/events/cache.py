@@ -0,0 +1,77 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from common.cache import ResponseCache, build_backend
+from config import CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_SHARED_PATH
+from events.models import Event, Offer, Representation
+
+catalogue_cache = ResponseCache(
+    build_backend(CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_SHARED_PATH)
+)
+
+EVENTS_TAG = "events"
+
+
+def event_tag(event_id: str) -> str:
+    return f"event:{event_id}"
+
+
+def representation_tag(representation_id: str) -> str:
+    return f"representation:{representation_id}"
+
+
+def stock_tag(offer_id: str) -> str:
+    """
+    Tag of the responses rendering the stock or the waiting lists of an offer
+    """
+    return f"stock:{offer_id}"
+
+
+def instance_tags(instance: Event | Representation | Offer) -> set[str]:
+    """
+    Get the cache tags of the catalogue responses depending on an instance. The
+    inventories are only rendered by the responses tagged with the stock of their
+    offer, invalidated per line changed (see events.availability.line_changed).
+    :param instance: A changed instance of one of the catalogue models
+    :return: The tags to invalidate
+    """
+    if isinstance(instance, Event):
+        return {EVENTS_TAG, event_tag(instance.id)}
+    if isinstance(instance, Representation):
+        return {event_tag(instance.event_id), representation_tag(instance.id)}
+    return {event_tag(instance.event_id)}
+
+
+def tags_changed(session: Session, tags: set[str]) -> None:
+    """
+    Mark cache tags to be invalidated once the session commits. It is done for
+    every catalogue instance flushed by the session, but must be done by hand for
+    the bulk statements, which bypass the mapper events.
+    """
+    session.info.setdefault("catalogue_tags", set()).update(tags)
+
+
+def _collect_tags(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        tags_changed(session, instance_tags(target))
+
+
+for model in (Event, Representation, Offer):
+    for event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, event_name, _collect_tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    tags = session.info.pop("catalogue_tags", None)
+    if tags:
+        catalogue_cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop("catalogue_tags", None)
@@ -0,0 +1,337 @@
+"""
+Exports of the participations of an event, for its organizer.
+
+An export runs in the background of the worker: the participations are read in
+chunks, ordered by id, and each chunk is formatted to CSV or NDJSON by a pool of
+processes, so that the formatting of large events does not hold the GIL of the
+worker serving the requests. The chunks are written in order to a file of the
+export directory, named after the id of the job and served once the export is
+done. The progress of an export is the number of rows written out of the rows of
+the event. The jobs are recorded in the export_job table, so that any worker
+answers for them, given an export directory shared by the workers.
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import Engine, and_, or_, update
+from sqlmodel import Session, bindparam, func, select
+
+from common.metrics import metrics
+from config import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_DIR,
+    EXPORT_MAX_CONCURRENT,
+    EXPORT_PROCESSES,
+    EXPORT_TTL,
+)
+from events.models import ExportJob, Representation
+from participations.models import Participation
+from participations.rows import (
+    PARTICIPATION_ROWS,
+    ParticipationRow,
+    dump_rows,
+    event_conditions,
+)
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Columns of the CSV exports, and the labelled columns they are read from
+CSV_COLUMNS = (
+    ("status", "status"),
+    ("quantity", "quantity"),
+    ("confirmed_at", "confirmed_at"),
+    ("pending_at", "pending_at"),
+    ("pending_expires_at", "pending_expires_at"),
+    ("waiting_at", "waiting_at"),
+    ("user_id", "user__id"),
+    ("user_email", "user__email"),
+    ("user_firstname", "user__firstname"),
+    ("user_lastname", "user__lastname"),
+    ("representation_id", "representation__id"),
+    ("representation_start", "representation__start_datetime"),
+    ("representation_end", "representation__end_datetime"),
+    ("offer_id", "offer__id"),
+    ("offer_name", "offer__name"),
+    ("offer_type", "type__label"),
+)
+
+
+# A chunk of the participations of an export, after the participation of id
+# "after"
+EXPORT_CHUNK = (
+    PARTICIPATION_ROWS.where(Participation.id > bindparam("after"))
+    .order_by(Participation.id)
+    .limit(bindparam("chunk_size"))
+)
+
+
+def format_rows(rows: list[ParticipationRow], export_format: str) -> bytes:
+    """
+    Format a chunk of participations, in a process of the pool
+    :param rows: The participations of the chunk
+    :param export_format: "csv", or "ndjson" for the documents of
+    ParticipationSerializer, one per line
+    :return: The formatted chunk
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(
+                row.status.name.lower() if key == "status" else getattr(row, key)
+                for _, key in CSV_COLUMNS
+            )
+        return buffer.getvalue().encode()
+    return "".join(f"{line}\n" for line in dump_rows(rows)).encode()
+
+
+def describe(job: ExportJob) -> dict:
+    done = job.status != "running"
+    return {
+        "id": job.id,
+        "event_id": job.event_id,
+        "format": job.export_format,
+        "status": job.status,
+        "rows": job.rows,
+        "total": job.total,
+        "progress": job.rows / job.total if job.total else float(done),
+        "error": job.error,
+    }
+
+
+class Exporter:
+    """
+    Runner of the exports of a worker, at most max_concurrent at once. The jobs are
+    recorded in the primary database and their files written to a directory shared
+    by the workers, named after the ids of the jobs.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        processes: int,
+        chunk_size: int,
+        directory: str,
+        ttl: int,
+    ):
+        self.max_concurrent = max_concurrent
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.directory = directory
+        self.ttl = ttl
+        # The exports running in this worker, set once done
+        self._running: dict[str, threading.Event] = {}
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Spawned rather than forked, the worker runs threads (group commit,
+                # warm up, exports) that a fork would copy in an unknown state
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def path(self, job: ExportJob) -> str:
+        return os.path.join(self.directory, f"{job.id}.{job.export_format}")
+
+    def _purge(self, engine: Engine) -> None:
+        # The running exports are updated on each chunk written: one left without
+        # update for the TTL was abandoned by a worker which stopped
+        before = datetime.now() - timedelta(seconds=self.ttl)
+        with Session(engine) as session:
+            expired = session.exec(
+                select(ExportJob).where(
+                    or_(
+                        ExportJob.finished_at < before,
+                        and_(
+                            ExportJob.finished_at.is_(None),
+                            ExportJob.updated_at < before,
+                        ),
+                    )
+                )
+            ).all()
+            for job in expired:
+                for path in (self.path(job), f"{self.path(job)}.part"):
+                    if os.path.exists(path):
+                        os.remove(path)
+                session.delete(job)
+            session.commit()
+
+    def start(
+        self,
+        engine: Engine,
+        read_engine: Engine,
+        event_id: str,
+        export_format: str,
+        list_filter: str | None = None,
+    ) -> ExportJob | None:
+        """
+        Start the export of the participations of an event in the background
+        :param engine: An engine to the primary database, recording the job
+        :param read_engine: An engine to the database to read
+        :param event_id: The id of the event
+        :param export_format: "csv" or "ndjson"
+        :param list_filter: "confirmed", "pending" or "wait_list", to only export
+        the participations with this status
+        :return: The job of the export, None if max_concurrent exports are running
+        in the worker
+        """
+        with self._lock:
+            if len(self._running) >= self.max_concurrent:
+                return None
+            now = datetime.now()
+            job = ExportJob(
+                id=uuid.uuid4().hex,
+                event_id=event_id,
+                export_format=export_format,
+                list_filter=list_filter,
+                status="running",
+                created_at=now,
+                updated_at=now,
+            )
+            self._running[job.id] = threading.Event()
+        try:
+            self._purge(engine)
+            os.makedirs(self.directory, exist_ok=True)
+            with Session(engine, expire_on_commit=False) as session:
+                session.add(job)
+                session.commit()
+        except Exception:
+            # Give the slot back, the export never started
+            with self._lock:
+                self._running.pop(job.id).set()
+            raise
+        metrics.increment("exports.started")
+        threading.Thread(
+            target=self.run, args=(engine, read_engine, job), daemon=True
+        ).start()
+        return job
+
+    def _update(self, engine: Engine, job: ExportJob, **values) -> None:
+        """
+        Record the progress of a job
+        :raise LookupError: If the job was purged
+        """
+        with Session(engine) as session:
+            result = session.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job.id)
+                .values(updated_at=datetime.now(), **values)
+            )
+            session.commit()
+        if result.rowcount != 1:
+            raise LookupError(f"The export job {job.id} was purged")
+
+    def run(self, engine: Engine, read_engine: Engine, job: ExportJob) -> None:
+        """
+        Write the export of a job: the chunks are read one after the other, while
+        the previous ones are formatted by the pool, and written in order. The file
+        is renamed to its final name once complete.
+        """
+        pool = self._get_pool()
+        conditions = event_conditions(job.event_id, job.list_filter)
+        query = EXPORT_CHUNK.where(*conditions)
+        in_flight: deque[tuple[int, Future]] = deque()
+        path = self.path(job)
+        rows = 0
+        try:
+            # A single transaction, for a consistent snapshot of the event
+            with Session(read_engine) as session, open(f"{path}.part", "wb") as file:
+                total = session.exec(
+                    select(func.count())
+                    .select_from(Participation)
+                    .join(Representation)
+                    .where(*conditions)
+                ).one()
+                self._update(engine, job, total=total)
+                if job.export_format == "csv":
+                    file.write(
+                        (",".join(name for name, _ in CSV_COLUMNS) + "\r\n").encode()
+                    )
+                after = 0
+                while True:
+                    result = session.exec(
+                        query, params={"after": after, "chunk_size": self.chunk_size}
+                    )
+                    chunk = [ParticipationRow(*row) for row in result.tuples()]
+                    if chunk:
+                        after = chunk[-1].id
+                        in_flight.append(
+                            (
+                                len(chunk),
+                                pool.submit(format_rows, chunk, job.export_format),
+                            )
+                        )
+                    # Keep every process of the pool busy, and write what is ready
+                    written = 0
+                    while in_flight and (not chunk or len(in_flight) > self.processes):
+                        count, formatted = in_flight.popleft()
+                        file.write(formatted.result())
+                        written += count
+                    if written:
+                        rows += written
+                        self._update(engine, job, rows=rows)
+                    if not chunk:
+                        break
+            os.replace(f"{path}.part", path)
+            self._update(engine, job, status="done", finished_at=datetime.now())
+            metrics.increment("exports.rows", rows)
+        except Exception as error:
+            for _, formatted in in_flight:
+                formatted.cancel()
+            for leftover in (f"{path}.part", path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            try:
+                self._update(
+                    engine,
+                    job,
+                    status="failed",
+                    error=str(error),
+                    finished_at=datetime.now(),
+                )
+            except LookupError:
+                pass
+            metrics.increment("exports.failed")
+        finally:
+            with self._lock:
+                self._running.pop(job.id).set()
+
+    def get(self, engine: Engine, job_id: str) -> ExportJob | None:
+        with Session(engine) as session:
+            return session.get(ExportJob, job_id)
+
+    def wait(self, job_id: str, timeout: float | None = None) -> bool:
+        """
+        Wait for an export running in this worker
+        :return: False if it is still running after the timeout
+        """
+        with self._lock:
+            done = self._running.get(job_id)
+        return done is None or done.wait(timeout)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+exporter = Exporter(
+    EXPORT_MAX_CONCURRENT,
+    EXPORT_PROCESSES,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_DIR,
+    EXPORT_TTL,
+)
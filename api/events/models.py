@@ -1,8 +1,10 @@
 from datetime import datetime
 
-from sqlmodel import Field, Relationship
+from sqlalchemy import Index
+from sqlmodel import Field, Relationship, SQLModel
 
-from common.db.models import Model, ItemModel
+from common.db.models import Model, ItemModel, VersionedModel
+from config import CONFIRMATION_WINDOW
 from users.models import Organization
 
 
@@ -42,6 +44,11 @@ class Offer(ItemModel, table=True):
     name: str = Field(max_length=255)
     max_quantity_per_order: int
     description: str = Field(max_length=500)
+    # Seconds a participation promoted from the waiting list has to be confirmed
+    confirmation_window: int = Field(
+        default=CONFIRMATION_WINDOW,
+        sa_column_kwargs={"server_default": str(CONFIRMATION_WINDOW)},
+    )
 
     event_id: str = Field(foreign_key="event.id")
     event: Event = Relationship(back_populates="offers")
@@ -51,7 +58,11 @@ class Offer(ItemModel, table=True):
     participations: list["Participation"] = Relationship(back_populates="offer")
 
 
-class Inventory(ItemModel, table=True):
+class Inventory(ItemModel, VersionedModel, table=True):
+    __table_args__ = (
+        Index("uq_inventory_line", "representation_id", "offer_id", unique=True),
+    )
+
     total_stock: int
     available_stock: int
 
@@ -59,3 +70,27 @@ class Inventory(ItemModel, table=True):
     offer: Offer = Relationship(back_populates="inventories")
     representation_id: str = Field(foreign_key="representation.id")
     representation: Representation = Relationship(back_populates="inventories")
+
+
+class ExportJob(SQLModel, table=True):
+    """
+    Export of the participations of an event, run in the background of a worker
+    (see events.export). Any worker reads its progress, and serves its file from
+    the shared export directory.
+    """
+
+    __tablename__ = "export_job"
+
+    id: str = Field(primary_key=True, max_length=32)
+    event_id: str
+    export_format: str = Field(max_length=8)
+    list_filter: str | None = Field(default=None, max_length=16)
+    # "running", "done" or "failed"
+    status: str = Field(max_length=16)
+    rows: int = 0
+    total: int | None = Field(default=None)
+    error: str | None = Field(default=None)
+    created_at: datetime
+    # Set on each progress of the export, see events.export.Exporter._purge
+    updated_at: datetime
+    finished_at: datetime | None = Field(default=None)
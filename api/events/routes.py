@@ -1,66 +1,197 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session, select, or_
+import os
 
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import FileResponse
+from sqlmodel import Session, select
+
+from common.cache import cache_key, conditional_response
+from common.db.replica import get_replica_router
 from common.db.utils import get_instance_by_id
-from common.dependencies import get_session
-from events.models import Event, Representation, Offer
-from participations.models import Participation
+from common.dependencies import get_read_session, get_session, require_admin
+from common.ratelimit import too_many_requests
+from config import ANALYTICS_BUCKET_SECONDS, FAST_LANE
+from events.analytics import event_analytics
+from events.availability import availability_key, build_availability
+from events.cache import (
+    EVENTS_TAG,
+    catalogue_cache,
+    event_tag,
+    representation_tag,
+)
+from events.export import EXPORT_FORMATS, describe, exporter
+from events.models import Event, ExportJob, Representation
+from participations.models import Participation, ParticipationStatus
+from participations.rows import event_participation_rows, rows_response
 from participations.serializers import ParticipationSerializer
-from users.models import User
 
 router = APIRouter(prefix="/events")
 
+# The catalogue routes load their responses from the primary: a response cached
+# after an invalidation must not be read from a replica missing the change
+
 
 @router.get("/", response_model=list[Event])
 def get_events(session: Session = Depends(get_session)):
-    events = session.exec(select(Event)).all()
-    return events
+    return catalogue_cache.respond(
+        cache_key("get_events"),
+        lambda: session.exec(select(Event)).all(),
+        tags=(EVENTS_TAG,),
+    )
 
 
 @router.get("/{pk}", response_model=Event)
 def get_event_by_pk(pk: str, session: Session = Depends(get_session)):
-    event = get_instance_by_id(Event, pk, session)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found.")
-    return event
+    def load_event() -> Event:
+        event = get_instance_by_id(Event, pk, session)
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found.")
+        return event
+
+    return catalogue_cache.respond(
+        cache_key("get_event_by_pk", pk=pk), load_event, tags=(event_tag(pk),)
+    )
+
+
+@router.get("/{pk}/availability")
+def get_event_availability(
+    pk: str,
+    if_none_match: str | None = Header(default=None),
+    session: Session = Depends(get_session),
+):
+    """
+    API route to get what is on sale for an event: the stock of each representation
+    and offer, and the length of its waiting list (see events.availability).
+    Supports conditional requests through its ETag.
+    """
+    body = catalogue_cache.lookup(availability_key(pk))
+    if body is None:
+        if not get_instance_by_id(Event, pk, session):
+            raise HTTPException(status_code=404, detail="Event not found.")
+        body = build_availability(session, pk)
+    return conditional_response(body, if_none_match)
 
 
 @router.get("/{pk}/representations", response_model=list[Representation])
 def get_representations_for_event(pk: str, session: Session = Depends(get_session)):
-    representations = session.exec(
-        select(Representation).where(Representation.event_id == pk)
-    ).all()
-    return representations
+    return catalogue_cache.respond(
+        cache_key("get_representations_for_event", pk=pk),
+        lambda: session.exec(
+            select(Representation).where(Representation.event_id == pk)
+        ).all(),
+        tags=(event_tag(pk),),
+    )
 
 
 @router.get("/representations/{pk}", response_model=Representation)
 def get_representation(pk: str, session: Session = Depends(get_session)):
-    representation = get_instance_by_id(Representation, pk, session)
-    if not representation:
-        raise HTTPException(status_code=404, detail="Representation not found.")
+    def load_representation() -> Representation:
+        representation = get_instance_by_id(Representation, pk, session)
+        if not representation:
+            raise HTTPException(status_code=404, detail="Representation not found.")
+        return representation
+
+    return catalogue_cache.respond(
+        cache_key("get_representation", pk=pk),
+        load_representation,
+        tags=(representation_tag(pk),),
+    )
 
 
 @router.get("/{pk}/participations", response_model=list[ParticipationSerializer])
 def get_event_participations(
-    pk: str, list_filter: str | None = None, session: Session = Depends(get_session)
+    pk: str,
+    list_filter: str | None = None,
+    session: Session = Depends(get_read_session),
 ):
     if list_filter not in ("confirmed", "pending", "wait_list"):
-        participations = session.exec(
-            select(Participation, Offer, Representation, User)
-            .join(Representation)
-            .join(Offer)
-            .where(
-                Representation.event_id == pk,
-            )
-        ).all()
-    else:
-        participations = session.exec(
-            select(Participation)
-            .join(Representation)
-            .join(Offer)
-            .where(
-                Representation.event_id == pk,
-                or_(getattr(Participation, list_filter) == True),
-            )
-        ).all()
+        list_filter = None
+    if FAST_LANE:
+        return rows_response(event_participation_rows(session, pk, list_filter))
+    query = (
+        select(Participation)
+        .join(Representation)
+        .where(
+            Representation.event_id == pk,
+        )
+    )
+    if list_filter is not None:
+        query = query.where(
+            Participation.status == ParticipationStatus[list_filter.upper()]
+        )
+    participations = session.exec(query).all()
     return participations
+
+
+@router.post("/{pk}/exports", status_code=202, dependencies=[Depends(require_admin)])
+def export_event_participations(
+    pk: str,
+    export_format: str = "csv",
+    list_filter: str | None = None,
+    session: Session = Depends(get_session),
+):
+    """
+    Start the export of the participations of an event, to CSV or NDJSON, in the
+    background (see events.export). The job is recorded on the primary, the
+    participations are read on the read replica when there is a fresh enough one.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unknown export format.")
+    if session.get(Event, pk) is None:
+        raise HTTPException(status_code=404, detail="Event not found.")
+    if list_filter not in ("confirmed", "pending", "wait_list"):
+        list_filter = None
+    job = exporter.start(
+        session.get_bind(),
+        get_replica_router().engine_for_read(),
+        pk,
+        export_format,
+        list_filter,
+    )
+    if job is None:
+        return too_many_requests("Too many exports running", 1)
+    return describe(job)
+
+
+def get_export(job_id: str, session: Session) -> ExportJob:
+    job = exporter.get(session.get_bind(), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export not found.")
+    return job
+
+
+@router.get("/exports/{job_id}", dependencies=[Depends(require_admin)])
+def get_export_progress(job_id: str, session: Session = Depends(get_session)):
+    return describe(get_export(job_id, session))
+
+
+@router.get("/exports/{job_id}/file", dependencies=[Depends(require_admin)])
+def get_export_file(job_id: str, session: Session = Depends(get_session)):
+    job = get_export(job_id, session)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="Export not done.")
+    path = exporter.path(job)
+    if not os.path.exists(path):
+        # Written to a directory this worker does not share
+        raise HTTPException(status_code=404, detail="Export file not found.")
+    return FileResponse(
+        path,
+        media_type=EXPORT_FORMATS[job.export_format],
+        filename=f"{job.event_id}-participations.{job.export_format}",
+    )
+
+
+@router.get("/{pk}/analytics", dependencies=[Depends(require_admin)])
+def get_event_analytics(
+    pk: str,
+    bucket: int = ANALYTICS_BUCKET_SECONDS,
+    session: Session = Depends(get_read_session),
+):
+    """
+    Get the sales curves, the growth of the waiting lists and the funnels of the
+    lines of an event (see events.analytics)
+    """
+    if bucket <= 0:
+        raise HTTPException(status_code=400, detail="Bucket must be positive.")
+    if session.get(Event, pk) is None:
+        raise HTTPException(status_code=404, detail="Event not found.")
+    return event_analytics(session, pk, bucket)
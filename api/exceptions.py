@@ -1,2 +1,10 @@
 class UnsetVarError(Exception):
     pass
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class BusyStoreError(Exception):
+    pass
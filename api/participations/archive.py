@@ -0,0 +1,130 @@
+"""
+Archival of the participations of the finished representations.
+
+The participations are moved, in batches, from the participation table to the
+participation_archive table, so that the live table only holds the lines still
+open. Each batch is moved in its own transaction, leaving room for the requests
+between two batches.
+
+Usage (from the api folder):
+    python -m participations.archive --batch-size 1000
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import DateTime, Engine, String, cast, delete, insert, literal
+from sqlmodel import Session, func, select
+
+from common.metrics import metrics
+from config import get_engine
+from events.models import Representation
+from participations import outbox
+from participations.models import Participation, ParticipationArchive
+
+ARCHIVED_COLUMNS = (
+    "id",
+    "status",
+    "quantity",
+    "confirmed_at",
+    "pending_at",
+    "pending_expires_at",
+    "waiting_at",
+    "user_id",
+    "offer_id",
+    "representation_id",
+)
+
+
+def archive_batch(session: Session, before: datetime, batch_size: int) -> Counter:
+    """
+    Move a batch of participations of the representations ended before a date to
+    the archive
+    :param session: An active session to a database
+    :param before: The representations ended before this date are archived
+    :param batch_size: Maximum number of participations moved
+    :return: The number of participations moved per period
+    """
+    # The period is the month of the end of the representation, the datetimes are
+    # stored, or cast, as ISO strings on every dialect
+    period = func.substr(cast(Representation.end_datetime, String), 1, 7)
+    rows = session.exec(
+        select(Participation.id, period)
+        .join(Representation)
+        .where(Representation.end_datetime < before)
+        .order_by(Participation.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return Counter()
+    ids = [participation_id for participation_id, _ in rows]
+    archived = select(
+        *(getattr(Participation, column) for column in ARCHIVED_COLUMNS),
+        period,
+        literal(datetime.now(), DateTime),
+    ).join(Representation)
+    session.execute(
+        insert(ParticipationArchive).from_select(
+            [*ARCHIVED_COLUMNS, "period", "archived_at"],
+            archived.where(Participation.id.in_(ids)),
+        )
+    )
+    # The participations leave the live table, as on a cancellation
+    outbox.record_selected(session, "archive", Participation.id.in_(ids), None)
+    session.execute(delete(Participation).where(Participation.id.in_(ids)))
+    session.commit()
+    return Counter(period for _, period in rows)
+
+
+def archive_finished(
+    engine: Engine, before: datetime | None = None, batch_size: int = 1000
+) -> dict:
+    """
+    Move every participation of the representations ended before a date to the
+    archive, batch by batch
+    :param engine: An engine to the database
+    :param before: The representations ended before this date are archived, now by
+    default
+    :param batch_size: Maximum number of participations moved per transaction
+    :return: The report of the run: the number of participations archived in total
+    and per period, the number of batches and the timings
+    """
+    before = before or datetime.now()
+    periods = Counter()
+    batches = []
+    with Session(engine) as session:
+        while True:
+            start = time.perf_counter()
+            moved = archive_batch(session, before, batch_size)
+            if not moved:
+                break
+            batches.append(time.perf_counter() - start)
+            periods.update(moved)
+    archived = sum(periods.values())
+    metrics.increment("archive.rows", archived)
+    return {
+        "archived": archived,
+        "periods": dict(sorted(periods.items())),
+        "batches": len(batches),
+        "seconds": sum(batches),
+        "slowest_batch_seconds": max(batches, default=0.0),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        help="Archive the representations ended before this date, now by default",
+    )
+    args = parser.parse_args()
+    print(
+        json.dumps(
+            archive_finished(get_engine(), args.before, args.batch_size), indent=2
+        )
+    )
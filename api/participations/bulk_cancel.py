@@ -0,0 +1,315 @@
+"""
+Bulk cancellation of the participations of a representation, when the organizer
+cancels it.
+
+Every participation of the representation, or of one of its offers, is deleted
+whatever its status: the confirmed ones are refunded from the outbox entries of
+the job (reason "bulk_cancel", from the confirmed status). Nothing is promoted
+from the waiting lists, which are deleted as the rest, since the show is gone.
+The participations are deleted in batches, each in its own transaction holding
+the lock of the lines, so that the write lock is never held for long and the
+other lines keep selling between two batches. Once none is left, the stock of the
+lines is restored in one statement, in the transaction finding none: an
+interrupted job leaves the lines short of the stock of the participations
+already deleted, never oversold, and a new job finishes the work.
+
+A job runs in the background of the worker which started it, its progress is
+read from the bulk_cancel_job table by any worker.
+
+Usage (from the api folder):
+    python -m participations.bulk_cancel rep_001 --offer-id off_001 --batch-size 500
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import ColumnElement, Engine, delete, tuple_, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, select
+
+from common.db.locks import lines_lock
+from common.db.utils import is_write_conflict
+from common.metrics import metrics
+from config import (
+    BULK_CANCEL_BATCH_SIZE,
+    OPTIMISTIC_BACKOFF,
+    OPTIMISTIC_RETRIES,
+    get_engine,
+)
+from events.availability import line_changed
+from events.models import Inventory
+from participations import outbox
+from participations.models import BulkCancelJob, Participation, ParticipationStatus
+
+
+def line_conditions(
+    model: type[Inventory] | type[Participation],
+    representation_id: str,
+    offer_id: str | None,
+) -> list[ColumnElement]:
+    conditions = [model.representation_id == representation_id]
+    if offer_id is not None:
+        conditions.append(model.offer_id == offer_id)
+    return conditions
+
+
+def describe(job: BulkCancelJob) -> dict:
+    return {
+        "id": job.id,
+        "representation_id": job.representation_id,
+        "offer_id": job.offer_id,
+        "status": job.status,
+        "cancelled": job.confirmed + job.pending + job.wait_list,
+        "statuses": {
+            "confirmed": job.confirmed,
+            "pending": job.pending,
+            "wait_list": job.wait_list,
+        },
+        "refunded_quantity": job.refunded_quantity,
+        "restored_stock": job.restored_stock,
+        "batches": job.batches,
+        "error": job.error,
+    }
+
+
+def restore_stock(session: Session, job: BulkCancelJob) -> None:
+    """
+    Give the lines of a job their whole stock back, once their participations are
+    deleted, in one statement, and count it in the job
+    :param session: The session which found no participation left
+    :param job: The job
+    :raise StaleDataError: If a line changed since it was read (see
+    LINE_LOCKING="optimistic")
+    """
+    lines = session.exec(
+        select(
+            Inventory.id,
+            Inventory.version,
+            Inventory.representation_id,
+            Inventory.offer_id,
+            Inventory.total_stock - Inventory.available_stock,
+        ).where(*line_conditions(Inventory, job.representation_id, job.offer_id))
+    ).all()
+    if not lines:
+        return
+    restored = session.execute(
+        update(Inventory)
+        .where(
+            tuple_(Inventory.id, Inventory.version).in_(
+                [(line[0], line[1]) for line in lines]
+            )
+        )
+        .values(available_stock=Inventory.total_stock, version=Inventory.version + 1)
+    )
+    if restored.rowcount != len(lines):
+        raise StaleDataError("A line changed during the restoration of its stock")
+    for _, _, representation_id, offer_id, _ in lines:
+        line_changed(session, representation_id, offer_id)
+    session.execute(
+        update(BulkCancelJob)
+        .where(BulkCancelJob.id == job.id)
+        .values(restored_stock=sum(line[4] for line in lines))
+    )
+
+
+def cancel_batch(
+    session: Session, job: BulkCancelJob, lines: list[tuple[str, str]], batch_size: int
+) -> int:
+    """
+    Delete a batch of the participations of the representation of a job, and
+    count them in the job, in one transaction. Once none is left, the stock of the
+    lines is restored instead (see restore_stock).
+    :param session: An active session to a database
+    :param job: The job
+    :param lines: The ids of the representation and of the offer of each line
+    :param batch_size: Maximum number of participations deleted
+    :return: The number of participations deleted, 0 once none is left
+    :raise StaleDataError: If a participation of the batch, or a line, changed
+    concurrently (see LINE_LOCKING="optimistic")
+    """
+    lines_lock(session, lines)
+    rows = session.exec(
+        select(
+            Participation.id,
+            Participation.representation_id,
+            Participation.offer_id,
+            Participation.status,
+            Participation.quantity,
+        )
+        .where(*line_conditions(Participation, job.representation_id, job.offer_id))
+        .order_by(Participation.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        restore_stock(session, job)
+        session.commit()
+        return 0
+    batch = Participation.id.in_([row.id for row in rows])
+    outbox.record_selected(session, "bulk_cancel", batch, None)
+    if session.execute(delete(Participation).where(batch)).rowcount != len(rows):
+        raise StaleDataError("A participation changed during its cancellation")
+    for row in rows:
+        line_changed(session, row.representation_id, row.offer_id)
+    statuses = Counter(row.status for row in rows)
+    session.execute(
+        update(BulkCancelJob)
+        .where(BulkCancelJob.id == job.id)
+        .values(
+            confirmed=BulkCancelJob.confirmed + statuses[ParticipationStatus.CONFIRMED],
+            pending=BulkCancelJob.pending + statuses[ParticipationStatus.PENDING],
+            wait_list=BulkCancelJob.wait_list + statuses[ParticipationStatus.WAIT_LIST],
+            refunded_quantity=BulkCancelJob.refunded_quantity
+            + sum(
+                row.quantity
+                for row in rows
+                if row.status == ParticipationStatus.CONFIRMED
+            ),
+            batches=BulkCancelJob.batches + 1,
+        )
+    )
+    session.commit()
+    return len(rows)
+
+
+class BulkCanceller:
+    """
+    Runner of the bulk cancellations started by a worker
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._threads: set[threading.Thread] = set()
+        self._lock = threading.Lock()
+
+    def create(
+        self, engine: Engine, representation_id: str, offer_id: str | None = None
+    ) -> BulkCancelJob:
+        """
+        Record a new job
+        :param engine: An engine to the database
+        :param representation_id: The id of the representation
+        :param offer_id: The id of the offer, to only cancel its line
+        :return: The job
+        """
+        with Session(engine, expire_on_commit=False) as session:
+            job = BulkCancelJob(
+                id=uuid.uuid4().hex,
+                representation_id=representation_id,
+                offer_id=offer_id,
+                status="running",
+                created_at=datetime.now(),
+            )
+            session.add(job)
+            session.commit()
+        metrics.increment("bulk_cancel.started")
+        return job
+
+    def start(
+        self, engine: Engine, representation_id: str, offer_id: str | None = None
+    ) -> BulkCancelJob:
+        """
+        Start a job in the background, see create
+        """
+        job = self.create(engine, representation_id, offer_id)
+        thread = threading.Thread(
+            target=self._run_thread, args=(engine, job), daemon=True
+        )
+        with self._lock:
+            self._threads.add(thread)
+        thread.start()
+        return job
+
+    def _run_thread(self, engine: Engine, job: BulkCancelJob) -> None:
+        try:
+            self.run(engine, job)
+        finally:
+            with self._lock:
+                self._threads.discard(threading.current_thread())
+
+    def run(self, engine: Engine, job: BulkCancelJob) -> dict:
+        """
+        Cancel the participations of a job batch by batch, until none is left. A
+        batch conflicting with a concurrent write is retried after a backoff, at
+        most OPTIMISTIC_RETRIES times in a row.
+        :param engine: An engine to the database
+        :param job: The job
+        :return: The report of the job, see describe
+        """
+        conflicts = 0
+        try:
+            with Session(engine) as session:
+                lines = session.exec(
+                    select(Inventory.representation_id, Inventory.offer_id).where(
+                        *line_conditions(Inventory, job.representation_id, job.offer_id)
+                    )
+                ).all()
+                lines = [tuple(line) for line in lines]
+                session.rollback()
+                while True:
+                    try:
+                        cancelled = cancel_batch(session, job, lines, self.batch_size)
+                    except (StaleDataError, OperationalError) as error:
+                        if (
+                            not is_write_conflict(error)
+                            or conflicts >= OPTIMISTIC_RETRIES
+                        ):
+                            raise
+                        session.rollback()
+                        time.sleep(
+                            OPTIMISTIC_BACKOFF * 2**conflicts * random.uniform(0.5, 1)
+                        )
+                        conflicts += 1
+                        continue
+                    conflicts = 0
+                    metrics.increment("bulk_cancel.rows", cancelled)
+                    if not cancelled:
+                        break
+            status, error = "done", None
+        except Exception as exception:
+            status, error = "failed", str(exception)
+            metrics.increment("bulk_cancel.failed")
+        with Session(engine) as session:
+            session.execute(
+                update(BulkCancelJob)
+                .where(BulkCancelJob.id == job.id)
+                .values(status=status, error=error, finished_at=datetime.now())
+            )
+            session.commit()
+            return describe(session.get(BulkCancelJob, job.id))
+
+    def get(self, engine: Engine, job_id: str) -> dict | None:
+        with Session(engine) as session:
+            job = session.get(BulkCancelJob, job_id)
+            return None if job is None else describe(job)
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """
+        Wait for the jobs of the worker to finish
+        :param timeout: Seconds to wait for each job
+        """
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+
+bulk_canceller = BulkCanceller(BULK_CANCEL_BATCH_SIZE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("representation_id")
+    parser.add_argument("--offer-id", help="Only cancel the line of this offer")
+    parser.add_argument("--batch-size", type=int, default=BULK_CANCEL_BATCH_SIZE)
+    args = parser.parse_args()
+    canceller = BulkCanceller(args.batch_size)
+    engine = get_engine()
+    job = canceller.create(engine, args.representation_id, args.offer_id)
+    print(json.dumps(canceller.run(engine, job), indent=2))
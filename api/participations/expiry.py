@@ -0,0 +1,165 @@
+"""
+Expiry of the participations promoted from a waiting list and not confirmed in
+time.
+
+A promotion sets the deadline of the confirmation of a participation,
+pending_expires_at, from the confirmation window of its offer. The expired
+participations, and those still pending in time, are then ranges of the index on
+(status, pending_expires_at), rather than every pending participation loaded and
+checked one by one.
+
+The sweep releases the expired participations line by line, each line in its own
+transaction holding its lock: they are deleted, and their quantity is offered to
+the next participations of the waiting list, as on a cancel, the rest going back
+to the stock. A line whose write conflicts with a concurrent one is left to the
+next run.
+
+Usage (from the api folder):
+    python -m participations.expiry --now 2025-07-15T20:00:00
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, bindparam, func, select
+
+from common.db.locks import line_lock
+from common.db.utils import is_write_conflict
+from common.metrics import metrics
+from config import FAST_LANE, get_engine
+from participations import fast_lane, outbox
+from participations.models import Participation, ParticipationStatus
+from participations.routes import LINE_INVENTORY, promote_waiting
+
+EXPIRED = (
+    Participation.status == ParticipationStatus.PENDING,
+    Participation.pending_expires_at <= bindparam("now"),
+)
+EXPIRED_LINES = (
+    select(Participation.representation_id, Participation.offer_id)
+    .where(*EXPIRED)
+    .distinct()
+)
+LINE_EXPIRED = (
+    select(Participation)
+    .where(
+        *EXPIRED,
+        Participation.representation_id == bindparam("representation_id"),
+        Participation.offer_id == bindparam("offer_id"),
+    )
+    .order_by(Participation.id)
+)
+PENDING_BY_LINE = (
+    select(
+        Participation.representation_id,
+        Participation.offer_id,
+        func.count().label("participations"),
+        func.sum(Participation.quantity).label("quantity"),
+    )
+    .where(
+        Participation.status == ParticipationStatus.PENDING,
+        Participation.pending_expires_at > bindparam("now"),
+    )
+    .group_by(Participation.representation_id, Participation.offer_id)
+    .order_by(Participation.representation_id, Participation.offer_id)
+)
+
+
+def expire_line(
+    session: Session, representation_id: str, offer_id: str, now: datetime
+) -> tuple[int, int]:
+    """
+    Release the expired participations of a line, and promote its waiting list
+    with their quantity
+    :param session: An active session to a database
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :param now: The participations whose deadline passed at this time are released
+    :return: The number of participations released, and their quantity
+    """
+    line_lock(session, representation_id, offer_id)
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    expired = session.exec(LINE_EXPIRED, params={**line, "now": now}).all()
+    if not expired:
+        session.rollback()
+        return 0, 0
+    inventory = session.exec(LINE_INVENTORY, params=line).one()
+    quantity = 0
+    for participation in expired:
+        outbox.record(
+            session, "expiry", participation, ParticipationStatus.PENDING, None
+        )
+        session.delete(participation)
+        quantity += participation.quantity
+    promote = fast_lane.promote_waiting if FAST_LANE else promote_waiting
+    left = promote(session, representation_id, offer_id, quantity, now)
+    if left > 0:
+        inventory.available_stock += left
+    session.commit()
+    return len(expired), quantity
+
+
+def pending_by_line(session: Session, now: datetime) -> list[dict]:
+    """
+    Count the participations of each line still pending in time
+    :param session: An active session to a database
+    :param now: The participations whose deadline passed at this time are left out
+    :return: A count and a quantity per line
+    """
+    rows = session.exec(PENDING_BY_LINE, params={"now": now}).mappings()
+    return [dict(row) for row in rows]
+
+
+def expire_pending(engine: Engine, now: datetime | None = None) -> dict:
+    """
+    Release every expired participation, line by line
+    :param engine: An engine to the database
+    :param now: The participations whose deadline passed at this time are
+    released, now by default
+    :return: The report of the run: the participations released and their quantity,
+    the lines swept and those left to the next run after a conflict, the
+    participations still pending in time per line, and the timings
+    """
+    now = now or datetime.now()
+    start = time.perf_counter()
+    released = quantity = conflicts = 0
+    with Session(engine) as session:
+        lines = session.exec(EXPIRED_LINES, params={"now": now}).all()
+        session.rollback()
+        for representation_id, offer_id in lines:
+            try:
+                count, freed = expire_line(session, representation_id, offer_id, now)
+            except (StaleDataError, OperationalError) as error:
+                if not is_write_conflict(error):
+                    raise
+                session.rollback()
+                conflicts += 1
+                continue
+            released += count
+            quantity += freed
+        pending = pending_by_line(session, now)
+    metrics.increment("expiry.rows", released)
+    return {
+        "released": released,
+        "released_quantity": quantity,
+        "lines": len(lines),
+        "conflicts": conflicts,
+        "pending": pending,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--now",
+        type=datetime.fromisoformat,
+        help="Release the participations expired at this date, now by default",
+    )
+    args = parser.parse_args()
+    print(json.dumps(expire_pending(get_engine(), args.now), indent=2))
@@ -0,0 +1,335 @@
+"""
+Fast lane of the hot participation paths: the rank on a waiting list and the
+promotion of the waiting list on a cancel, made with statements on columns rather
+than through loaded ORM instances and their lazy loaded relationships.
+
+The rank, the length of the waiting list and everything displayed with them are
+read in one statement, for one line or for every line of a user. The promotion
+reads the candidates of the line in one statement and promotes them in one
+UPDATE. The rank and the promotion answer as the ORM paths of
+participations.routes, which they replace when FAST_LANE is set, except for the
+participations which joined a waiting list at the exact same time: they are
+ranked one after the other instead of sharing the last position.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, and_, bindparam, func, select
+
+from common.db.dialects import queries
+from events.availability import line_changed
+from events.models import Event, Offer, OfferType, Representation
+from participations import notifications, outbox
+from participations.models import Participation, ParticipationStatus
+from users.models import User
+
+LINE = (Participation.representation_id, Participation.offer_id)
+# Position of each participation on the waiting list of its line, ties on the
+# waiting time being broken by the order of insertion
+POSITION = (
+    func.row_number()
+    .over(partition_by=LINE, order_by=(Participation.waiting_at, Participation.id))
+    .label("position")
+)
+TOTAL = func.count().over(partition_by=LINE).label("total")
+# Columns of the representation and of the offer of a line displayed with a
+# participation, labelled "relationship__column" (see nest)
+LINE_DISPLAY = (
+    Representation.id.label("representation__id"),
+    Representation.start_datetime.label("representation__start_datetime"),
+    Representation.end_datetime.label("representation__end_datetime"),
+    Event.id.label("event__id"),
+    Event.title.label("event__title"),
+    Event.description.label("event__description"),
+    Event.thumbnail_url.label("event__thumbnail_url"),
+    Event.venue_name.label("event__venue_name"),
+    Event.venue_address.label("event__venue_address"),
+    Event.timezone.label("event__timezone"),
+    Offer.id.label("offer__id"),
+    Offer.name.label("offer__name"),
+    OfferType.label.label("type__label"),
+)
+
+WAITING_LINE = (
+    select(
+        Participation.user_id,
+        Participation.representation_id,
+        Participation.offer_id,
+        POSITION,
+        TOTAL,
+    )
+    .where(
+        Participation.status == ParticipationStatus.WAIT_LIST,
+        Participation.representation_id == bindparam("representation_id"),
+        Participation.offer_id == bindparam("offer_id"),
+    )
+    .subquery("waiting_line")
+)
+WAITING_RANK = (
+    select(
+        WAITING_LINE.c.position,
+        WAITING_LINE.c.total,
+        User.id.label("user__id"),
+        User.email.label("user__email"),
+        User.firstname.label("user__firstname"),
+        User.lastname.label("user__lastname"),
+        *LINE_DISPLAY,
+    )
+    .select_from(WAITING_LINE)
+    .join(User, User.id == WAITING_LINE.c.user_id)
+    .join(Representation, Representation.id == WAITING_LINE.c.representation_id)
+    .join(Event, Event.id == Representation.event_id)
+    .join(Offer, Offer.id == WAITING_LINE.c.offer_id)
+    .join(OfferType, OfferType.id == Offer.type_id)
+    .where(WAITING_LINE.c.user_id == bindparam("user_id"))
+)
+
+# Rank of each participation of a user on a waiting list, counting the
+# participations before it on its line. The lines are ranked together by one
+# aggregate over their waiting lists, which is cheaper than numbering every
+# waiting list with window functions once the user waits in dozens of lines
+WAITING = aliased(Participation, name="waiting")
+USER_WAITING_RANKS = (
+    select(
+        Participation.id,
+        func.sum(
+            case(
+                (
+                    or_(
+                        WAITING.waiting_at < Participation.waiting_at,
+                        and_(
+                            WAITING.waiting_at == Participation.waiting_at,
+                            WAITING.id <= Participation.id,
+                        ),
+                    ),
+                    1,
+                ),
+                else_=0,
+            )
+        ).label("position"),
+        func.count().label("total"),
+    )
+    .join(
+        WAITING,
+        and_(
+            WAITING.representation_id == Participation.representation_id,
+            WAITING.offer_id == Participation.offer_id,
+            WAITING.status == ParticipationStatus.WAIT_LIST,
+        ),
+    )
+    .where(
+        Participation.user_id == bindparam("user_id"),
+        Participation.status == ParticipationStatus.WAIT_LIST,
+    )
+    .group_by(Participation.id)
+    .subquery("user_waiting_ranks")
+)
+USER_PARTICIPATIONS = (
+    select(
+        Participation.status,
+        Participation.quantity,
+        Participation.confirmed_at,
+        Participation.pending_at,
+        Participation.pending_expires_at,
+        Participation.waiting_at,
+        USER_WAITING_RANKS.c.position,
+        USER_WAITING_RANKS.c.total,
+        *LINE_DISPLAY,
+    )
+    .outerjoin(USER_WAITING_RANKS, USER_WAITING_RANKS.c.id == Participation.id)
+    .join(Representation, Representation.id == Participation.representation_id)
+    .join(Event, Event.id == Representation.event_id)
+    .join(Offer, Offer.id == Participation.offer_id)
+    .join(OfferType, OfferType.id == Offer.type_id)
+    .where(Participation.user_id == bindparam("user_id"))
+    .order_by(Representation.start_datetime, Participation.id)
+)
+PROMOTION_CANDIDATES = queries.lock_rows(
+    select(Participation.id, Participation.quantity).where(
+        Participation.representation_id == bindparam("representation_id"),
+        Participation.offer_id == bindparam("offer_id"),
+        Participation.quantity <= bindparam("quantity"),
+        Participation.status == ParticipationStatus.WAIT_LIST,
+    )
+    # In the order of POSITION, the first in line is the first promoted
+    .order_by(Participation.waiting_at, Participation.id)
+)
+PROMOTE = (
+    update(Participation)
+    .where(
+        Participation.id.in_(bindparam("ids", expanding=True)),
+        Participation.status == ParticipationStatus.WAIT_LIST,
+    )
+    .values(
+        status=ParticipationStatus.PENDING,
+        pending_at=bindparam("pending_at"),
+        pending_expires_at=bindparam("pending_expires_at"),
+        version=Participation.version + 1,
+    )
+    .execution_options(synchronize_session=False)
+)
+CONFIRMATION_WINDOW = select(Offer.confirmation_window).where(
+    Offer.id == bindparam("offer_id")
+)
+
+
+def nest(row: dict, prefix: str) -> dict:
+    """
+    Gather the columns of a row labelled with a prefix ("prefix__column")
+    """
+    start = f"{prefix}__"
+    return {
+        name.removeprefix(start): value
+        for name, value in row.items()
+        if name.startswith(start)
+    }
+
+
+def line_display(row: dict) -> dict:
+    """
+    Nest the representation and the offer of a row selecting LINE_DISPLAY
+    """
+    return {
+        "representation": {
+            **nest(row, "representation"),
+            "event": nest(row, "event"),
+        },
+        "offer": {**nest(row, "offer"), "type": nest(row, "type")},
+    }
+
+
+def waiting_rank(
+    session: Session, user_id: str, representation_id: str, offer_id: str
+) -> dict | None:
+    """
+    Get the rank of a user on the waiting list of a line, in a single statement
+    :param session: An active session to a database
+    :param user_id: The id of the user
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :return: The rank, as described by WaitingListRankSerializer, None if the user
+    is not on the waiting list
+    """
+    row = (
+        session.exec(
+            WAITING_RANK,
+            params={
+                "user_id": user_id,
+                "representation_id": representation_id,
+                "offer_id": offer_id,
+            },
+        )
+        .mappings()
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        "user": nest(row, "user"),
+        **line_display(row),
+        "position": row["position"],
+        "total": row["total"],
+    }
+
+
+def user_participations(session: Session, user_id: str) -> list[dict]:
+    """
+    Get every participation of a user, with its rank for those on a waiting list,
+    in a single statement whatever the number of lines
+    :param session: An active session to a database
+    :param user_id: The id of the user
+    :return: The participations, as described by UserParticipationSerializer, in
+    the order of their representations
+    """
+    rows = session.exec(USER_PARTICIPATIONS, params={"user_id": user_id}).mappings()
+    return [
+        {
+            "quantity": row["quantity"],
+            "confirmed_at": row["confirmed_at"],
+            "pending_at": row["pending_at"],
+            "pending_expires_at": row["pending_expires_at"],
+            "waiting_at": row["waiting_at"],
+            "confirmed": row["status"] == ParticipationStatus.CONFIRMED,
+            "pending": row["status"] == ParticipationStatus.PENDING,
+            "wait_list": row["status"] == ParticipationStatus.WAIT_LIST,
+            **line_display(row),
+            "position": row["position"],
+            "total": row["total"],
+        }
+        for row in rows
+    ]
+
+
+def confirmation_deadline(session: Session, offer_id: str, now: datetime) -> datetime:
+    """
+    Get the deadline of the confirmation of a participation promoted at a time
+    :param session: An active session to a database
+    :param offer_id: The id of the offer of the participation
+    :param now: The time of the promotion
+    :return: The end of the confirmation window of the offer
+    """
+    window = session.exec(CONFIRMATION_WINDOW, params={"offer_id": offer_id}).one()
+    return now + timedelta(seconds=window)
+
+
+def promote_waiting(
+    session: Session,
+    representation_id: str,
+    offer_id: str,
+    quantity: int,
+    now: datetime,
+) -> int:
+    """
+    Set to pending the first participations on the waiting list of a line that fit
+    in a quantity freed by a cancel, in the order they joined it, skipping those
+    asking for more than what is left
+    :param session: An active session to a database, holding the lock of the line
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :param quantity: The quantity freed
+    :param now: The time of the promotion
+    :return: The quantity left once the promoted participations are served
+    :raise StaleDataError: If a candidate was promoted or left the waiting list
+    concurrently (see LINE_LOCKING="optimistic")
+    """
+    candidates = session.exec(
+        PROMOTION_CANDIDATES,
+        params={
+            "representation_id": representation_id,
+            "offer_id": offer_id,
+            "quantity": quantity,
+        },
+    )
+    promoted = []
+    for participation_id, asked in candidates:
+        if asked <= quantity:
+            promoted.append(participation_id)
+            quantity -= asked
+        if quantity == 0:
+            break
+    candidates.close()
+    if promoted:
+        outbox.record_selected(
+            session,
+            "promotion",
+            Participation.id.in_(promoted),
+            ParticipationStatus.PENDING,
+        )
+        result = session.execute(
+            PROMOTE,
+            params={
+                "ids": promoted,
+                "pending_at": now,
+                "pending_expires_at": confirmation_deadline(session, offer_id, now),
+            },
+        )
+        notifications.promoted(session, promoted)
+        if result.rowcount != len(promoted):
+            raise StaleDataError(
+                "A participation of the waiting list changed during its promotion"
+            )
+        line_changed(session, representation_id, offer_id)
+    return quantity
@@ -1,24 +1,185 @@
 from datetime import datetime
+from enum import IntEnum
 
-from sqlmodel import Field, Relationship
+from sqlalchemy import Index
+from sqlmodel import Field, Relationship, SQLModel
 
-from common.db.models import Model
+from common.db.models import IntEnumType, Model, UUIDString, VersionedModel
+from config import COMPACT_KEYS
 from events.models import Representation, Offer
 from users.models import User
 
 
-class Participation(Model, table=True):
-    confirmed: bool = Field(default=False)
-    pending: bool = Field(default=False)
-    wait_list: bool = Field(default=False)
+class ParticipationStatus(IntEnum):
+    CONFIRMED = 1
+    PENDING = 2
+    WAIT_LIST = 3
+
+
+class Participation(Model, VersionedModel, table=True):
+    # Every query on participations filters on a line and a status, and the waiting
+    # list is ordered by waiting time
+    __table_args__ = (
+        Index(
+            "ix_participation_line_status",
+            "representation_id",
+            "offer_id",
+            "status",
+            "waiting_at",
+        ),
+        # A user takes part only once in a line
+        Index(
+            "uq_participation_user_line",
+            "user_id",
+            "representation_id",
+            "offer_id",
+            unique=True,
+        ),
+        # The expired pending participations, and those still in time, are ranges
+        # of this index
+        Index("ix_participation_pending_expiry", "status", "pending_expires_at"),
+    )
+
+    status: ParticipationStatus = Field(sa_type=IntEnumType(ParticipationStatus))
     quantity: int
     confirmed_at: datetime | None = Field(default=None)
     pending_at: datetime | None = Field(default=None)
+    # Deadline of the confirmation of a pending participation, set on its promotion
+    pending_expires_at: datetime | None = Field(default=None)
     waiting_at: datetime | None = Field(default=None)
 
-    user_id: str = Field(foreign_key="user.id")
+    user_id: str = Field(
+        foreign_key="user.id", sa_type=UUIDString(compact=COMPACT_KEYS)
+    )
     user: User = Relationship(back_populates="participations")
     offer_id: str = Field(foreign_key="offer.id")
     offer: Offer = Relationship(back_populates="participations")
     representation_id: str = Field(foreign_key="representation.id")
     representation: Representation = Relationship(back_populates="participations")
+
+    @property
+    def confirmed(self) -> bool:
+        return self.status == ParticipationStatus.CONFIRMED
+
+    @property
+    def pending(self) -> bool:
+        return self.status == ParticipationStatus.PENDING
+
+    @property
+    def wait_list(self) -> bool:
+        return self.status == ParticipationStatus.WAIT_LIST
+
+
+class ParticipationArchive(SQLModel, table=True):
+    """
+    Participations of the finished representations, moved out of the participation
+    table by the archival job (see participations.archive). They are partitioned by
+    period, the month the representation ended.
+    """
+
+    __tablename__ = "participation_archive"
+    __table_args__ = (
+        Index("ix_participation_archive_user_period", "user_id", "period"),
+        Index("ix_participation_archive_period", "period"),
+    )
+
+    # The id of the archived participation
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    period: str = Field(max_length=7)
+    archived_at: datetime
+    status: ParticipationStatus = Field(sa_type=IntEnumType(ParticipationStatus))
+    quantity: int
+    confirmed_at: datetime | None = Field(default=None)
+    pending_at: datetime | None = Field(default=None)
+    pending_expires_at: datetime | None = Field(default=None)
+    waiting_at: datetime | None = Field(default=None)
+
+    user_id: str = Field(
+        foreign_key="user.id", sa_type=UUIDString(compact=COMPACT_KEYS)
+    )
+    offer_id: str = Field(foreign_key="offer.id")
+    offer: Offer = Relationship()
+    representation_id: str = Field(foreign_key="representation.id")
+    representation: Representation = Relationship()
+
+    @property
+    def confirmed(self) -> bool:
+        return self.status == ParticipationStatus.CONFIRMED
+
+    @property
+    def pending(self) -> bool:
+        return self.status == ParticipationStatus.PENDING
+
+    @property
+    def wait_list(self) -> bool:
+        return self.status == ParticipationStatus.WAIT_LIST
+
+
+class ParticipationOutbox(SQLModel, table=True):
+    """
+    Outbox of the state transitions of the participations, written in the
+    transaction of each transition and read in the order of its ids by the
+    downstream consumers (see participations.outbox)
+    """
+
+    __tablename__ = "participation_outbox"
+    # The ids are never reused, even once the outbox is pruned
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: int | None = Field(default=None, primary_key=True)
+    # The participation may not exist anymore
+    participation_id: int
+    user_id: str = Field(sa_type=UUIDString(compact=COMPACT_KEYS))
+    representation_id: str
+    offer_id: str
+    quantity: int
+    # None before the participation was created and after it was deleted
+    from_status: ParticipationStatus | None = Field(
+        default=None, sa_type=IntEnumType(ParticipationStatus)
+    )
+    to_status: ParticipationStatus | None = Field(
+        default=None, sa_type=IntEnumType(ParticipationStatus)
+    )
+    # The route or job making the transition
+    reason: str = Field(max_length=32)
+    created_at: datetime
+
+
+class OutboxOffset(SQLModel, table=True):
+    """
+    Id of the last entry of the participation outbox handled by each consumer
+    """
+
+    __tablename__ = "outbox_offset"
+
+    consumer: str = Field(primary_key=True, max_length=64)
+    position: int
+    updated_at: datetime
+
+
+class BulkCancelJob(SQLModel, table=True):
+    """
+    Bulk cancellation of the participations of a representation, run in the
+    background (see participations.bulk_cancel). Its counters are updated in the
+    transaction of each batch.
+    """
+
+    __tablename__ = "bulk_cancel_job"
+
+    id: str = Field(primary_key=True, max_length=32)
+    representation_id: str
+    # The whole representation when None
+    offer_id: str | None = Field(default=None)
+    # "running", "done" or "failed"
+    status: str = Field(max_length=16)
+    confirmed: int = 0
+    pending: int = 0
+    wait_list: int = 0
+    # Quantity of the confirmed participations, to refund
+    refunded_quantity: int = 0
+    # Quantity given back to the stock, once the waiting lists are served
+    restored_stock: int = 0
+    batches: int = 0
+    error: str | None = Field(default=None)
+    created_at: datetime
+    finished_at: datetime | None = Field(default=None)
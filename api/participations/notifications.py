@@ -0,0 +1,403 @@
+"""
+Notifications of the participations promoted from a waiting list.
+
+A cancel promotes the first participations of the waiting list to pending, and
+their users have until the end of the confirmation window of the offer to confirm.
+The promotion path only marks the promoted participations on its session: once the
+transaction commits, their ids are handed to the dispatcher, without waiting, so
+the notifications add no latency to the cancel, and are never sent for a
+promotion rolled back.
+
+The dispatcher runs an asyncio loop in a thread of the worker. Its bounded queue
+drops the notifications beyond its size rather than holding the requests (the
+promotions stay readable in the participation outbox, see participations.outbox).
+The queued notifications are gathered in batches, their messages built with one
+query per batch, and each batch is sent by the transport, a few batches at once.
+A failed batch is retried with an exponential backoff.
+
+The transports are pluggable: SMTPTransport sends the batch through one SMTP
+connection, FileTransport appends the messages to a file, one JSON document per
+line, as a local stand-in and for the tests.
+"""
+
+import asyncio
+import json
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Protocol
+
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from common.metrics import metrics
+from config import (
+    NOTIFICATIONS,
+    NOTIFICATIONS_BACKOFF,
+    NOTIFICATIONS_BATCH_SIZE,
+    NOTIFICATIONS_CONCURRENCY,
+    NOTIFICATIONS_FILE,
+    NOTIFICATIONS_MAX_DELAY,
+    NOTIFICATIONS_MAX_RETRIES,
+    NOTIFICATIONS_QUEUE_SIZE,
+    SMTP_HOST,
+    SMTP_PASSWORD,
+    SMTP_PORT,
+    SMTP_SENDER,
+    SMTP_STARTTLS,
+    SMTP_USERNAME,
+)
+from events.models import Event, Offer, Representation
+from participations.models import Participation, ParticipationStatus
+from users.models import User
+
+PROMOTED_INFO_KEY = "promoted_participations"
+# Window of the throughput reported by NotificationDispatcher.stats, in seconds
+THROUGHPUT_WINDOW = 60
+
+PROMOTED_MESSAGES = (
+    select(
+        Participation.id,
+        Participation.quantity,
+        Participation.pending_expires_at,
+        User.email,
+        User.firstname,
+        Event.title,
+        Representation.start_datetime,
+        Offer.name,
+    )
+    .join(User, User.id == Participation.user_id)
+    .join(Representation, Representation.id == Participation.representation_id)
+    .join(Event, Event.id == Representation.event_id)
+    .join(Offer, Offer.id == Participation.offer_id)
+    # Still pending when the batch is sent
+    .where(Participation.status == ParticipationStatus.PENDING)
+)
+
+
+class Transport(Protocol):
+    async def send(self, messages: list[dict]) -> None:
+        """
+        Send a batch of messages, each with "to", "subject" and "body"
+        :raise: Any error, the whole batch is then retried
+        """
+
+
+class FileTransport:
+    """
+    Local stand-in of the SMTP transport, appending the messages to a file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, messages: list[dict]) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as file:
+                file.writelines(f"{json.dumps(message)}\n" for message in messages)
+
+    async def send(self, messages: list[dict]) -> None:
+        await asyncio.to_thread(self._write, messages)
+
+
+class SMTPTransport:
+    """
+    Transport sending each batch through a single connection to an SMTP server
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        username: str = "",
+        password: str = "",
+        starttls: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _send(self, messages: list[dict]) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                smtp.send_message(email)
+
+    async def send(self, messages: list[dict]) -> None:
+        await asyncio.to_thread(self._send, messages)
+
+
+def build_transport(kind: str) -> Transport | None:
+    """
+    Build the transport described by the configuration
+    :param kind: "smtp", "file" or "none"
+    :return: The transport, or None if the notifications are disabled
+    """
+    if kind == "smtp":
+        return SMTPTransport(
+            SMTP_HOST,
+            SMTP_PORT,
+            SMTP_SENDER,
+            SMTP_USERNAME,
+            SMTP_PASSWORD,
+            SMTP_STARTTLS,
+        )
+    if kind == "file":
+        return FileTransport(NOTIFICATIONS_FILE)
+    return None
+
+
+def build_messages(engine: Engine, participation_ids: list[int]) -> list[dict]:
+    """
+    Build the messages of the promoted participations, in one query
+    :param engine: An engine to the database of the participations
+    :param participation_ids: The ids of the promoted participations
+    :return: A message per participation still pending
+    """
+    with Session(engine) as session:
+        rows = session.exec(
+            PROMOTED_MESSAGES.where(Participation.id.in_(participation_ids))
+        ).all()
+    return [
+        {
+            "participation_id": row.id,
+            "to": row.email,
+            "subject": f"A place is available for {row.title}",
+            "body": (
+                f"Hello {row.firstname},\n\n"
+                f"{row.quantity} x {row.name} for {row.title} on "
+                f"{row.start_datetime:%Y-%m-%d %H:%M} became available for you. "
+                "Confirm your participation before "
+                f"{row.pending_expires_at:%Y-%m-%d %H:%M} to keep it."
+            ),
+        }
+        for row in rows
+    ]
+
+
+class NotificationDispatcher:
+    """
+    Sender of the notifications of the promoted participations, in the background
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        max_queue: int,
+        batch_size: int,
+        max_delay: float,
+        concurrency: int,
+        max_retries: int,
+        backoff: float,
+    ):
+        self.transport = transport
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[tuple[Engine, int]] | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._sent: deque[tuple[float, int]] = deque()
+
+    def submit(self, engine: Engine, participation_ids: list[int]) -> None:
+        """
+        Queue the notifications of promoted participations, without waiting
+        :param engine: An engine to the database of the participations
+        :param participation_ids: The ids of the participations
+        """
+        self._start()
+        self._loop.call_soon_threadsafe(self._enqueue, engine, participation_ids)
+
+    def _enqueue(self, engine: Engine, participation_ids: list[int]) -> None:
+        for participation_id in participation_ids:
+            try:
+                self._queue.put_nowait((engine, participation_id))
+            except asyncio.QueueFull:
+                metrics.increment("notifications.dropped")
+            else:
+                metrics.increment("notifications.queued")
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run, args=(ready,), name="notifications", daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+
+    def _run(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._loop.create_task(self._dispatch())
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+        # Stopped by shutdown
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+
+    async def _next_batch(self) -> list[tuple[Engine, int]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(
+                    await asyncio.wait_for(
+                        self._queue.get(), max(deadline - self._loop.time(), 0)
+                    )
+                )
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            batch = await self._next_batch()
+            # Wait for a free slot before gathering the next batch
+            await slots.acquire()
+            self._in_flight += 1
+            task = self._loop.create_task(self._send(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _send(self, batch: list[tuple[Engine, int]]) -> None:
+        try:
+            by_engine: dict[Engine, list[int]] = {}
+            for engine, participation_id in batch:
+                by_engine.setdefault(engine, []).append(participation_id)
+            for engine, participation_ids in by_engine.items():
+                messages = await asyncio.to_thread(
+                    build_messages, engine, participation_ids
+                )
+                if messages:
+                    await self._send_with_retries(messages)
+        except Exception:
+            metrics.increment("notifications.failed", len(batch))
+        finally:
+            self._in_flight -= 1
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _send_with_retries(self, messages: list[dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.transport.send(messages)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                metrics.increment("notifications.retries")
+                await asyncio.sleep(self.backoff * 2**attempt)
+            else:
+                metrics.increment("notifications.batches")
+                metrics.increment("notifications.sent", len(messages))
+                self._sent.append((time.monotonic(), len(messages)))
+                return
+
+    def stats(self) -> dict:
+        """
+        Get the state of the dispatcher: the notifications queued, the batches
+        being sent and the notifications sent per second over the last minute
+        """
+        horizon = time.monotonic() - THROUGHPUT_WINDOW
+        while self._sent and self._sent[0][0] < horizon:
+            self._sent.popleft()
+        return {
+            "queued": 0 if self._queue is None else self._queue.qsize(),
+            "in_flight": self._in_flight,
+            "sent_per_second": sum(count for _, count in self._sent)
+            / THROUGHPUT_WINDOW,
+        }
+
+    def flush(self, timeout: float | None = None) -> None:
+        """
+        Wait until every queued notification was sent, or failed
+        """
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop).result(timeout)
+
+    def shutdown(self, timeout: float) -> None:
+        """
+        Send what is queued, for at most timeout seconds, and stop the loop
+        """
+        if self._thread is None:
+            return
+        try:
+            self.flush(timeout)
+        except TimeoutError:
+            metrics.increment("notifications.dropped", self._queue.qsize())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+def promoted(session: OrmSession, participation_ids: list[int]) -> None:
+    """
+    Mark participations promoted by a session, to be notified once it commits
+    :param session: The session promoting the participations
+    :param participation_ids: The ids of the participations
+    """
+    session.info.setdefault(PROMOTED_INFO_KEY, []).extend(participation_ids)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _notify_committed(session: OrmSession) -> None:
+    if session.in_nested_transaction():
+        return
+    participation_ids = session.info.pop(PROMOTED_INFO_KEY, None)
+    if participation_ids and dispatcher is not None:
+        dispatcher.submit(session.get_bind(), participation_ids)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_rolled_back(session: OrmSession) -> None:
+    if not session.in_nested_transaction():
+        # A savepoint rolled back keeps the promotions of the transaction
+        session.info.pop(PROMOTED_INFO_KEY, None)
+
+
+transport = build_transport(NOTIFICATIONS)
+dispatcher = (
+    NotificationDispatcher(
+        transport,
+        NOTIFICATIONS_QUEUE_SIZE,
+        NOTIFICATIONS_BATCH_SIZE,
+        NOTIFICATIONS_MAX_DELAY,
+        NOTIFICATIONS_CONCURRENCY,
+        NOTIFICATIONS_MAX_RETRIES,
+        NOTIFICATIONS_BACKOFF,
+    )
+    if transport is not None
+    else None
+)
@@ -0,0 +1,238 @@
+"""
+Outbox of the state transitions of the participations.
+
+Every route or job changing the status of a participation, creating or deleting
+one, writes an entry to the participation_outbox table in the same transaction:
+an entry exists if and only if its transition was committed. The downstream
+consumers (notifications, analytics, caches) tail the outbox in the order of its
+ids, batch by batch, from the offset they committed after their last batch,
+instead of scanning the participations again. A consumer handles each entry at
+least once: an entry handled but whose offset was not committed is read again.
+
+The ids are allocated when the entries are inserted but become visible when their
+transactions commit, so a reader may see an id before a lower one still being
+committed. A batch thus stops before a gap in the ids until OUTBOX_GAP_GRACE
+seconds have passed, after which the missing id is taken as rolled back.
+
+Usage (from the api folder):
+    python -m participations.outbox notifications --batch-size 100 --follow
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import ColumnElement, Engine, insert, literal
+from sqlmodel import Session, select
+
+from config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_GAP_GRACE,
+    OUTBOX_POLL_INTERVAL,
+    get_engine,
+)
+from participations.models import (
+    OutboxOffset,
+    Participation,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+
+
+def record(
+    session: Session,
+    reason: str,
+    participation: Participation,
+    from_status: ParticipationStatus | None,
+    to_status: ParticipationStatus | None,
+) -> None:
+    """
+    Write the transition of a participation to the outbox, in the transaction of
+    the session
+    :param session: The session making the transition
+    :param reason: The route or job making the transition
+    :param participation: The participation, flushed
+    :param from_status: Its status before the transition, None if it is created
+    :param to_status: Its status after the transition, None if it is deleted
+    """
+    session.add(
+        ParticipationOutbox(
+            participation_id=participation.id,
+            user_id=participation.user_id,
+            representation_id=participation.representation_id,
+            offer_id=participation.offer_id,
+            quantity=participation.quantity,
+            from_status=from_status,
+            to_status=to_status,
+            reason=reason,
+            created_at=datetime.now(),
+        )
+    )
+
+
+def record_selected(
+    session: Session,
+    reason: str,
+    condition: ColumnElement[bool],
+    to_status: ParticipationStatus | None,
+) -> None:
+    """
+    Write the transitions of the participations matching a condition to the
+    outbox, in one INSERT ... SELECT, before a bulk statement makes them
+    :param session: The session making the transitions
+    :param reason: The route or job making the transitions
+    :param condition: The condition on the participations
+    :param to_status: Their status after the transition, None if they are deleted
+    """
+    session.execute(
+        insert(ParticipationOutbox).from_select(
+            [
+                "participation_id",
+                "user_id",
+                "representation_id",
+                "offer_id",
+                "quantity",
+                "from_status",
+                "to_status",
+                "reason",
+                "created_at",
+            ],
+            select(
+                Participation.id,
+                Participation.user_id,
+                Participation.representation_id,
+                Participation.offer_id,
+                Participation.quantity,
+                Participation.status,
+                literal(to_status, ParticipationOutbox.__table__.c.to_status.type),
+                literal(reason),
+                literal(datetime.now()),
+            )
+            .where(condition)
+            .order_by(Participation.id),
+        )
+    )
+
+
+def entry(outbox: ParticipationOutbox) -> dict:
+    return {
+        "id": outbox.id,
+        "participation_id": outbox.participation_id,
+        "user_id": outbox.user_id,
+        "representation_id": outbox.representation_id,
+        "offer_id": outbox.offer_id,
+        "quantity": outbox.quantity,
+        "from_status": outbox.from_status and outbox.from_status.name.lower(),
+        "to_status": outbox.to_status and outbox.to_status.name.lower(),
+        "reason": outbox.reason,
+        "created_at": outbox.created_at.isoformat(),
+    }
+
+
+def read_batch(
+    session: Session,
+    after: int,
+    limit: int = OUTBOX_BATCH_SIZE,
+    gap_grace: float = OUTBOX_GAP_GRACE,
+) -> list[dict]:
+    """
+    Read the entries of the outbox following an id, up to the first gap in the ids
+    younger than gap_grace
+    :param session: An active session to a database
+    :param after: The id of the last entry handled, 0 to read from the start
+    :param limit: Maximum number of entries read
+    :param gap_grace: Seconds a missing id is waited for
+    :return: The entries, in the order of their ids
+    """
+    entries = session.exec(
+        select(ParticipationOutbox)
+        .where(ParticipationOutbox.id > after)
+        .order_by(ParticipationOutbox.id)
+        .limit(limit)
+    ).all()
+    recent = datetime.now() - timedelta(seconds=gap_grace)
+    batch = []
+    # A new consumer starts from the first entry left, whatever its id
+    expected = after + 1 if after else None
+    for outbox in entries:
+        gap = expected is not None and outbox.id != expected
+        if gap and outbox.created_at > recent:
+            break
+        batch.append(entry(outbox))
+        expected = outbox.id + 1
+    return batch
+
+
+def get_offset(session: Session, consumer: str) -> int:
+    """
+    Get the id of the last entry handled by a consumer, 0 for a new one
+    """
+    offset = session.get(OutboxOffset, consumer)
+    return 0 if offset is None else offset.position
+
+
+def commit_offset(session: Session, consumer: str, position: int) -> int:
+    """
+    Commit the id of the last entry handled by a consumer. An offset never moves
+    back, so that a late commit can not make a consumer handle entries again.
+    :param session: An active session to a database
+    :param consumer: The name of the consumer
+    :param position: The id of the last entry handled
+    :return: The offset of the consumer
+    """
+    offset = session.get(OutboxOffset, consumer, with_for_update=True)
+    if offset is None:
+        offset = OutboxOffset(consumer=consumer, position=position)
+    offset.position = max(offset.position, position)
+    offset.updated_at = datetime.now()
+    session.add(offset)
+    session.commit()
+    return offset.position
+
+
+def tail(
+    engine: Engine,
+    consumer: str,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    follow: bool = False,
+    poll_interval: float = OUTBOX_POLL_INTERVAL,
+) -> Iterator[list[dict]]:
+    """
+    Read the outbox from the offset of a consumer, batch by batch. The offset is
+    committed once the consumer asks for the next batch, after handling the
+    previous one.
+    :param engine: An engine to the database
+    :param consumer: The name of the consumer
+    :param batch_size: Maximum number of entries per batch
+    :param follow: Wait for new entries once the outbox is read, rather than stop
+    :param poll_interval: Seconds between two reads of an empty outbox
+    :return: The batches of entries
+    """
+    with Session(engine) as session:
+        position = get_offset(session, consumer)
+        while True:
+            batch = read_batch(session, position, batch_size)
+            # Ends the read transaction, the next read sees the new entries
+            session.commit()
+            if batch:
+                yield batch
+                position = commit_offset(session, consumer, batch[-1]["id"])
+            elif follow:
+                time.sleep(poll_interval)
+            else:
+                return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("consumer")
+    parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+    parser.add_argument(
+        "--follow", action="store_true", help="Wait for new entries at the end"
+    )
+    args = parser.parse_args()
+    for entries in tail(get_engine(), args.consumer, args.batch_size, args.follow):
+        for outbox_entry in entries:
+            print(json.dumps(outbox_entry))
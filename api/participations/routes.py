@@ -1,26 +1,108 @@
 from datetime import datetime
+from typing import Callable
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
+from sqlalchemy import delete
 from sqlalchemy.exc import NoResultFound
-from sqlmodel import Session, exists, select, func
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session, and_, bindparam, exists, func, literal, select
 
-from common.db.utils import get_instance_by_id
-from common.db.utils import create
-from common.dependencies import get_session
+from common.db.dialects import queries
+from common.db.group_commit import group_writer
+from common.db.utils import retry_on_conflict
+from common.db.locks import line_lock
+from common.dependencies import get_read_session, get_session, require_admin
+from config import FAST_LANE, OUTBOX_BATCH_SIZE
+from events.availability import line_changed
 from events.models import Inventory, Offer, Representation
-from participations.models import Participation
+from participations import fast_lane, notifications, outbox
+from participations.bulk_cancel import bulk_canceller, describe, line_conditions
+from participations.models import (
+    Participation,
+    ParticipationArchive,
+    ParticipationStatus,
+)
 from participations.serializers import (
+    BulkCancelSerializer,
+    OutboxOffsetSerializer,
     ParticipationPostSerializer,
     WaitingListRankSerializer,
     ParticipationSerializer,
     CheckWaitingListRankSerializer,
     ParticipationPostLightSerializer,
+    ParticipationHistorySerializer,
 )
 
 router = APIRouter(prefix="/participations")
 
+# HOT QUERIES
+# The queries of the participation routes are built once, with bound parameters:
+# the cache key of a statement is computed on its first execution and kept on it,
+# so that each request only looks the compiled SQL up in the cache of the engine,
+# instead of building the expression tree and its cache key again
+
+PARTICIPATION_CHECK = (
+    select(
+        exists()
+        .where(
+            Participation.user_id == bindparam("user_id"),
+            Participation.representation_id == bindparam("representation_id"),
+            Participation.offer_id == bindparam("offer_id"),
+        )
+        .label("already_participating"),
+        Offer.id,
+        Offer.event_id,
+        Offer.max_quantity_per_order,
+        Representation.id,
+        Representation.event_id,
+        Inventory,
+    )
+    .select_from(select(literal(1).label("anchor")).subquery())
+    .outerjoin(Offer, Offer.id == bindparam("offer_id"))
+    .outerjoin(Representation, Representation.id == bindparam("representation_id"))
+    .outerjoin(
+        Inventory,
+        and_(
+            Inventory.representation_id == Representation.id,
+            Inventory.offer_id == Offer.id,
+        ),
+    )
+)
+LINE_PARTICIPATION = select(Participation).where(
+    Participation.user_id == bindparam("user_id"),
+    Participation.representation_id == bindparam("representation_id"),
+    Participation.offer_id == bindparam("offer_id"),
+    Participation.status == bindparam("status"),
+)
+LINE_INVENTORY = select(Inventory).where(
+    Inventory.offer_id == bindparam("offer_id"),
+    Inventory.representation_id == bindparam("representation_id"),
+)
+WAITING_LIST_TOTAL = (
+    select(func.count())
+    .select_from(Participation)
+    .where(
+        Participation.status == ParticipationStatus.WAIT_LIST,
+        Participation.representation_id == bindparam("representation_id"),
+        Participation.offer_id == bindparam("offer_id"),
+    )
+)
+WAITING_LIST_POSITION = WAITING_LIST_TOTAL.where(
+    Participation.waiting_at <= bindparam("waiting_at")
+)
+FIRST_WAITING = queries.lock_first(
+    select(Participation)
+    .where(
+        Participation.representation_id == bindparam("representation_id"),
+        Participation.offer_id == bindparam("offer_id"),
+        Participation.quantity <= bindparam("quantity"),
+        Participation.status == ParticipationStatus.WAIT_LIST,
+    )
+    .order_by(Participation.waiting_at, Participation.id)
+)
+
 
 def participation_check(
     user_id: UUID,
@@ -28,40 +110,54 @@ def participation_check(
     representation_id: str,
     quantity: int,
     session: Session,
-) -> tuple[Offer, Representation]:
+) -> Inventory:
     """
     Check that a participation for the given data has not already been created,
-    then checks the existence of the requested offer and representation, and that the
-    desired quantity does not exceed the limit per offer.
+    then checks the existence of the requested offer and representation, that the
+    desired quantity does not exceed the limit per offer, and that the offer is sold
+    for the representation.
+    Everything is fetched in a single query (PARTICIPATION_CHECK), starting from a
+    one row anchor so that a missing offer or representation yields NULL columns
+    rather than no row. Every lookup is made by primary key or by the unique
+    indexes on participation (user_id, representation_id, offer_id) and
+    inventory (representation_id, offer_id).
     :param user_id: Id of the user for whom the participation should be added
     :param offer_id: Id for the offer to purchase
     :param representation_id: Id of the representation for which a prestation is bought
     :param quantity: Number of items desired
     :param session: An active session to a database
-    :return: The offer and the representation for which a participation is desired
+    :return: The inventory of the offer for the representation
     """
-    existing_participations = session.query(
-        exists(Participation).where(
-            Participation.user_id == user_id,
-            Participation.representation_id == representation_id,
-            Participation.offer_id == offer_id,
-        )
-    ).scalar()
-    if existing_participations:
+    check = session.exec(
+        PARTICIPATION_CHECK,
+        params={
+            "user_id": user_id,
+            "offer_id": offer_id,
+            "representation_id": representation_id,
+        },
+    ).one()
+    (
+        existing_participation,
+        found_offer_id,
+        offer_event_id,
+        max_quantity_per_order,
+        found_representation_id,
+        representation_event_id,
+        inventory,
+    ) = check
+    if existing_participation:
         raise HTTPException(
             status_code=500, detail="Your participation has already been acknowledged"
         )
-    offer = get_instance_by_id(Offer, offer_id, session)
-    if not offer:
+    if found_offer_id is None:
         raise HTTPException(
             status_code=404, detail="The requested offer does not exist"
         )
-    representation = get_instance_by_id(Representation, representation_id, session)
-    if not representation:
+    if found_representation_id is None:
         raise HTTPException(
             status_code=404, detail="The requested representation does not exist"
         )
-    if offer.event_id != representation.event_id:
+    if offer_event_id != representation_event_id:
         raise HTTPException(
             status_code=500,
             detail=(
@@ -69,49 +165,82 @@ def participation_check(
                 "they are not part of the same event"
             ),
         )
-    if quantity > offer.max_quantity_per_order:
+    if quantity > max_quantity_per_order:
         raise HTTPException(
             status_code=500,
             detail=(
                 "Your order exceeds the maximum quantity allowed for this item\n"
-                f"Maximum quantity per order: {offer.max_quantity_per_order}"
+                f"Maximum quantity per order: {max_quantity_per_order}"
             ),
         )
-    return offer, representation
+    if inventory is None:
+        raise HTTPException(
+            status_code=404,
+            detail="The requested item is not available for this representation",
+        )
+    return inventory
 
 
-# WAITING LIST
+def insert_participation(session: Session, **values) -> Participation:
+    """
+    Insert a participation, letting the database detect a concurrent insertion of
+    the same participation through the unique index on the user and the line
+    :param session: An active session to a database
+    :param values: The values of the participation
+    :return: The inserted participation
+    """
+    participation = queries.insert_ignoring_conflict(
+        session,
+        Participation,
+        values,
+        ["user_id", "representation_id", "offer_id"],
+    )
+    if participation is None:
+        raise HTTPException(
+            status_code=500, detail="Your participation has already been acknowledged"
+        )
+    line_changed(session, participation.representation_id, participation.offer_id)
+    return participation
 
 
-@router.post(
-    "/join-waiting-list", response_model=ParticipationSerializer, status_code=201
-)
-def join_waiting_list(
-    data: ParticipationPostSerializer, session: Session = Depends(get_session)
-):
+def write_participation(
+    session: Session, data_dict: dict, write: Callable[[Session, dict], Participation]
+) -> Participation:
     """
-    Api route to join the waiting list for a given user, offer, representation
-    and quantity
+    Make the write of a participation on its line, in the transaction of the
+    session, or in the next batch of the group commit writer when it is enabled
+    (see common.db.group_commit)
+    :param session: The session of the route
+    :param data_dict: The participation requested
+    :param write: The function making the write, without committing it
+    :return: The participation written, bound to the session of the route
+    """
+    line = (data_dict["representation_id"], data_dict["offer_id"])
+    if group_writer is not None:
+        participation = group_writer.submit(
+            line, lambda batch_session: write(batch_session, data_dict)
+        )
+        return session.merge(participation, load=False)
+    line_lock(session, *line)
+    participation = write(session, data_dict)
+    session.commit()
+    return participation
+
+
+def add_to_waiting_list(session: Session, data_dict: dict) -> Participation:
+    """
+    Add a user to the waiting list of a line, once its stock is exhausted
+    :param session: An active session to a database, holding the lock of the line
+    :param data_dict: The participation requested
+    :return: The participation on the waiting list
     """
-    data_dict = data.model_dump()
     representation_id = data_dict["representation_id"]
     offer_id = data_dict["offer_id"]
     quantity = data_dict["quantity"]
-    offer, _ = participation_check(
+    inventory = participation_check(
         data_dict["user_id"], offer_id, representation_id, quantity, session
     )
-    try:
-        available_stock = session.exec(
-            select(Inventory.available_stock).where(
-                Inventory.offer_id == offer_id,
-                Inventory.representation_id == representation_id,
-            )
-        ).one()
-    except NoResultFound:
-        raise HTTPException(
-            status_code=404,
-            detail="The requested item is not available for this representation",
-        )
+    available_stock = inventory.available_stock
     if available_stock > 0:
         raise HTTPException(
             status_code=403,
@@ -120,14 +249,80 @@ def join_waiting_list(
                 f"there are still {available_stock} units available"
             ),
         )
-    participation = Participation(
-        wait_list=True, waiting_at=datetime.now(), **data_dict
+    participation = insert_participation(
+        session,
+        status=ParticipationStatus.WAIT_LIST,
+        waiting_at=datetime.now(),
+        **data_dict,
+    )
+    outbox.record(
+        session, "join_waiting_list", participation, None, ParticipationStatus.WAIT_LIST
     )
-    participation = create(participation, session)
     return participation
 
 
+def add_to_event(session: Session, data_dict: dict) -> Participation:
+    """
+    Confirm the participation of a user to a line, taking its quantity from the stock
+    :param session: An active session to a database, holding the lock of the line
+    :param data_dict: The participation requested
+    :return: The confirmed participation
+    """
+    representation_id = data_dict["representation_id"]
+    offer_id = data_dict["offer_id"]
+    quantity = data_dict["quantity"]
+    inventory = participation_check(
+        data_dict["user_id"], offer_id, representation_id, quantity, session
+    )
+    if inventory.available_stock == 0:
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                "This item is out of order for the chosen representation, "
+                "try another offer or join the waiting list"
+            ),
+        )
+    if inventory.available_stock < quantity:
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                "There is not enough stock left for your order.\n"
+                f"Number of items available: {inventory.available_stock}"
+            ),
+        )
+    participation = insert_participation(
+        session,
+        status=ParticipationStatus.CONFIRMED,
+        confirmed_at=datetime.now(),
+        **data_dict,
+    )
+    outbox.record(
+        session, "join_event", participation, None, ParticipationStatus.CONFIRMED
+    )
+    inventory.available_stock = inventory.available_stock - quantity
+    session.add(inventory)
+    return participation
+
+
+# WAITING LIST
+
+
+@router.post(
+    "/join-waiting-list", response_model=ParticipationSerializer, status_code=201
+)
+@retry_on_conflict
+def join_waiting_list(
+    data: ParticipationPostSerializer, session: Session = Depends(get_session)
+):
+    """
+    Api route to join the waiting list for a given user, offer, representation
+    and quantity
+    """
+    return write_participation(session, data.model_dump(), add_to_waiting_list)
+
+
 @router.post("/leave-waiting-list")
+@retry_on_conflict
 def leave_waiting_list(
     data: ParticipationPostLightSerializer, session: Session = Depends(get_session)
 ):
@@ -135,18 +330,32 @@ def leave_waiting_list(
     Api route to leave the waiting list for a given user, offer and representation
     """
     data_dict = data.model_dump()
+    # The participation must not be promoted while it is deleted
+    line_lock(session, data_dict["representation_id"], data_dict["offer_id"])
     try:
         participation = session.exec(
-            select(Participation).where(
-                Participation.user_id == data_dict["user_id"],
-                Participation.representation_id == data_dict["representation_id"],
-                Participation.offer_id == data_dict["offer_id"],
-                Participation.wait_list == True,
-            )
+            LINE_PARTICIPATION,
+            params={**data_dict, "status": ParticipationStatus.WAIT_LIST},
         ).one()
     except NoResultFound:
         raise HTTPException(status_code=404, detail="You are not in the waiting list")
-    session.delete(participation)
+    outbox.record(
+        session,
+        "leave_waiting_list",
+        participation,
+        ParticipationStatus.WAIT_LIST,
+        None,
+    )
+    deleted = session.execute(
+        delete(Participation).where(
+            Participation.id == participation.id,
+            Participation.status == ParticipationStatus.WAIT_LIST,
+        )
+    )
+    if deleted.rowcount != 1:
+        # Promoted since it was read, retried by retry_on_conflict
+        raise StaleDataError("The participation left the waiting list")
+    line_changed(session, participation.representation_id, participation.offer_id)
     session.commit()
     return JSONResponse(
         content="The user has successfully been removed from the waiting list",
@@ -154,55 +363,53 @@ def leave_waiting_list(
     )
 
 
-@router.post(
-    "/check-waiting-status", response_model=WaitingListRankSerializer, status_code=200
-)
-def check_waiting_status(
-    data: CheckWaitingListRankSerializer, session: Session = Depends(get_session)
-):
+def waiting_list_rank(
+    session: Session, representation_id: str, offer_id: str, waiting_at: datetime
+) -> tuple[int, int]:
     """
-    Api route to check the position of a user on the waiting list for a given offer
-    and reprensation
+    Get the total number of participations in the waiting list for the offer and
+    representation, and the position of the one which joined it at the given time
+    :param session: An active session to a database
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :param waiting_at: When the participation joined the waiting list
+    :return: The total and the position
+    """
+    line = {"representation_id": representation_id, "offer_id": offer_id}
+    total = session.exec(WAITING_LIST_TOTAL, params=line).one()
+    position = session.exec(
+        WAITING_LIST_POSITION, params={**line, "waiting_at": waiting_at}
+    ).one()
+    return total, position
+
+
+def waiting_status(
+    session: Session, user_id: str, representation_id: str, offer_id: str
+) -> WaitingListRankSerializer | None:
+    """
+    Get the rank of a user on the waiting list of a line, through the ORM (see
+    fast_lane.waiting_rank for the single statement path)
+    :param session: An active session to a database
+    :param user_id: The id of the user
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :return: The rank, None if the user is not on the waiting list
     """
-    data_dict = data.model_dump()
-    representation_id = data_dict["representation_id"]
-    offer_id = data_dict["offer_id"]
-    # Fetching the waiting list participation
     try:
         participation = session.exec(
-            select(Participation).where(
-                Participation.representation_id == representation_id,
-                Participation.offer_id == offer_id,
-                Participation.user_id == data_dict["user_id"],
-                Participation.wait_list == True,
-            )
+            LINE_PARTICIPATION,
+            params={
+                "user_id": user_id,
+                "representation_id": representation_id,
+                "offer_id": offer_id,
+                "status": ParticipationStatus.WAIT_LIST,
+            },
         ).one()
     except NoResultFound:
-        raise HTTPException(
-            status_code=404,
-            detail="You are not in the waiting list for this product",
-        )
-    # Get the total number of participations in the waiting list for the offer
-    # and representation, and the user's position
-    total = session.exec(
-        select(func.count())
-        .select_from(Participation)
-        .where(
-            Participation.wait_list == True,
-            Participation.representation_id == representation_id,
-            Participation.offer_id == offer_id,
-        )
-    ).one()
-    position = session.exec(
-        select(func.count())
-        .select_from(Participation)
-        .where(
-            Participation.wait_list == True,
-            Participation.representation_id == representation_id,
-            Participation.offer_id == offer_id,
-            Participation.waiting_at <= participation.waiting_at,
-        )
-    ).one()
+        return None
+    total, position = waiting_list_rank(
+        session, representation_id, offer_id, participation.waiting_at
+    )
     return WaitingListRankSerializer(
         user=participation.user,
         representation=participation.representation,
@@ -212,63 +419,105 @@ def check_waiting_status(
     )
 
 
+@router.post(
+    "/check-waiting-status", response_model=WaitingListRankSerializer, status_code=200
+)
+def check_waiting_status(
+    data: CheckWaitingListRankSerializer, session: Session = Depends(get_read_session)
+):
+    """
+    Api route to check the position of a user on the waiting list for a given offer
+    and reprensation. The rank tolerates staleness, it is read on the read replica
+    when there is a fresh enough one
+    """
+    data_dict = data.model_dump()
+    get_rank = fast_lane.waiting_rank if FAST_LANE else waiting_status
+    rank = get_rank(
+        session,
+        data_dict["user_id"],
+        data_dict["representation_id"],
+        data_dict["offer_id"],
+    )
+    if rank is None:
+        raise HTTPException(
+            status_code=404,
+            detail="You are not in the waiting list for this product",
+        )
+    return rank
+
+
 # REGULAR PARTICIPATION
 
 
+def promote_waiting(
+    session: Session,
+    representation_id: str,
+    offer_id: str,
+    quantity: int,
+    now: datetime,
+) -> int:
+    """
+    Set to pending the first participations on the waiting list of a line that fit
+    in a quantity freed by a cancel, through the ORM (see fast_lane.promote_waiting
+    for the single UPDATE path)
+    :param session: An active session to a database, holding the lock of the line
+    :param representation_id: The id of the representation of the line
+    :param offer_id: The id of the offer of the line
+    :param quantity: The quantity freed
+    :param now: The time of the promotion
+    :return: The quantity left once the promoted participations are served
+    """
+    expires_at = None
+    #  Get the first in waiting list according to available stock
+    #  and set his status to pending while tickets are still available for the
+    # demands in the waiting list
+    while quantity > 0:
+        first_waiting = session.exec(
+            FIRST_WAITING,
+            params={
+                "representation_id": representation_id,
+                "offer_id": offer_id,
+                "quantity": quantity,
+            },
+        ).first()
+        if not first_waiting:
+            break
+        if expires_at is None:
+            # Read before any change, which would be flushed with it
+            expires_at = fast_lane.confirmation_deadline(session, offer_id, now)
+        outbox.record(
+            session,
+            "promotion",
+            first_waiting,
+            ParticipationStatus.WAIT_LIST,
+            ParticipationStatus.PENDING,
+        )
+        first_waiting.status = ParticipationStatus.PENDING
+        first_waiting.pending_at = now
+        first_waiting.pending_expires_at = expires_at
+        session.add(first_waiting)
+        # If not all the tickets are gone, we can still try to find if they
+        # can still be sold to someone else on the waiting list
+        quantity = quantity - first_waiting.quantity
+        notifications.promoted(session, [first_waiting.id])
+    return quantity
+
+
 @router.post("/join-event", response_model=ParticipationSerializer, status_code=201)
+@retry_on_conflict
 def join_event(
     data: ParticipationPostSerializer, session: Session = Depends(get_session)
 ):
     """
     API route to make a user join an event for a given offer and representation
     """
-    data_dict = data.model_dump()
-    representation_id = data_dict["representation_id"]
-    offer_id = data_dict["offer_id"]
-    quantity = data_dict["quantity"]
-    offer, _ = participation_check(
-        data_dict["user_id"], offer_id, representation_id, quantity, session
-    )
-    try:
-        inventory = session.exec(
-            select(Inventory).where(
-                Inventory.offer_id == offer_id,
-                Inventory.representation_id == representation_id,
-            )
-        ).one()
-    except NoResultFound:
-        raise HTTPException(
-            status_code=404,
-            detail="The requested item is not available for this representation",
-        )
-    if inventory.available_stock == 0:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "This item is out of order for the chosen representation, "
-                "try another offer or join the waiting list"
-            ),
-        )
-    if inventory.available_stock < quantity:
-        raise HTTPException(
-            status_code=500,
-            detail=(
-                "There is not enough stock left for your order.\n"
-                f"Number of items available: {inventory.available_stock}"
-            ),
-        )
-    participation = Participation(
-        confirmed=True, confirmed_at=datetime.now(), **data_dict
-    )
-    session.add(participation)
-    inventory.available_stock = inventory.available_stock - quantity
-    session.add(inventory)
-    session.commit()
+    participation = write_participation(session, data.model_dump(), add_to_event)
     ParticipationSerializer.model_validate(participation)
     return participation
 
 
 @router.post("/cancel")
+@retry_on_conflict
 def cancel(
     data: ParticipationPostLightSerializer, session: Session = Depends(get_session)
 ):
@@ -277,19 +526,17 @@ def cancel(
     given offer and representation.
     Upon cancel, the inventory is replenished for the number of items associated with
     the participations and users on top of the waiting list wishing for an available
-    quantity are set to pending (it will require validation within 1h or be canceled)
+    quantity are set to pending (it will require validation within the confirmation
+    window of the offer, or be released by participations.expiry)
     """
     data_dict = data.model_dump()
     representation_id = data_dict["representation_id"]
     offer_id = data_dict["offer_id"]
+    line_lock(session, representation_id, offer_id)
     try:
         participation = session.exec(
-            select(Participation).where(
-                Participation.user_id == data_dict["user_id"],
-                Participation.representation_id == representation_id,
-                Participation.offer_id == offer_id,
-                Participation.confirmed == True,
-            )
+            LINE_PARTICIPATION,
+            params={**data_dict, "status": ParticipationStatus.CONFIRMED},
         ).one()
     except NoResultFound:
         raise HTTPException(
@@ -300,40 +547,17 @@ def cancel(
             ),
         )
     inventory = session.exec(
-        select(Inventory).where(
-            Inventory.offer_id == offer_id,
-            Inventory.representation_id == representation_id,
-        )
+        LINE_INVENTORY,
+        params={"representation_id": representation_id, "offer_id": offer_id},
     ).one()
     quantity = participation.quantity
+    outbox.record(session, "cancel", participation, ParticipationStatus.CONFIRMED, None)
     session.delete(participation)
-    #  Get the first in waiting list according to available stock
-    #  and set his status to pending while tickets are still available for the
-    # demands in the waiting list
     # A task triggered by an event sent to a queue would be better though
-    now = datetime.now()
-    while quantity > 0:
-        first_waiting = session.exec(
-            select(Participation)
-            .where(
-                Participation.representation_id == representation_id,
-                Participation.offer_id == offer_id,
-                Participation.quantity <= quantity,
-                Participation.wait_list == True,
-            )
-            .order_by(Participation.waiting_at)
-        ).first()
-        if not first_waiting:
-            break
-        first_waiting.pending = True
-        first_waiting.wait_list = False
-        first_waiting.pending_at = now
-        session.add(first_waiting)
-        session.commit()
-        # If not all the tickets are gone, we can still try to find if they
-        # can still be sold to someone else on the waiting list
-        quantity = quantity - first_waiting.quantity
-        # Here there should be an email notification to the user
+    # The promotions are committed together with the inventory, so that the line
+    # stays locked (see line_lock) until they are over
+    promote = fast_lane.promote_waiting if FAST_LANE else promote_waiting
+    quantity = promote(session, representation_id, offer_id, quantity, datetime.now())
     if quantity > 0:
         inventory.available_stock += quantity
     session.commit()
@@ -345,28 +569,26 @@ def cancel(
 
 
 @router.post("/confirm", response_model=ParticipationSerializer)
+@retry_on_conflict
 def confirm(
     data: ParticipationPostLightSerializer, session: Session = Depends(get_session)
 ):
     """
     API route to confirm a pending (i.e. that just got out of the waiting list)
     participation for a user, for a given offer and representation.
-    If the delay between being set to pending and confirmation exceeds 1 hour, no
-    confirmation is possible and the participation is canceled.
-    Otherwise the participation is confirmed.
+    Once the confirmation window of the offer is over, no confirmation is possible
+    and the participation is released by the expiry sweep (see
+    participations.expiry). Otherwise the participation is confirmed.
     """
     now = datetime.now()
     data_dict = data.model_dump()
     representation_id = data_dict["representation_id"]
     offer_id = data_dict["offer_id"]
+    line_lock(session, representation_id, offer_id)
     try:
         participation = session.exec(
-            select(Participation).where(
-                Participation.representation_id == representation_id,
-                Participation.offer_id == offer_id,
-                Participation.user_id == data_dict["user_id"],
-                Participation.pending == True,
-            )
+            LINE_PARTICIPATION,
+            params={**data_dict, "status": ParticipationStatus.PENDING},
         ).one()
     except NoResultFound:
         raise HTTPException(
@@ -376,18 +598,133 @@ def confirm(
                 "for this item on this representation"
             ),
         )
-    # Let's say that the user has 1 hour to confirm his presence
-    if (now - participation.pending_at).seconds / 3600 > 1:
+    expires_at = participation.pending_expires_at
+    if expires_at is None:
+        # Promoted without a deadline, e.g. by a worker older than the column
+        expires_at = fast_lane.confirmation_deadline(
+            session, offer_id, participation.pending_at
+        )
+    if expires_at <= now:
         raise HTTPException(
             status_code=403,
             detail=(
-                "You have exceeded the 1 hour confirmation window, "
+                "You have exceeded the confirmation window, "
                 "you have lost your place in the waiting line"
             ),
         )
-    participation.confirmed = True
-    participation.pending = False
+    outbox.record(
+        session,
+        "confirm",
+        participation,
+        ParticipationStatus.PENDING,
+        ParticipationStatus.CONFIRMED,
+    )
+    participation.status = ParticipationStatus.CONFIRMED
     participation.confirmed_at = now
     session.add(participation)
     session.commit()
     return participation
+
+
+# BULK CANCELLATION
+
+
+@router.post("/bulk-cancel", status_code=202, dependencies=[Depends(require_admin)])
+def bulk_cancel_participations(
+    data: BulkCancelSerializer, session: Session = Depends(get_session)
+):
+    """
+    Admin API route to cancel every participation of a cancelled representation,
+    or of one of its offers, in the background (see participations.bulk_cancel).
+    The job runs to completion even if the client disconnects, its progress is
+    read from GET /participations/bulk-cancel/{job_id}.
+    """
+    line = session.exec(
+        select(Inventory.id).where(
+            *line_conditions(Inventory, data.representation_id, data.offer_id)
+        )
+    ).first()
+    if line is None:
+        raise HTTPException(
+            status_code=404,
+            detail="The requested item is not available for this representation",
+        )
+    job = bulk_canceller.start(
+        session.get_bind(), data.representation_id, data.offer_id
+    )
+    return describe(job)
+
+
+@router.get("/bulk-cancel/{job_id}", dependencies=[Depends(require_admin)])
+def get_bulk_cancel_progress(job_id: str, session: Session = Depends(get_session)):
+    job = bulk_canceller.get(session.get_bind(), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk cancellation not found.")
+    return job
+
+
+# OUTBOX
+
+
+@router.get("/outbox", dependencies=[Depends(require_admin)])
+def read_outbox(
+    consumer: str | None = None,
+    after: int | None = None,
+    limit: int = OUTBOX_BATCH_SIZE,
+    session: Session = Depends(get_session),
+):
+    """
+    Admin API route to read the next batch of the participation transitions (see
+    participations.outbox), after an id or after the offset of a consumer
+    :param consumer: The name of the consumer, to read from its offset
+    :param after: The id of the last entry handled, overriding the offset
+    :param limit: Maximum number of entries read
+    :return: The entries, and the position to read the next batch from
+    """
+    if after is None:
+        after = 0 if consumer is None else outbox.get_offset(session, consumer)
+    entries = outbox.read_batch(session, after, min(limit, OUTBOX_BATCH_SIZE))
+    return {
+        "entries": entries,
+        "position": entries[-1]["id"] if entries else after,
+    }
+
+
+@router.put("/outbox/offsets/{consumer}", dependencies=[Depends(require_admin)])
+def commit_outbox_offset(
+    consumer: str,
+    data: OutboxOffsetSerializer,
+    session: Session = Depends(get_session),
+):
+    """
+    Admin API route to commit the id of the last entry of the outbox handled by a
+    consumer. An offset never moves back.
+    """
+    position = outbox.commit_offset(session, consumer, data.position)
+    return {"consumer": consumer, "position": position}
+
+
+# HISTORY
+
+
+@router.get("/history", response_model=list[ParticipationHistorySerializer])
+def get_participation_history(
+    user_id: UUID,
+    period: str | None = None,
+    session: Session = Depends(get_read_session),
+):
+    """
+    API route to list the archived participations of a user (see
+    participations.archive), the most recent period first
+    :param user_id: The id of the user
+    :param period: A month (YYYY-MM), to only list the participations of the
+    representations that ended during it
+    """
+    query = (
+        select(ParticipationArchive)
+        .where(ParticipationArchive.user_id == str(user_id))
+        .order_by(ParticipationArchive.period.desc(), ParticipationArchive.id)
+    )
+    if period is not None:
+        query = query.where(ParticipationArchive.period == period)
+    return session.exec(query).all()
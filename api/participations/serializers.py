@@ -4,18 +4,52 @@ from pydantic import BaseModel, validator
 from sqlmodel_serializers import SQLModelSerializer
 
 from events.serializers import RepresentationLightSerializer, OfferLightSerializer
-from participations.models import Participation
+from participations.models import (
+    OutboxOffset,
+    Participation,
+    ParticipationArchive,
+)
 from users.serializers import UserLightSerializer
 
 
 class ParticipationSerializer(SQLModelSerializer):
+    confirmed: bool
+    pending: bool
+    wait_list: bool
     user: UserLightSerializer | None = None
     offer: OfferLightSerializer
     representation: RepresentationLightSerializer
 
     class Meta:
         model = Participation
-        omit = ("id", "offer_id", "representation_id", "user_id")
+        omit = ("id", "offer_id", "representation_id", "user_id", "version", "status")
+
+
+class UserParticipationSerializer(SQLModelSerializer):
+    confirmed: bool
+    pending: bool
+    wait_list: bool
+    offer: OfferLightSerializer
+    representation: RepresentationLightSerializer
+    # Rank on the waiting list, for the participations on one
+    position: int | None = None
+    total: int | None = None
+
+    class Meta:
+        model = Participation
+        omit = ("id", "offer_id", "representation_id", "user_id", "version", "status")
+
+
+class ParticipationHistorySerializer(SQLModelSerializer):
+    confirmed: bool
+    pending: bool
+    wait_list: bool
+    offer: OfferLightSerializer
+    representation: RepresentationLightSerializer
+
+    class Meta:
+        model = ParticipationArchive
+        omit = ("id", "offer_id", "representation_id", "user_id", "status")
 
 
 class ParticipationPostSerializer(SQLModelSerializer):
@@ -43,6 +77,21 @@ class ParticipationPostLightSerializer(SQLModelSerializer):
         fields = ("user_id", "representation_id", "offer_id")
 
 
+class BulkCancelSerializer(SQLModelSerializer):
+    # The whole representation by default
+    offer_id: str | None = None
+
+    class Meta:
+        model = Participation
+        fields = ("representation_id", "offer_id")
+
+
+class OutboxOffsetSerializer(SQLModelSerializer):
+    class Meta:
+        model = OutboxOffset
+        fields = ("position",)
+
+
 class WaitingListRankSerializer(BaseModel):
     user: UserLightSerializer
     representation: RepresentationLightSerializer
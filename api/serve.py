@@ -0,0 +1,13 @@
+"""
+Multi-process server mode: runs the app in WEB_CONCURRENCY uvicorn worker
+processes sharing the same database.
+Writes on a (representation, offer) line are coordinated across workers by
+common.db.locks.line_lock.
+"""
+
+import uvicorn
+
+from config import HOST, PORT, WORKERS
+
+if __name__ == "__main__":
+    uvicorn.run("app:app", host=HOST, port=PORT, workers=WORKERS)
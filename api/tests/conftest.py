@@ -7,6 +7,8 @@ from sqlalchemy import Engine
 from sqlmodel import Session, text, create_engine
 
 from app import app
+from common.ratelimit import rate_limiter
+from events.cache import catalogue_cache
 from events.models import Event, Representation, OfferType, Offer, Inventory
 from tests.utils import session_add
 from users.models import User, Organization
@@ -225,7 +227,13 @@ def inventories(
 
 @pytest.fixture(autouse=True)
 def keep_clear_db(test_engine: Engine) -> None:
+    catalogue_cache.clear()
+    if rate_limiter is not None:
+        rate_limiter.clear()
     with Session(test_engine) as session:
+        session.execute(text("DELETE FROM participation_outbox"))
+        session.execute(text("DELETE FROM outbox_offset"))
+        session.execute(text("DELETE FROM participation_archive"))
         session.execute(text("DELETE FROM participation"))
         session.execute(text("DELETE FROM inventory"))
         session.execute(text("DELETE FROM offer"))
@@ -234,9 +242,13 @@ def keep_clear_db(test_engine: Engine) -> None:
         session.execute(text("DELETE FROM event"))
         session.execute(text("DELETE FROM organization"))
         session.execute(text("DELETE FROM user"))
+        session.execute(text("DELETE FROM heartbeat"))
         session.commit()
     yield
     with Session(test_engine) as session:
+        session.execute(text("DELETE FROM participation_outbox"))
+        session.execute(text("DELETE FROM outbox_offset"))
+        session.execute(text("DELETE FROM participation_archive"))
         session.execute(text("DELETE FROM participation"))
         session.execute(text("DELETE FROM inventory"))
         session.execute(text("DELETE FROM offer"))
@@ -245,4 +257,5 @@ def keep_clear_db(test_engine: Engine) -> None:
         session.execute(text("DELETE FROM event"))
         session.execute(text("DELETE FROM organization"))
         session.execute(text("DELETE FROM user"))
+        session.execute(text("DELETE FROM heartbeat"))
         session.commit()
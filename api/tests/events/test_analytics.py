@@ -0,0 +1,193 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+import common.dependencies
+from events import analytics
+from events.models import Inventory
+from participations.models import Participation, ParticipationStatus
+from tests.utils import session_add
+from users.models import User
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch: pytest.MonkeyPatch) -> dict:
+    monkeypatch.setattr(common.dependencies, "ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"X-Admin-Token": ADMIN_TOKEN}
+
+
+@pytest.fixture
+def line(
+    test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> Inventory:
+    analytics.analytics_cache.clear()
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        line = inventories[0]
+        for user, values in zip(
+            users,
+            (
+                # Confirmed right away
+                {
+                    "status": ParticipationStatus.CONFIRMED,
+                    "confirmed_at": datetime(2025, 1, 1, 10, 0, 10),
+                    "quantity": 2,
+                },
+                # Waited, promoted then confirmed in the same minute
+                {
+                    "status": ParticipationStatus.CONFIRMED,
+                    "waiting_at": datetime(2025, 1, 1, 9),
+                    "pending_at": datetime(2025, 1, 1, 10),
+                    "confirmed_at": datetime(2025, 1, 1, 10, 0, 50),
+                    "quantity": 1,
+                },
+                # Waited, promoted, not confirmed yet
+                {
+                    "status": ParticipationStatus.PENDING,
+                    "waiting_at": datetime(2025, 1, 1, 9, 30),
+                    "pending_at": datetime(2025, 1, 1, 10, 5),
+                    "quantity": 1,
+                },
+            ),
+        ):
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    representation_id=line.representation_id,
+                    offer_id=line.offer_id,
+                    **values,
+                )
+            )
+        session.commit()
+        session.refresh(line)
+        return line
+
+
+def test_event_analytics(
+    client: TestClient, admin: dict, line: Inventory, test_engine: Engine
+) -> None:
+    with Session(test_engine) as session:
+        event_id = session.get(Inventory, line.id).representation.event_id
+    url = f"/events/{event_id}/analytics"
+    assert client.get(url).status_code == 403
+    assert client.get("/events/unknown/analytics", headers=admin).status_code == 404
+    response = client.get(url, headers=admin)
+    assert response.status_code == 200
+    (analytics_line,) = response.json()["lines"]
+    assert analytics_line["representation_id"] == line.representation_id
+    assert analytics_line["offer_id"] == line.offer_id
+    assert analytics_line["sales"] == [
+        {
+            "at": "2025-01-01T10:00:00",
+            "participations": 2,
+            "quantity": 3,
+            "cumulative_participations": 2,
+            "cumulative_quantity": 3,
+        }
+    ]
+    assert [
+        (bucket["at"], bucket["cumulative_participations"])
+        for bucket in analytics_line["waiting_list"]
+    ] == [("2025-01-01T09:00:00", 1), ("2025-01-01T09:30:00", 2)]
+    assert analytics_line["funnel"] == {
+        "waited": 2,
+        "waiting": 0,
+        "promoted": 2,
+        "pending": 1,
+        "confirmed": 2,
+        "conversion": 0.5,
+    }
+    # Hourly buckets
+    response = client.get(url, params={"bucket": 3600}, headers=admin)
+    assert [bucket["at"] for bucket in response.json()["lines"][0]["waiting_list"]] == [
+        "2025-01-01T09:00:00"
+    ]
+    assert client.get(url, params={"bucket": 0}, headers=admin).status_code == 400
+
+
+def test_event_analytics_cached_until_watermark_moves(
+    client: TestClient,
+    admin: dict,
+    line: Inventory,
+    test_engine: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    builds = []
+    build_analytics = analytics.build_analytics
+    monkeypatch.setattr(
+        analytics,
+        "build_analytics",
+        lambda *args: builds.append(args) or build_analytics(*args),
+    )
+    with Session(test_engine) as session:
+        event_id = session.get(Inventory, line.id).representation.event_id
+    url = f"/events/{event_id}/analytics"
+    first = client.get(url, headers=admin).json()
+    assert client.get(url, headers=admin).json() == first
+    assert len(builds) == 1
+    # A confirmation moves the watermark
+    with Session(test_engine) as session:
+        participation = session.exec(
+            select(Participation).where(
+                Participation.status == ParticipationStatus.PENDING
+            )
+        ).one()
+        participation.status = ParticipationStatus.CONFIRMED
+        participation.confirmed_at = datetime(2025, 1, 1, 10, 6)
+        session.commit()
+    funnel = client.get(url, headers=admin).json()["lines"][0]["funnel"]
+    assert len(builds) == 2
+    assert (funnel["confirmed"], funnel["conversion"]) == (3, 1)
+
+
+def test_event_analytics_moved_by_a_cancel_then_a_join(
+    client: TestClient, admin: dict, line: Inventory, test_engine: Engine
+) -> None:
+    with Session(test_engine) as session:
+        event_id = session.get(Inventory, line.id).representation.event_id
+        user1, user2 = [
+            participation.user_id
+            for participation in session.exec(
+                select(Participation).order_by(Participation.id)
+            ).all()[:2]
+        ]
+    url = f"/events/{event_id}/analytics"
+    other_line = {"representation_id": "rep_002", "offer_id": "off_001"}
+
+    def join(user_id: str, quantity: int) -> int:
+        response = client.post(
+            "/participations/join-event",
+            json={"user_id": user_id, "quantity": quantity, **other_line},
+        )
+        assert response.status_code == 201
+        with Session(test_engine) as session:
+            return session.exec(
+                select(Participation.id).where(
+                    Participation.user_id == user_id,
+                    Participation.representation_id == "rep_002",
+                )
+            ).one()
+
+    def confirmed_quantity() -> int:
+        lines = client.get(url, headers=admin).json()["lines"]
+        return sum(
+            bucket["quantity"]
+            for analytics_line in lines
+            if analytics_line["representation_id"] == "rep_002"
+            for bucket in analytics_line["sales"]
+        )
+
+    first_id = join(user1, 1)
+    assert confirmed_quantity() == 1
+    response = client.post(
+        "/participations/cancel", json={"user_id": user1, **other_line}
+    )
+    assert response.status_code == 200
+    # The id of the cancelled participation is given to the next one
+    assert join(user2, 2) == first_id
+    assert confirmed_quantity() == 2
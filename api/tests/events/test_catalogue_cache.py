@@ -0,0 +1,160 @@
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, text
+
+from common.cache import MemoryCacheBackend, SharedCacheBackend, cache_key
+from events.cache import catalogue_cache
+from events.models import Event, Inventory, Representation
+from tests.utils import session_add
+
+
+def test_cache_key_ignores_parameters_order() -> None:
+    assert cache_key("route", a=1, b="x") == cache_key("route", b="x", a=1)
+    assert cache_key("route") == "route"
+
+
+def test_memory_backend_lru_eviction() -> None:
+    backend = MemoryCacheBackend(max_bytes=10)
+    backend.set("a", b"1234")
+    backend.set("b", b"1234")
+    # Reading "a" makes "b" the least recently used entry
+    assert backend.get("a") == b"1234"
+    backend.set("c", b"1234")
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1234"
+    assert backend.get("c") == b"1234"
+    assert backend.size == 8
+    # Values bigger than the cap are never stored
+    backend.set("d", b"12345678901")
+    assert backend.get("d") is None
+
+
+def test_memory_backend_tag_invalidation() -> None:
+    backend = MemoryCacheBackend(max_bytes=100)
+    backend.set("a", b"a", tags=("event:1",))
+    backend.set("b", b"b", tags=("event:1", "event:2"))
+    backend.set("c", b"c", tags=("event:2",))
+    backend.invalidate(["event:1"])
+    assert backend.get("a") is None
+    assert backend.get("b") is None
+    assert backend.get("c") == b"c"
+    assert backend.size == 1
+
+
+def test_shared_backend_is_shared_between_instances(tmp_path) -> None:
+    path = str(tmp_path / "cache")
+    # Every read records its access
+    worker1 = SharedCacheBackend(path, max_bytes=10, touch_interval=0)
+    worker2 = SharedCacheBackend(path, max_bytes=10, touch_interval=0)
+    worker1.set("a", b"1234")
+    worker1.set("b", b"1234", tags=("event:1",))
+    # Reading "a" from the second worker makes "b" the least recently used entry
+    assert worker2.get("a") == b"1234"
+    worker2.set("c", b"1234", tags=("event:1",))
+    assert worker1.get("b") is None
+    assert worker1.get("a") == b"1234"
+    assert worker1.get("c") == b"1234"
+    worker2.invalidate(["event:1"])
+    assert worker1.get("c") is None
+    assert worker1.get("a") == b"1234"
+
+
+def test_shared_backend_reads_without_the_write_lock(tmp_path) -> None:
+    path = str(tmp_path / "cache")
+    backend = SharedCacheBackend(path, max_bytes=10, touch_interval=60)
+    backend.set("a", b"1234")
+    # Another worker holds the write lock of the file
+    holder = sqlite3.connect(path)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert backend.get("a") == b"1234"
+        assert time.perf_counter() - start < 1
+    finally:
+        holder.rollback()
+        holder.close()
+
+
+def test_backends_skip_values_read_before_an_invalidation(tmp_path) -> None:
+    for backend in (
+        MemoryCacheBackend(max_bytes=10),
+        SharedCacheBackend(str(tmp_path / "cache"), max_bytes=10),
+    ):
+        versions = backend.versions(["event:1", "event:2"])
+        backend.invalidate(["event:1"])
+        # Built from data read before the invalidation
+        backend.set("a", b"1234", tags=("event:1", "event:2"), versions=versions)
+        assert backend.get("a") is None
+        versions = backend.versions(["event:1", "event:2"])
+        backend.invalidate(["event:3"])
+        backend.set("a", b"1234", tags=("event:1", "event:2"), versions=versions)
+        assert backend.get("a") == b"1234"
+
+
+def test_get_event_served_from_cache_until_commit(
+    client: TestClient, test_engine: Engine, events: list[Event]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, events)
+        event = events[0]
+        title = event.title
+        response = client.get(f"/events/{event.id}")
+        assert response.status_code == 200
+        assert response.json()["title"] == title
+        # Writes that bypass the ORM are not seen until an invalidation
+        session.execute(
+            text("UPDATE event SET title = 'Raw' WHERE id = :id"), {"id": event.id}
+        )
+        session.commit()
+        assert client.get(f"/events/{event.id}").json()["title"] == title
+        event.title = "Updated"
+        session.add(event)
+        session.commit()
+        assert client.get(f"/events/{event.id}").json()["title"] == "Updated"
+        assert client.get("/events/").json()[0]["title"] == "Updated"
+
+
+def test_new_representation_invalidates_event_representations(
+    client: TestClient, test_engine: Engine, representations: list[Representation]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, representations)
+        representation = representations[0]
+        event_id = representation.event_id
+        response = client.get(f"/events/{event_id}/representations")
+        assert len(response.json()) == 2
+        response = client.get(f"/events/representations/{representation.id}")
+        assert response.status_code == 200
+        assert response.json()["id"] == representation.id
+        session.add(
+            Representation(
+                id="rep_004",
+                event_id=event_id,
+                start_datetime=representation.start_datetime,
+                end_datetime=representation.end_datetime,
+            )
+        )
+        session.commit()
+        response = client.get(f"/events/{event_id}/representations")
+        assert len(response.json()) == 3
+        response = client.get("/events/representations/nonexistent")
+        assert response.status_code == 404
+
+
+def test_stock_change_keeps_representation_cached(
+    client: TestClient, test_engine: Engine, inventories: list[Inventory]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, inventories)
+        inventory = inventories[0]
+        key = cache_key("get_representation", pk=inventory.representation_id)
+        client.get(f"/events/representations/{inventory.representation_id}")
+        assert catalogue_cache.lookup(key) is not None
+        inventory.available_stock += 1
+        session.add(inventory)
+        session.commit()
+        # The representation does not render its stock
+        assert catalogue_cache.lookup(key) is not None
@@ -0,0 +1,132 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+import events.availability
+import events.routes
+from events.availability import availability_key, build_availability
+from events.cache import catalogue_cache, stock_tag
+from events.models import Inventory
+from tests.utils import session_add
+from users.models import User
+
+
+def test_event_availability(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+) -> None:
+    response = client.get("/events/ev_001/availability")
+    assert response.status_code == 200
+    assert response.json() == {
+        "event_id": "ev_001",
+        "lines": [
+            {
+                "representation_id": "rep_001",
+                "offer_id": "off_001",
+                "available_stock": 0,
+                "total_stock": 500,
+                "waiting_list": 0,
+            },
+            {
+                "representation_id": "rep_002",
+                "offer_id": "off_001",
+                "available_stock": 2,
+                "total_stock": 500,
+                "waiting_list": 0,
+            },
+        ],
+    }
+    response = client.get(
+        "/events/ev_001/availability",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+    assert client.get("/events/ev_404/availability").status_code == 404
+
+
+def test_event_availability_invalidated_on_commit(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+    monkeypatch,
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, users)
+        user1, user2, user3 = [user.id for user in users]
+    etag = client.get("/events/ev_001/availability").headers["ETag"]
+    client.get("/events/ev_002/availability")
+    response = client.post(
+        "/participations/join-waiting-list",
+        json={
+            "user_id": user1,
+            "representation_id": "rep_001",
+            "offer_id": "off_001",
+            "quantity": 1,
+        },
+    )
+    assert response.status_code == 201
+    response = client.post(
+        "/participations/join-event",
+        json={
+            "user_id": user2,
+            "representation_id": "rep_002",
+            "offer_id": "off_001",
+            "quantity": 1,
+        },
+    )
+    assert response.status_code == 201
+    response = client.get(
+        "/events/ev_001/availability", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    cells = {
+        (line["representation_id"], line["available_stock"], line["waiting_list"])
+        for line in response.json()["lines"]
+    }
+    assert cells == {("rep_001", 0, 1), ("rep_002", 1, 0)}
+
+    def rebuild(*args) -> None:
+        raise AssertionError("Only the document of the changed offer is invalidated")
+
+    monkeypatch.setattr(events.routes, "build_availability", rebuild)
+    response = client.post(
+        "/participations/join-event",
+        json={
+            "user_id": user3,
+            "representation_id": "rep_003",
+            "offer_id": "off_003",
+            "quantity": 1,
+        },
+    )
+    assert response.status_code == 201
+    assert client.get("/events/ev_001/availability").status_code == 200
+
+
+def test_event_availability_built_during_a_commit_is_not_stored(
+    test_engine: Engine, inventories: list[Inventory], monkeypatch
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, inventories)
+    read_cells = events.availability.line_cells
+
+    def commit_then_read(session: Session, *conditions) -> list[dict]:
+        # A commit changing a line of the event lands after the versions of the
+        # document were taken
+        catalogue_cache.invalidate({stock_tag("off_001")})
+        return read_cells(session, *conditions)
+
+    monkeypatch.setattr(events.availability, "line_cells", commit_then_read)
+    with Session(test_engine) as session:
+        body = build_availability(session, "ev_001")
+    assert json.loads(body)["event_id"] == "ev_001"
+    assert catalogue_cache.lookup(availability_key("ev_001")) is None
+    monkeypatch.setattr(events.availability, "line_cells", read_cells)
+    with Session(test_engine) as session:
+        build_availability(session, "ev_001")
+    assert catalogue_cache.lookup(availability_key("ev_001")) is not None
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+import events.routes
+from events.models import Inventory, Offer, Representation
+from participations.models import Participation, ParticipationStatus
+from participations.rows import ParticipationRow
+from tests.utils import session_add
+from users.models import User
+
+
+@pytest.fixture
+def event_id(
+    test_engine: Engine,
+    users: list[User],
+    offers: list[Offer],
+    representations: list[Representation],
+    inventories: list[Inventory],
+) -> str:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *offers, *representations, *inventories])
+        user1, user2, user3 = users
+        offer = offers[0]
+        representation = representations[0]
+        event_id = representation.event_id
+        for user, status in (
+            (user1, ParticipationStatus.CONFIRMED),
+            (user2, ParticipationStatus.PENDING),
+            (user3, ParticipationStatus.WAIT_LIST),
+        ):
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    offer_id=offer.id,
+                    representation_id=representation.id,
+                    status=status,
+                    waiting_at=datetime(2025, 1, 1),
+                    quantity=1,
+                )
+            )
+        # Participation to another event
+        session.add(
+            Participation(
+                user_id=user1.id,
+                offer_id=offers[2].id,
+                representation_id=representations[2].id,
+                status=ParticipationStatus.CONFIRMED,
+                quantity=1,
+            )
+        )
+        session.commit()
+        for user in users:
+            session.refresh(user)
+        return event_id
+
+
+@pytest.mark.parametrize("fast_lane", [True, False])
+def test_get_event_participations_list_filter(
+    fast_lane: bool,
+    client: TestClient,
+    event_id: str,
+    users: list[User],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(events.routes, "FAST_LANE", fast_lane)
+    user1, user2, user3 = users
+    response = client.get(f"/events/{event_id}/participations")
+    assert response.status_code == 200
+    assert sorted(p["user"]["id"] for p in response.json()) == sorted(
+        user.id for user in users
+    )
+    for list_filter, user in (
+        ("confirmed", user1),
+        ("pending", user2),
+        ("wait_list", user3),
+    ):
+        response = client.get(
+            f"/events/{event_id}/participations",
+            params={"list_filter": list_filter},
+        )
+        participations = response.json()
+        assert len(participations) == 1
+        assert participations[0]["user"]["id"] == user.id
+        assert participations[0][list_filter]
+
+
+def test_compact_rows_match_orm(
+    client: TestClient, event_id: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    responses = []
+    for fast_lane in (True, False):
+        monkeypatch.setattr(events.routes, "FAST_LANE", fast_lane)
+        response = client.get(f"/events/{event_id}/participations")
+        responses.append(
+            sorted(
+                response.json(), key=lambda participation: participation["user"]["id"]
+            )
+        )
+    assert responses[0] == responses[1]
+    assert not hasattr(ParticipationRow(), "__dict__")
@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+import common.dependencies
+from events.export import Exporter, exporter
+from events.models import ExportJob, Inventory, Offer, Representation
+from participations.models import Participation, ParticipationStatus
+from tests.utils import session_add
+from users.models import User
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch: pytest.MonkeyPatch) -> dict:
+    monkeypatch.setattr(common.dependencies, "ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"X-Admin-Token": ADMIN_TOKEN}
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch: pytest.MonkeyPatch) -> str:
+    directory = str(tmp_path / "exports")
+    monkeypatch.setattr(exporter, "directory", directory)
+    return directory
+
+
+@pytest.fixture
+def event_id(
+    test_engine: Engine,
+    users: list[User],
+    offers: list[Offer],
+    representations: list[Representation],
+    inventories: list[Inventory],
+) -> str:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *offers, *representations, *inventories])
+        representation = representations[0]
+        for user, status in zip(users, ParticipationStatus):
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    offer_id=offers[0].id,
+                    representation_id=representation.id,
+                    status=status,
+                    waiting_at=datetime(2025, 1, 1),
+                    quantity=1,
+                )
+            )
+        # Participation to another event
+        session.add(
+            Participation(
+                user_id=users[0].id,
+                offer_id=offers[2].id,
+                representation_id=representations[2].id,
+                status=ParticipationStatus.CONFIRMED,
+                quantity=1,
+            )
+        )
+        session.commit()
+        return representation.event_id
+
+
+def run_export(client: TestClient, admin: dict, url: str) -> dict:
+    response = client.post(url, headers=admin)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert exporter.wait(job_id, timeout=60)
+    progress = client.get(f"/events/exports/{job_id}", headers=admin).json()
+    assert progress["status"] == "done"
+    assert progress["progress"] == 1
+    return progress
+
+
+def test_export_matches_event_participations(
+    client: TestClient, admin: dict, event_id: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Several chunks, formatted by the pool
+    monkeypatch.setattr(exporter, "chunk_size", 2)
+    progress = run_export(
+        client, admin, f"/events/{event_id}/exports?export_format=ndjson"
+    )
+    assert progress["rows"] == progress["total"] == 3
+    response = client.get(f"/events/exports/{progress['id']}/file", headers=admin)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    expected = client.get(f"/events/{event_id}/participations").json()
+    key = lambda participation: participation["user"]["id"]
+    assert sorted(exported, key=key) == sorted(expected, key=key)
+
+    progress = run_export(
+        client, admin, f"/events/{event_id}/exports?list_filter=confirmed"
+    )
+    response = client.get(f"/events/exports/{progress['id']}/file", headers=admin)
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["status"], row["quantity"]) for row in rows] == [("confirmed", "1")]
+
+
+def test_export_errors(
+    client: TestClient, admin: dict, event_id: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    url = f"/events/{event_id}/exports"
+    assert client.post(url).status_code == 403
+    assert client.post(f"{url}?export_format=xml", headers=admin).status_code == 400
+    assert client.post("/events/unknown/exports", headers=admin).status_code == 404
+    assert client.get("/events/exports/unknown", headers=admin).status_code == 404
+    monkeypatch.setattr(exporter, "max_concurrent", 0)
+    response = client.post(url, headers=admin)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+
+def test_export_served_by_another_worker(
+    client: TestClient,
+    admin: dict,
+    event_id: str,
+    export_dir: str,
+    test_engine: Engine,
+) -> None:
+    # The export runs in another worker sharing the export directory
+    worker = Exporter(
+        max_concurrent=1, processes=1, chunk_size=2, directory=export_dir, ttl=60
+    )
+    try:
+        job = worker.start(test_engine, test_engine, event_id, "ndjson")
+        assert worker.wait(job.id, timeout=60)
+    finally:
+        worker.shutdown()
+    progress = client.get(f"/events/exports/{job.id}", headers=admin).json()
+    assert progress["status"] == "done"
+    assert progress["rows"] == 3
+    response = client.get(f"/events/exports/{job.id}/file", headers=admin)
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+
+
+def test_failed_start_gives_the_slot_back(
+    event_id: str, export_dir: str, test_engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    worker = Exporter(
+        max_concurrent=1, processes=1, chunk_size=2, directory=export_dir, ttl=60
+    )
+
+    def unavailable(engine: Engine) -> None:
+        raise OSError("Export directory unavailable")
+
+    monkeypatch.setattr(worker, "_purge", unavailable)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            worker.start(test_engine, test_engine, event_id, "csv")
+    monkeypatch.delattr(worker, "_purge")
+    try:
+        job = worker.start(test_engine, test_engine, event_id, "csv")
+        assert job is not None
+        assert worker.wait(job.id, timeout=60)
+    finally:
+        worker.shutdown()
+
+
+def test_purge_keeps_the_running_exports(
+    event_id: str, export_dir: str, test_engine: Engine
+) -> None:
+    long_ago = datetime.now() - timedelta(hours=2)
+    with Session(test_engine) as session:
+        for job_id, updated_at in (("running", datetime.now()), ("stale", long_ago)):
+            # Started before the TTL, still running in another worker or abandoned
+            session.add(
+                ExportJob(
+                    id=job_id,
+                    event_id=event_id,
+                    export_format="csv",
+                    status="running",
+                    created_at=long_ago,
+                    updated_at=updated_at,
+                )
+            )
+        session.commit()
+    worker = Exporter(
+        max_concurrent=1, processes=1, chunk_size=2, directory=export_dir, ttl=60
+    )
+    worker._purge(test_engine)
+    assert worker.get(test_engine, "running") is not None
+    assert worker.get(test_engine, "stale") is None
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+
+import freezegun
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from common.prewarm import prewarm, readiness
+from config import get_engine
+from events.availability import availability_key
+from events.cache import catalogue_cache
+
+
+@pytest.mark.usefixtures("inventories")
+@freezegun.freeze_time(datetime(2025, 7, 11))
+def test_prewarm_upcoming_lines() -> None:
+    report = prewarm(get_engine(), connections=3, horizon_days=7)
+    assert report["connections"] == 3
+    assert report["lines"] == 3
+    assert report["events"] == 2
+    assert catalogue_cache.lookup(availability_key("ev_001")) is not None
+    assert catalogue_cache.lookup(availability_key("ev_003")) is None
+
+
+@pytest.mark.usefixtures("inventories")
+@freezegun.freeze_time(datetime(2025, 7, 16))
+def test_prewarm_skips_past_and_far_representations() -> None:
+    report = prewarm(get_engine(), connections=1, horizon_days=1)
+    # Only rep_002 starts within a day, rep_001 is over
+    assert report["lines"] == 1
+    assert report["events"] == 1
+
+
+def test_ready_once_warm(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(readiness, "ready", False)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    with TestClient(app) as started_client:
+        deadline = time.monotonic() + 10
+        response = started_client.get("/ready")
+        while response.status_code == 503 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = started_client.get("/ready")
+    assert response.status_code == 200
+    assert set(response.json()["warm_up"]) >= {"connections", "lines", "seconds"}
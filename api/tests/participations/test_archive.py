@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from events.models import Offer, Representation
+from participations.archive import archive_finished
+from participations.models import (
+    Participation,
+    ParticipationArchive,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+from tests.utils import session_add
+from users.models import User
+
+
+@pytest.fixture
+def participations(
+    test_engine: Engine,
+    users: list[User],
+    representations: list[Representation],
+    offers: list[Offer],
+) -> list[str]:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *representations, *offers])
+        user1, user2, user3 = users
+        rep1, rep2, rep3 = representations
+        offer = offers[0]
+        session.add_all(
+            [
+                Participation(
+                    user_id=user1.id,
+                    offer_id=offer.id,
+                    representation_id=rep1.id,
+                    status=ParticipationStatus.CONFIRMED,
+                    confirmed_at=datetime(2025, 1, 1),
+                    quantity=2,
+                ),
+                Participation(
+                    user_id=user2.id,
+                    offer_id=offer.id,
+                    representation_id=rep1.id,
+                    status=ParticipationStatus.WAIT_LIST,
+                    waiting_at=datetime(2025, 1, 2),
+                    quantity=1,
+                ),
+                Participation(
+                    user_id=user1.id,
+                    offer_id=offer.id,
+                    representation_id=rep2.id,
+                    status=ParticipationStatus.CONFIRMED,
+                    confirmed_at=datetime(2025, 1, 3),
+                    quantity=1,
+                ),
+                Participation(
+                    user_id=user3.id,
+                    offer_id=offer.id,
+                    representation_id=rep3.id,
+                    status=ParticipationStatus.PENDING,
+                    pending_at=datetime(2025, 1, 4),
+                    pending_expires_at=datetime(2025, 1, 4, 1),
+                    quantity=1,
+                ),
+            ]
+        )
+        session.commit()
+        return [user.id for user in users]
+
+
+def test_archive_finished_representations(
+    test_engine: Engine, participations: list[str]
+) -> None:
+    # rep_001 and rep_002 ended, rep_003 ends on the 17th at 23:00
+    report = archive_finished(test_engine, datetime(2025, 7, 17), batch_size=2)
+    assert report["archived"] == 3
+    assert report["periods"] == {"2025-07": 3}
+    assert report["batches"] == 2
+    assert report["seconds"] >= report["slowest_batch_seconds"] > 0
+    with Session(test_engine) as session:
+        live = session.exec(select(Participation)).all()
+        assert [participation.representation_id for participation in live] == [
+            "rep_003"
+        ]
+        archived = session.exec(
+            select(ParticipationArchive).order_by(ParticipationArchive.id)
+        ).all()
+        assert [(p.representation_id, p.status, p.quantity) for p in archived] == [
+            ("rep_001", ParticipationStatus.CONFIRMED, 2),
+            ("rep_001", ParticipationStatus.WAIT_LIST, 1),
+            ("rep_002", ParticipationStatus.CONFIRMED, 1),
+        ]
+        assert archived[0].confirmed_at == datetime(2025, 1, 1)
+        archived_entries = session.exec(
+            select(ParticipationOutbox.participation_id).where(
+                ParticipationOutbox.reason == "archive",
+                ParticipationOutbox.to_status.is_(None),
+            )
+        ).all()
+        assert sorted(archived_entries) == [p.id for p in archived]
+    # Nothing left to archive
+    assert archive_finished(test_engine, datetime(2025, 7, 17))["archived"] == 0
+    # The deadline of a pending participation is archived with it
+    assert archive_finished(test_engine, datetime(2025, 8, 1))["archived"] == 1
+    with Session(test_engine) as session:
+        archived = session.exec(
+            select(ParticipationArchive).where(
+                ParticipationArchive.representation_id == "rep_003"
+            )
+        ).one()
+        assert archived.pending_expires_at == datetime(2025, 1, 4, 1)
+
+
+def test_participation_history(
+    client: TestClient, test_engine: Engine, participations: list[str]
+) -> None:
+    user1 = participations[0]
+    archive_finished(test_engine, datetime(2025, 8, 1))
+    response = client.get("/participations/history", params={"user_id": user1})
+    assert response.status_code == 200
+    history = response.json()
+    assert [entry["representation"]["id"] for entry in history] == [
+        "rep_001",
+        "rep_002",
+    ]
+    assert history[0]["confirmed"] is True
+    assert history[0]["period"] == "2025-07"
+    assert history[0]["offer"]["id"] == "off_001"
+    response = client.get(
+        "/participations/history", params={"user_id": user1, "period": "2025-06"}
+    )
+    assert response.json() == []
@@ -0,0 +1,199 @@
+import time
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+import common.dependencies
+from events.models import Inventory
+from participations import notifications
+from participations.bulk_cancel import BulkCanceller, cancel_batch
+from participations.models import (
+    BulkCancelJob,
+    Participation,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+from tests.utils import session_add
+from users.models import User
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch: pytest.MonkeyPatch) -> dict:
+    monkeypatch.setattr(common.dependencies, "ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"X-Admin-Token": ADMIN_TOKEN}
+
+
+@pytest.fixture
+def participations(
+    test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> list[Inventory]:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        user1, user2, user3 = users
+        cancelled, other = inventories[1], inventories[2]
+        statuses = [
+            (user1, ParticipationStatus.CONFIRMED, 2),
+            (user2, ParticipationStatus.PENDING, 1),
+            (user3, ParticipationStatus.WAIT_LIST, 1),
+        ]
+        for user, status, quantity in statuses:
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    representation_id=cancelled.representation_id,
+                    offer_id=cancelled.offer_id,
+                    status=status,
+                    quantity=quantity,
+                    waiting_at=datetime(2025, 1, 1),
+                )
+            )
+        session.add(
+            Participation(
+                user_id=user1.id,
+                representation_id=other.representation_id,
+                offer_id=other.offer_id,
+                status=ParticipationStatus.CONFIRMED,
+                quantity=1,
+            )
+        )
+        # The confirmed and pending participations hold stock
+        cancelled.available_stock = cancelled.total_stock - 3
+        session.add(cancelled)
+        session.commit()
+        for inventory in inventories:
+            session.refresh(inventory)
+        return inventories
+
+
+def test_bulk_cancel_in_batches(
+    test_engine: Engine, participations: list[Inventory]
+) -> None:
+    cancelled = participations[1]
+    canceller = BulkCanceller(batch_size=2)
+    job = canceller.create(test_engine, cancelled.representation_id)
+    report = canceller.run(test_engine, job)
+    assert report["status"] == "done"
+    assert report["cancelled"] == 3
+    assert report["statuses"] == {"confirmed": 1, "pending": 1, "wait_list": 1}
+    assert report["refunded_quantity"] == 2
+    assert report["restored_stock"] == 3
+    assert report["batches"] == 2
+    with Session(test_engine) as session:
+        remaining = session.exec(select(Participation.representation_id)).all()
+        assert remaining == [participations[2].representation_id]
+        inventory = session.get(Inventory, cancelled.id)
+        assert inventory.available_stock == inventory.total_stock
+        refunds = session.exec(
+            select(ParticipationOutbox.quantity).where(
+                ParticipationOutbox.reason == "bulk_cancel",
+                ParticipationOutbox.from_status == ParticipationStatus.CONFIRMED,
+            )
+        ).all()
+        assert refunds == [2]
+
+
+def test_interrupted_bulk_cancel_leaves_the_stock_consistent(
+    test_engine: Engine, participations: list[Inventory]
+) -> None:
+    cancelled = participations[1]
+    canceller = BulkCanceller(batch_size=2)
+    job = canceller.create(test_engine, cancelled.representation_id)
+    lines = [(cancelled.representation_id, cancelled.offer_id)]
+    # The worker stops after the first batch: the confirmed and the pending one
+    with Session(test_engine) as session:
+        assert cancel_batch(session, job, lines, 2) == 2
+    with Session(test_engine) as session:
+        # Not restored until every participation is deleted
+        inventory = session.get(Inventory, cancelled.id)
+        assert inventory.available_stock == inventory.total_stock - 3
+        assert session.get(BulkCancelJob, job.id).batches == 1
+    # A new job finishes the work
+    job = canceller.create(test_engine, cancelled.representation_id)
+    report = canceller.run(test_engine, job)
+    assert report["statuses"] == {"confirmed": 0, "pending": 0, "wait_list": 1}
+    assert report["restored_stock"] == 3
+    with Session(test_engine) as session:
+        inventory = session.get(Inventory, cancelled.id)
+        assert inventory.available_stock == inventory.total_stock
+
+
+def test_waiting_list_joined_during_the_job_not_promoted(
+    test_engine: Engine,
+    participations: list[Inventory],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    promoted = []
+    monkeypatch.setattr(
+        notifications, "promoted", lambda session, ids: promoted.extend(ids)
+    )
+    cancelled = participations[1]
+    line = {
+        "representation_id": cancelled.representation_id,
+        "offer_id": cancelled.offer_id,
+    }
+    canceller = BulkCanceller(batch_size=2)
+    job = canceller.create(test_engine, cancelled.representation_id)
+    with Session(test_engine) as session:
+        user_id = session.exec(
+            select(Participation.user_id).where(
+                Participation.status == ParticipationStatus.PENDING
+            )
+        ).one()
+        assert cancel_batch(session, job, [tuple(line.values())], 2) == 2
+    # The pending one, cancelled, joins the waiting list between two batches
+    with Session(test_engine) as session:
+        session.add(
+            Participation(
+                user_id=user_id,
+                status=ParticipationStatus.WAIT_LIST,
+                quantity=1,
+                waiting_at=datetime(2025, 1, 2),
+                **line,
+            )
+        )
+        session.commit()
+    report = canceller.run(test_engine, job)
+    assert report["statuses"] == {"confirmed": 1, "pending": 1, "wait_list": 2}
+    assert promoted == []
+    with Session(test_engine) as session:
+        reasons = session.exec(select(ParticipationOutbox.reason).distinct()).all()
+        assert reasons == ["bulk_cancel"]
+        inventory = session.get(Inventory, cancelled.id)
+        assert inventory.available_stock == inventory.total_stock
+
+
+def test_bulk_cancel_route(
+    client: TestClient, admin: dict, participations: list[Inventory]
+) -> None:
+    cancelled = participations[1]
+    payload = {
+        "representation_id": cancelled.representation_id,
+        "offer_id": cancelled.offer_id,
+    }
+    assert client.post("/participations/bulk-cancel", json=payload).status_code == 403
+    response = client.post("/participations/bulk-cancel", json=payload, headers=admin)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    url = f"/participations/bulk-cancel/{job_id}"
+    assert client.get(url).status_code == 403
+    deadline = time.monotonic() + 10
+    while True:
+        report = client.get(url, headers=admin).json()
+        if report["status"] != "running" or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert report["status"] == "done"
+    assert report["cancelled"] == 3
+    response = client.get("/participations/bulk-cancel/unknown", headers=admin)
+    assert response.status_code == 404
+    response = client.post(
+        "/participations/bulk-cancel",
+        json={"representation_id": "rep_unknown"},
+        headers=admin,
+    )
+    assert response.status_code == 404
@@ -8,7 +8,7 @@ from sqlmodel import Session, select
 from starlette.testclient import TestClient
 
 from events.models import Offer, Representation, Inventory
-from participations.models import Participation
+from participations.models import Participation, ParticipationStatus
 from tests.utils import session_add
 from users.models import User
 
@@ -49,6 +49,7 @@ def test_join_event_ok(
             "quantity": 3,
             "confirmed_at": datetime(2025, 1, 1).isoformat(),
             "pending_at": None,
+            "pending_expires_at": None,
             "waiting_at": None,
             "user": {
                 "id": str(user.id),
@@ -185,7 +186,7 @@ def test_join_event_participation_already_exists(
             user_id=user.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            pending=True,
+            status=ParticipationStatus.PENDING,
             quantity=1,
         )
         session.add(participation)
@@ -315,7 +316,7 @@ def test_cancel_with_wait_list(
             user_id=user1.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            confirmed=True,
+            status=ParticipationStatus.CONFIRMED,
             confirmed_at=datetime(2025, 1, 1),
             quantity=4,
         )
@@ -323,7 +324,7 @@ def test_cancel_with_wait_list(
             user_id=user2.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime(2025, 1, 2),
             quantity=2,
         )
@@ -331,7 +332,7 @@ def test_cancel_with_wait_list(
             user_id=user3.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime(2025, 1, 3),
             quantity=1,
         )
@@ -384,7 +385,7 @@ def test_cancel_no_wait_list() -> None:
                 user_id=user1.id,
                 offer_id=offer.id,
                 representation_id=representation.id,
-                confirmed=True,
+                status=ParticipationStatus.CONFIRMED,
                 confirmed_at=datetime(2025, 1, 1),
                 quantity=4,
             )
@@ -427,7 +428,7 @@ def test_cancel_not_participating(
             user_id=user2.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            confirmed=True,
+            status=ParticipationStatus.CONFIRMED,
             confirmed_at=datetime(2025, 1, 2),
             quantity=2,
         )
@@ -435,7 +436,7 @@ def test_cancel_not_participating(
             user_id=user3.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime(2025, 1, 3),
             quantity=1,
         )
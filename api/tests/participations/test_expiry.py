@@ -0,0 +1,230 @@
+from datetime import datetime, timedelta
+
+import freezegun
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+import participations.expiry
+import participations.routes
+from events.models import Inventory, Offer
+from participations.expiry import expire_pending
+from participations.models import (
+    Participation,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+from tests.utils import session_add
+from users.models import User
+
+PROMOTED_AT = datetime(2025, 1, 4, 10)
+
+
+@pytest.fixture
+def line(test_engine: Engine, inventories: list[Inventory]) -> dict:
+    """
+    The sold out line of an offer giving 10 minutes to confirm
+    """
+    with Session(test_engine) as session:
+        session_add(session, inventories)
+        offer = session.get(Offer, inventories[0].offer_id)
+        offer.confirmation_window = 600
+        session.add(offer)
+        session.commit()
+        return {
+            "representation_id": inventories[0].representation_id,
+            "offer_id": inventories[0].offer_id,
+        }
+
+
+@pytest.fixture
+def user_ids(test_engine: Engine, users: list[User]) -> list[str]:
+    with Session(test_engine) as session:
+        session_add(session, users)
+        return [user.id for user in users]
+
+
+def add_participations(
+    test_engine: Engine, line: dict, participations: list[tuple]
+) -> None:
+    with Session(test_engine) as session:
+        for user_id, status, quantity, expires_at in participations:
+            session.add(
+                Participation(
+                    user_id=user_id,
+                    status=status,
+                    quantity=quantity,
+                    confirmed_at=PROMOTED_AT - timedelta(days=3),
+                    waiting_at=PROMOTED_AT - timedelta(days=2),
+                    pending_at=expires_at and PROMOTED_AT,
+                    pending_expires_at=expires_at,
+                    **line,
+                )
+            )
+        session.commit()
+
+
+def get_participation(session: Session, user_id: str) -> Participation | None:
+    return session.exec(
+        select(Participation).where(Participation.user_id == user_id)
+    ).first()
+
+
+@pytest.mark.parametrize("fast_lane", [True, False])
+@freezegun.freeze_time(PROMOTED_AT)
+def test_promotion_sets_deadline_from_offer(
+    fast_lane: bool,
+    client: TestClient,
+    test_engine: Engine,
+    user_ids: list[str],
+    line: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(participations.routes, "FAST_LANE", fast_lane)
+    user1, user2, user3 = user_ids
+    add_participations(
+        test_engine,
+        line,
+        [
+            (user1, ParticipationStatus.CONFIRMED, 2, None),
+            (user2, ParticipationStatus.WAIT_LIST, 1, None),
+            (user3, ParticipationStatus.WAIT_LIST, 1, None),
+        ],
+    )
+    response = client.post("/participations/cancel", json={"user_id": user1, **line})
+    assert response.status_code == 200
+    with Session(test_engine) as session:
+        for user_id in (user2, user3):
+            participation = get_participation(session, user_id)
+            assert participation.pending
+            assert participation.pending_expires_at == PROMOTED_AT + timedelta(
+                minutes=10
+            )
+
+
+@pytest.mark.parametrize(
+    "confirmed_at, status_code",
+    [
+        (PROMOTED_AT + timedelta(minutes=5), 200),
+        (PROMOTED_AT + timedelta(minutes=11), 403),
+        # Not mistaken for 5 minutes late
+        (PROMOTED_AT + timedelta(days=1, minutes=5), 403),
+    ],
+)
+def test_confirm_before_deadline(
+    confirmed_at: datetime,
+    status_code: int,
+    client: TestClient,
+    test_engine: Engine,
+    user_ids: list[str],
+    line: dict,
+) -> None:
+    user_id = user_ids[0]
+    add_participations(
+        test_engine,
+        line,
+        [
+            (
+                user_id,
+                ParticipationStatus.PENDING,
+                1,
+                PROMOTED_AT + timedelta(minutes=10),
+            )
+        ],
+    )
+    with freezegun.freeze_time(confirmed_at):
+        response = client.post(
+            "/participations/confirm", json={"user_id": user_id, **line}
+        )
+    assert response.status_code == status_code
+    if status_code == 403:
+        assert response.json()["detail"] == (
+            "You have exceeded the confirmation window, "
+            "you have lost your place in the waiting line"
+        )
+    else:
+        assert response.json()["confirmed"]
+
+
+@pytest.mark.parametrize(
+    "confirmed_at, status_code",
+    [
+        (PROMOTED_AT + timedelta(minutes=5), 200),
+        (PROMOTED_AT + timedelta(minutes=11), 403),
+    ],
+)
+def test_confirm_without_deadline(
+    confirmed_at: datetime,
+    status_code: int,
+    client: TestClient,
+    test_engine: Engine,
+    user_ids: list[str],
+    line: dict,
+) -> None:
+    # Promoted without a deadline, the window of the offer applies
+    user_id = user_ids[0]
+    with Session(test_engine) as session:
+        session.add(
+            Participation(
+                user_id=user_id,
+                status=ParticipationStatus.PENDING,
+                quantity=1,
+                pending_at=PROMOTED_AT,
+                **line,
+            )
+        )
+        session.commit()
+    with freezegun.freeze_time(confirmed_at):
+        response = client.post(
+            "/participations/confirm", json={"user_id": user_id, **line}
+        )
+    assert response.status_code == status_code
+
+
+@pytest.mark.parametrize("fast_lane", [True, False])
+def test_sweep_releases_expired_participations(
+    fast_lane: bool,
+    test_engine: Engine,
+    user_ids: list[str],
+    line: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(participations.expiry, "FAST_LANE", fast_lane)
+    user1, user2, user3 = user_ids
+    add_participations(
+        test_engine,
+        line,
+        [
+            (user1, ParticipationStatus.PENDING, 2, PROMOTED_AT),
+            (user2, ParticipationStatus.PENDING, 1, PROMOTED_AT + timedelta(hours=2)),
+            (user3, ParticipationStatus.WAIT_LIST, 1, None),
+        ],
+    )
+    now = PROMOTED_AT + timedelta(hours=1)
+    report = expire_pending(test_engine, now)
+    assert report["released"] == 1
+    assert report["released_quantity"] == 2
+    assert report["lines"] == 1
+    assert report["conflicts"] == 0
+    assert report["pending"] == [{**line, "participations": 2, "quantity": 2}]
+    with Session(test_engine) as session:
+        assert get_participation(session, user1) is None
+        # Still in time
+        assert get_participation(session, user2).pending_expires_at == (
+            PROMOTED_AT + timedelta(hours=2)
+        )
+        promoted = get_participation(session, user3)
+        assert promoted.pending
+        assert promoted.pending_expires_at == now + timedelta(minutes=10)
+        inventory = session.exec(
+            select(Inventory).where(
+                Inventory.representation_id == line["representation_id"],
+                Inventory.offer_id == line["offer_id"],
+            )
+        ).one()
+        assert inventory.available_stock == 1
+        reasons = session.exec(select(ParticipationOutbox.reason)).all()
+        assert sorted(reasons) == ["expiry", "promotion"]
+    # Nothing left to release
+    assert expire_pending(test_engine, now)["released"] == 0
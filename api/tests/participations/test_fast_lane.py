@@ -0,0 +1,144 @@
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from events.models import Inventory
+from participations import fast_lane
+from participations.models import Participation, ParticipationStatus
+from participations.routes import promote_waiting, waiting_status
+from tests.utils import session_add
+from users.models import User
+
+
+def add_waiting_list(
+    session: Session, users: list[User], inventory: Inventory, quantities: list[int]
+) -> None:
+    for hour, (user, quantity) in enumerate(zip(users, quantities)):
+        session.add(
+            Participation(
+                user_id=user.id,
+                representation_id=inventory.representation_id,
+                offer_id=inventory.offer_id,
+                status=ParticipationStatus.WAIT_LIST,
+                waiting_at=datetime(2025, 1, 1, hour),
+                quantity=quantity,
+            )
+        )
+
+
+def test_waiting_rank_matches_orm(
+    test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        line, other_line = inventories[0], inventories[1]
+        add_waiting_list(session, users, line, [1, 2, 1])
+        # Another line, and a participation out of the waiting list, are not counted
+        add_waiting_list(session, users[1:], other_line, [1, 1])
+        session.add(
+            Participation(
+                user_id=users[0].id,
+                representation_id=other_line.representation_id,
+                offer_id=other_line.offer_id,
+                status=ParticipationStatus.CONFIRMED,
+                confirmed_at=datetime(2025, 1, 1),
+                quantity=1,
+            )
+        )
+        session.commit()
+        for inventory in (line, other_line):
+            for user in users:
+                args = (session, user.id, inventory.representation_id)
+                rank = fast_lane.waiting_rank(*args, inventory.offer_id)
+                expected = waiting_status(*args, inventory.offer_id)
+                assert jsonable_encoder(rank) == jsonable_encoder(expected)
+        assert [
+            fast_lane.waiting_rank(
+                session, user.id, line.representation_id, line.offer_id
+            )["position"]
+            for user in users
+        ] == [1, 2, 3]
+        # The ranks of every line of a user are the same as those of each line
+        for user in users:
+            ranks = [
+                (entry["representation"]["id"], entry["position"], entry["total"])
+                for entry in fast_lane.user_participations(session, user.id)
+                if entry["wait_list"]
+            ]
+            assert ranks == [
+                (inventory.representation_id, rank["position"], rank["total"])
+                for inventory in (line, other_line)
+                if (
+                    rank := fast_lane.waiting_rank(
+                        session,
+                        user.id,
+                        inventory.representation_id,
+                        inventory.offer_id,
+                    )
+                )
+            ]
+
+
+@pytest.mark.parametrize("freed", [1, 2, 3, 5])
+def test_promote_waiting_matches_orm(
+    freed: int, test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        line = inventories[0]
+        # The second one asks for more than what is left after the first one
+        add_waiting_list(session, users, line, [1, 3, 1])
+        session.commit()
+        now = datetime(2025, 1, 2)
+        outcomes = []
+        for promote in (promote_waiting, fast_lane.promote_waiting):
+            left = promote(session, line.representation_id, line.offer_id, freed, now)
+            session.flush()
+            session.expire_all()
+            states = session.exec(
+                select(
+                    Participation.user_id,
+                    Participation.status,
+                    Participation.pending_at,
+                    Participation.version,
+                ).order_by(Participation.waiting_at)
+            ).all()
+            outcomes.append((left, states))
+            session.rollback()
+        assert outcomes[0] == outcomes[1]
+
+
+def test_promotion_follows_the_positions_on_ties(
+    test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        line = inventories[0]
+        add_waiting_list(session, users, line, [1, 1, 1])
+        # Everyone joined the waiting list at the same time
+        for participation in session.exec(select(Participation)).all():
+            participation.waiting_at = datetime(2025, 1, 1)
+        session.commit()
+        first = next(
+            user.id
+            for user in users
+            if fast_lane.waiting_rank(
+                session, user.id, line.representation_id, line.offer_id
+            )["position"]
+            == 1
+        )
+        for promote in (promote_waiting, fast_lane.promote_waiting):
+            promote(
+                session, line.representation_id, line.offer_id, 1, datetime(2025, 1, 2)
+            )
+            session.flush()
+            promoted = session.exec(
+                select(Participation.user_id).where(
+                    Participation.status == ParticipationStatus.PENDING
+                )
+            ).all()
+            assert promoted == [first]
+            session.rollback()
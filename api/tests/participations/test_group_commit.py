@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+import config
+from common.db.group_commit import GroupCommitWriter
+from common.metrics import metrics
+from events.models import Inventory
+from participations.models import Participation, ParticipationStatus
+from tests.utils import session_add
+from users.models import User
+
+
+@pytest.fixture
+def writer(monkeypatch: pytest.MonkeyPatch) -> GroupCommitWriter:
+    metrics.reset()
+    writer = GroupCommitWriter(config.engine, max_batch=64, max_delay=0.2)
+    monkeypatch.setattr("participations.routes.group_writer", writer)
+    return writer
+
+
+def post_all(client: TestClient, path: str, payloads: list[dict]) -> list:
+    with ThreadPoolExecutor(max_workers=len(payloads)) as pool:
+        return list(pool.map(lambda payload: client.post(path, json=payload), payloads))
+
+
+@pytest.mark.usefixtures("inventories", "writer")
+def test_group_committed_joins(
+    client: TestClient, test_engine: Engine, users: list[User]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, users)
+        user_ids = [str(user.id) for user in users]
+    line = {"representation_id": "rep_001", "offer_id": "off_001", "quantity": 1}
+    payloads = [{"user_id": user_id, **line} for user_id in user_ids]
+    # The duplicate fails without failing the rest of its batch
+    payloads.append(payloads[0])
+    responses = post_all(client, "/participations/join-waiting-list", payloads)
+    codes = sorted(response.status_code for response in responses)
+    assert codes == [201, 201, 201, 500]
+    assert {
+        response.json()["user"]["id"]
+        for response in responses
+        if response.status_code == 201
+    } == set(user_ids)
+    assert metrics.get("group_commit.writes") == 3
+    assert metrics.get("group_commit.batches") < 3
+    with Session(test_engine) as session:
+        statuses = session.exec(select(Participation.status)).all()
+    assert statuses == [ParticipationStatus.WAIT_LIST] * 3
+
+
+@pytest.mark.usefixtures("inventories", "writer")
+def test_group_committed_joins_share_the_stock(
+    client: TestClient, test_engine: Engine, users: list[User]
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, users)
+        user_ids = [str(user.id) for user in users]
+    line = {"representation_id": "rep_003", "offer_id": "off_003", "quantity": 3}
+    payloads = [{"user_id": user_id, **line} for user_id in user_ids[:2]]
+    responses = post_all(client, "/participations/join-event", payloads)
+    assert sorted(response.status_code for response in responses) == [201, 500]
+    with Session(test_engine) as session:
+        inventory = session.exec(
+            select(Inventory).where(Inventory.representation_id == "rep_003")
+        ).one()
+    assert inventory.available_stock == 2
@@ -0,0 +1,100 @@
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import Session, func, select
+
+from events.models import Inventory, Offer, Representation
+from participations.models import Participation, ParticipationStatus
+from tests.utils import post_all, session_add
+from users.models import User
+
+WORKERS = 4
+USERS_PER_WORKER = 10
+STOCK = 20
+
+
+@pytest.fixture
+def pool() -> ProcessPoolExecutor:
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=context) as pool:
+        yield pool
+
+
+def run_workers(pool: ProcessPoolExecutor, path: str, payloads: list[dict]) -> Counter:
+    chunks = [payloads[i::WORKERS] for i in range(WORKERS)]
+    results = pool.map(post_all, [path] * WORKERS, chunks)
+    return Counter(code for codes in results for code in codes)
+
+
+def test_concurrent_workers_never_oversell(
+    pool: ProcessPoolExecutor,
+    test_engine: Engine,
+    offers: list[Offer],
+    representations: list[Representation],
+    inventories: list[Inventory],
+) -> None:
+    with Session(test_engine) as session:
+        users = [
+            User(
+                email=f"stress{i}@test.com",
+                firstname=f"Stress{i}",
+                lastname="Test",
+                birthdate=datetime(1994, 1, 1),
+                address="test",
+            )
+            for i in range(WORKERS * USERS_PER_WORKER)
+        ]
+        session.add_all(users)
+        session_add(session, [*offers, *representations, *inventories])
+        inventory = inventories[2]
+        inventory.available_stock = STOCK
+        session.add(inventory)
+        session.commit()
+        user_ids = [user.id for user in users]
+        line = {"offer_id": offers[2].id, "representation_id": representations[2].id}
+        payloads = [{"user_id": user_id, "quantity": 1, **line} for user_id in user_ids]
+
+        # Every worker tries to buy at the same time
+        codes = run_workers(pool, "/participations/join-event", payloads)
+        assert codes == {201: STOCK, 500: len(users) - STOCK}
+        session.refresh(inventory)
+        assert inventory.available_stock == 0
+        confirmed = session.exec(
+            select(func.sum(Participation.quantity)).where(
+                Participation.status == ParticipationStatus.CONFIRMED
+            )
+        ).one()
+        assert confirmed == STOCK
+
+        # The ones who did not get a ticket join the waiting list, then half of
+        # the buyers cancel concurrently, each cancellation promotes exactly one
+        # participation of the waiting list
+        confirmed_ids = session.exec(
+            select(Participation.user_id).where(
+                Participation.status == ParticipationStatus.CONFIRMED
+            )
+        ).all()
+        waiting_payloads = [
+            {"user_id": user_id, "quantity": 1, **line}
+            for user_id in user_ids
+            if user_id not in confirmed_ids
+        ]
+        codes = run_workers(pool, "/participations/join-waiting-list", waiting_payloads)
+        assert codes == {201: len(waiting_payloads)}
+        cancel_payloads = [
+            {"user_id": user_id, **line} for user_id in confirmed_ids[: STOCK // 2]
+        ]
+        codes = run_workers(pool, "/participations/cancel", cancel_payloads)
+        assert codes == {200: len(cancel_payloads)}
+        session.refresh(inventory)
+        assert inventory.available_stock == 0
+        participations = session.exec(select(Participation)).all()
+        assert sum(p.confirmed for p in participations) == STOCK // 2
+        assert sum(p.pending for p in participations) == STOCK // 2
+        assert sum(p.wait_list for p in participations) == (
+            len(waiting_payloads) - STOCK // 2
+        )
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+import participations.routes
+from common.metrics import metrics
+from events.models import Inventory
+from participations import notifications
+from participations.models import Participation, ParticipationStatus
+from participations.notifications import FileTransport, NotificationDispatcher
+from tests.utils import session_add
+from users.models import User
+
+
+class SlowTransport(FileTransport):
+    async def send(self, messages: list[dict]) -> None:
+        await asyncio.sleep(1)
+        await super().send(messages)
+
+
+class FlakyTransport(FileTransport):
+    def __init__(self, path: str, failures: int):
+        super().__init__(path)
+        self.failures = failures
+
+    async def send(self, messages: list[dict]) -> None:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("SMTP server unavailable")
+        await super().send(messages)
+
+
+def start_dispatcher(
+    monkeypatch: pytest.MonkeyPatch, transport: FileTransport, **options
+) -> NotificationDispatcher:
+    options = {
+        "max_queue": 100,
+        "batch_size": 10,
+        "max_delay": 0.01,
+        "concurrency": 2,
+        "max_retries": 2,
+        "backoff": 0.01,
+        **options,
+    }
+    dispatcher = NotificationDispatcher(transport, **options)
+    monkeypatch.setattr(notifications, "dispatcher", dispatcher)
+    return dispatcher
+
+
+def read_messages(path) -> list[dict]:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture
+def waiting_line(
+    test_engine: Engine, users: list[User], inventories: list[Inventory]
+) -> dict:
+    """
+    A sold out line: the first user cancels 2 places, the others wait for one
+    """
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        line = {
+            "representation_id": inventories[0].representation_id,
+            "offer_id": inventories[0].offer_id,
+        }
+        session.add(
+            Participation(
+                user_id=users[0].id,
+                status=ParticipationStatus.CONFIRMED,
+                confirmed_at=datetime(2025, 1, 1),
+                quantity=2,
+                **line,
+            )
+        )
+        for hour, user in enumerate(users[1:]):
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    status=ParticipationStatus.WAIT_LIST,
+                    waiting_at=datetime(2025, 1, 1, hour),
+                    quantity=1,
+                    **line,
+                )
+            )
+        session.commit()
+        return {
+            "cancel": {"user_id": users[0].id, **line},
+            "promoted": sorted(user.email for user in users[1:]),
+        }
+
+
+@pytest.mark.parametrize("fast_lane", [True, False])
+def test_promoted_users_notified_after_cancel(
+    fast_lane: bool,
+    client: TestClient,
+    waiting_line: dict,
+    tmp_path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(participations.routes, "FAST_LANE", fast_lane)
+    path = tmp_path / "messages.ndjson"
+    dispatcher = start_dispatcher(monkeypatch, FileTransport(str(path)))
+    sent = metrics.get("notifications.sent")
+    response = client.post("/participations/cancel", json=waiting_line["cancel"])
+    assert response.status_code == 200
+    dispatcher.flush(timeout=10)
+    messages = read_messages(path)
+    assert sorted(message["to"] for message in messages) == waiting_line["promoted"]
+    assert all("Confirm your participation" in message["body"] for message in messages)
+    assert metrics.get("notifications.sent") - sent == 2
+    dispatcher.shutdown(timeout=10)
+
+
+def test_cancel_does_not_wait_for_notifications(
+    client: TestClient, waiting_line: dict, tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "messages.ndjson"
+    dispatcher = start_dispatcher(monkeypatch, SlowTransport(str(path)))
+    start = time.perf_counter()
+    response = client.post("/participations/cancel", json=waiting_line["cancel"])
+    assert response.status_code == 200
+    assert time.perf_counter() - start < 0.5
+    assert read_messages(path) == []
+    dispatcher.flush(timeout=10)
+    assert len(read_messages(path)) == 2
+    dispatcher.shutdown(timeout=10)
+
+
+def test_failed_batches_retried(
+    client: TestClient, waiting_line: dict, tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "messages.ndjson"
+    dispatcher = start_dispatcher(monkeypatch, FlakyTransport(str(path), failures=2))
+    retries = metrics.get("notifications.retries")
+    client.post("/participations/cancel", json=waiting_line["cancel"])
+    dispatcher.flush(timeout=10)
+    assert len(read_messages(path)) == 2
+    assert metrics.get("notifications.retries") - retries == 2
+    dispatcher.shutdown(timeout=10)
+
+
+def test_rolled_back_promotions_not_notified(
+    test_engine: Engine, waiting_line: dict, tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "messages.ndjson"
+    dispatcher = start_dispatcher(monkeypatch, FileTransport(str(path)))
+    with Session(test_engine) as session:
+        notifications.promoted(session, [1, 2])
+        session.rollback()
+        session.commit()
+    dispatcher.flush(timeout=10)
+    assert read_messages(path) == []
+
+
+def test_savepoint_rollback_keeps_the_promotions(
+    test_engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    submitted = []
+
+    class RecordingDispatcher:
+        def submit(self, engine: Engine, participation_ids: list[int]) -> None:
+            submitted.append(participation_ids)
+
+    monkeypatch.setattr(notifications, "dispatcher", RecordingDispatcher())
+    with Session(test_engine) as session:
+        notifications.promoted(session, [1, 2])
+        session.begin_nested().rollback()
+        session.commit()
+    assert submitted == [[1, 2]]
+
+
+def test_queue_bounded(tmp_path, test_engine: Engine, monkeypatch) -> None:
+    dispatcher = start_dispatcher(
+        monkeypatch, FileTransport(str(tmp_path / "messages.ndjson")), max_queue=2
+    )
+    dropped = metrics.get("notifications.dropped")
+    # Queued at once, before the dispatcher takes any
+    dispatcher.submit(test_engine, [1, 2, 3, 4, 5])
+    dispatcher.flush(timeout=10)
+    assert metrics.get("notifications.dropped") - dropped == 3
+    dispatcher.shutdown(timeout=10)
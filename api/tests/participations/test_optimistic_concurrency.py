@@ -0,0 +1,116 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import Session
+
+from common.db import utils
+from common.db.utils import conflict_rates, retry_on_conflict
+from common.metrics import metrics
+from events.models import Inventory, Offer, Representation
+from tests.utils import session_add
+from users.models import User
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "OPTIMISTIC_BACKOFF", 0)
+    metrics.reset()
+
+
+def test_retry_on_conflict_until_success() -> None:
+    calls = []
+
+    @retry_on_conflict
+    def route(session: FakeSession) -> str:
+        calls.append(session)
+        if len(calls) < 3:
+            raise StaleDataError("stale")
+        return "ok"
+
+    session = FakeSession()
+    assert route(session=session) == "ok"
+    assert session.rollbacks == 2
+    assert conflict_rates()["route"] == {
+        "attempts": 3,
+        "conflicts": 2,
+        "retries": 2,
+        "conflict_rate": 2 / 3,
+        "retry_rate": 2,
+    }
+
+
+def test_retry_on_conflict_is_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "OPTIMISTIC_RETRIES", 2)
+
+    @retry_on_conflict
+    def route(session: FakeSession) -> None:
+        raise StaleDataError("stale")
+
+    session = FakeSession()
+    with pytest.raises(HTTPException) as error:
+        route(session=session)
+    assert error.value.status_code == 409
+    assert session.rollbacks == 3
+    assert metrics.snapshot("optimistic.route") == {
+        "optimistic.route.attempts": 3,
+        "optimistic.route.conflicts": 3,
+        "optimistic.route.failures": 1,
+        "optimistic.route.retries": 2,
+    }
+
+
+@pytest.mark.usefixtures("inventories")
+def test_stale_inventory_write_is_detected(test_engine: Engine) -> None:
+    with Session(test_engine) as session1, Session(test_engine) as session2:
+        inventory1 = session1.get(Inventory, "inv_003")
+        inventory2 = session2.get(Inventory, "inv_003")
+        assert inventory1.version == inventory2.version == 1
+        inventory1.available_stock -= 1
+        session1.commit()
+        assert inventory1.version == 2
+        # The second session still holds version 1
+        inventory2.available_stock -= 1
+        with pytest.raises(StaleDataError):
+            session2.commit()
+
+
+def test_join_event_bumps_versions_and_metrics(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    offers: list[Offer],
+    representations: list[Representation],
+    inventories: list[Inventory],
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *offers, *representations, *inventories])
+        inventory = inventories[2]
+        response = client.post(
+            "/participations/join-event",
+            json={
+                "user_id": users[0].id,
+                "offer_id": offers[2].id,
+                "representation_id": representations[2].id,
+                "quantity": 1,
+            },
+        )
+        assert response.status_code == 201
+        assert "version" not in response.json()
+        session.refresh(inventory)
+        assert inventory.version == 2
+        response = client.get("/metrics")
+        assert response.json()["optimistic_concurrency"]["join_event"] == {
+            "attempts": 1,
+            "conflict_rate": 0,
+            "retry_rate": 0,
+        }
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+import common.dependencies
+import participations.routes
+from events.models import Inventory
+from participations import outbox
+from participations.models import (
+    OutboxOffset,
+    ParticipationOutbox,
+    ParticipationStatus,
+)
+from tests.utils import session_add
+from users.models import User
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch: pytest.MonkeyPatch) -> dict:
+    monkeypatch.setattr(common.dependencies, "ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"X-Admin-Token": ADMIN_TOKEN}
+
+
+def add_entry(session: Session, created_at: datetime, **values) -> None:
+    session.add(
+        ParticipationOutbox(
+            participation_id=1,
+            user_id="00000000-0000-0000-0000-000000000000",
+            representation_id="rep_001",
+            offer_id="off_001",
+            quantity=1,
+            to_status=ParticipationStatus.CONFIRMED,
+            reason="join_event",
+            created_at=created_at,
+            **values,
+        )
+    )
+
+
+@pytest.mark.parametrize("fast_lane", [True, False])
+def test_transitions_written_to_outbox(
+    fast_lane: bool,
+    client: TestClient,
+    admin: dict,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(participations.routes, "FAST_LANE", fast_lane)
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        user_ids = [user.id for user in users]
+        line = {
+            "representation_id": inventories[1].representation_id,
+            "offer_id": inventories[1].offer_id,
+        }
+    user1, user2, user3 = user_ids
+    for route, user_id, quantity in (
+        ("join-event", user1, 2),
+        # Not enough stock left, nothing is written
+        ("join-event", user2, 1),
+        ("join-waiting-list", user2, 1),
+        ("join-waiting-list", user3, 1),
+        ("leave-waiting-list", user3, None),
+        # Promotes the second user
+        ("cancel", user1, None),
+        ("confirm", user2, None),
+    ):
+        payload = {"user_id": user_id, **line}
+        if quantity is not None:
+            payload["quantity"] = quantity
+        client.post(f"/participations/{route}", json=payload)
+    response = client.get("/participations/outbox", headers=admin)
+    assert response.status_code == 200
+    entries = response.json()["entries"]
+    assert [
+        (entry["user_id"], entry["from_status"], entry["to_status"], entry["reason"])
+        for entry in entries
+    ] == [
+        (user1, None, "confirmed", "join_event"),
+        (user2, None, "wait_list", "join_waiting_list"),
+        (user3, None, "wait_list", "join_waiting_list"),
+        (user3, "wait_list", None, "leave_waiting_list"),
+        (user1, "confirmed", None, "cancel"),
+        (user2, "wait_list", "pending", "promotion"),
+        (user2, "pending", "confirmed", "confirm"),
+    ]
+    assert [entry["id"] for entry in entries] == sorted(
+        entry["id"] for entry in entries
+    )
+    assert response.json()["position"] == entries[-1]["id"]
+    assert client.get("/participations/outbox").status_code == 403
+
+
+def test_outbox_consumer_offsets(
+    client: TestClient, admin: dict, test_engine: Engine
+) -> None:
+    with Session(test_engine) as session:
+        for _ in range(3):
+            add_entry(session, datetime.now())
+        session.commit()
+        first_id = session.exec(select(ParticipationOutbox.id)).first()
+    url = "/participations/outbox"
+    response = client.get(url, params={"consumer": "mails", "limit": 2}, headers=admin)
+    position = response.json()["position"]
+    assert position == first_id + 1
+    response = client.put(
+        f"{url}/offsets/mails", json={"position": position}, headers=admin
+    )
+    assert response.json() == {"consumer": "mails", "position": position}
+    # An offset never moves back
+    response = client.put(f"{url}/offsets/mails", json={"position": 0}, headers=admin)
+    assert response.json()["position"] == position
+    entries = client.get(url, params={"consumer": "mails"}, headers=admin).json()
+    assert [entry["id"] for entry in entries["entries"]] == [first_id + 2]
+    # Another consumer reads from the start
+    entries = client.get(url, params={"consumer": "analytics"}, headers=admin).json()
+    assert len(entries["entries"]) == 3
+
+
+def test_tail_commits_offsets_and_waits_for_gaps(test_engine: Engine) -> None:
+    with Session(test_engine) as session:
+        add_entry(session, datetime.now() - timedelta(minutes=1))
+        session.commit()
+        first_id = session.exec(select(ParticipationOutbox.id)).one()
+        # A recent entry after a missing id, whose transaction may not be
+        # committed yet
+        add_entry(session, datetime.now(), id=first_id + 2)
+        session.commit()
+        assert [entry["id"] for entry in outbox.read_batch(session, 0)] == [first_id]
+        # Taken as rolled back once the grace is over
+        assert [
+            entry["id"] for entry in outbox.read_batch(session, 0, gap_grace=0)
+        ] == [first_id, first_id + 2]
+
+    batches = outbox.tail(test_engine, "cache", batch_size=10)
+    assert [entry["id"] for entry in next(batches)] == [first_id]
+    with Session(test_engine) as session:
+        # Committed once the consumer asks for the next batch
+        assert session.get(OutboxOffset, "cache") is None
+        assert list(batches) == []
+        assert outbox.get_offset(session, "cache") == first_id
@@ -0,0 +1,139 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from sqlmodel import Session
+
+from config import engine
+from events.models import Inventory, Offer, Representation
+from tests.utils import session_add
+from users.models import User
+
+
+@contextmanager
+def recorded_statements() -> list[str]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def reads_before_write(statements: list[str]) -> list[str]:
+    reads = []
+    for statement in statements:
+        if statement.startswith(("INSERT", "UPDATE")):
+            break
+        if statement.startswith("SELECT"):
+            reads.append(statement)
+    return reads
+
+
+@pytest.mark.parametrize(
+    "path, line",
+    [("/participations/join-event", 2), ("/participations/join-waiting-list", 0)],
+)
+def test_join_reads_once_before_writing(
+    path: str,
+    line: int,
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    offers: list[Offer],
+    representations: list[Representation],
+    inventories: list[Inventory],
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *offers, *representations, *inventories])
+        inventory = inventories[line]
+        payload = {
+            "user_id": users[0].id,
+            "offer_id": inventory.offer_id,
+            "representation_id": inventory.representation_id,
+            "quantity": 1,
+        }
+    with recorded_statements() as statements:
+        response = client.post(path, json=payload)
+    assert response.status_code == 201
+    assert len(reads_before_write(statements)) == 1
+
+
+@pytest.mark.usefixtures("inventories")
+def test_join_offer_not_sold_for_representation(
+    client: TestClient,
+    users: list[User],
+    offers: list[Offer],
+    representations: list[Representation],
+    test_engine: Engine,
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *offers, *representations])
+        # The offer and the representation exist, but no inventory links them
+        response = client.post(
+            "/participations/join-event",
+            json={
+                "user_id": users[0].id,
+                "offer_id": offers[1].id,
+                "representation_id": representations[0].id,
+                "quantity": 1,
+            },
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == (
+            "The requested item is not available for this representation"
+        )
+        # The offer and the representation are not part of the same event
+        response = client.post(
+            "/participations/join-event",
+            json={
+                "user_id": users[0].id,
+                "offer_id": offers[2].id,
+                "representation_id": representations[0].id,
+                "quantity": 1,
+            },
+        )
+        assert response.status_code == 500
+        assert response.json()["detail"] == (
+            "The requested offer does not apply to the requested representation, "
+            "they are not part of the same event"
+        )
+
+
+def test_join_reuses_compiled_check(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        inventory = inventories[2]
+        line = {
+            "offer_id": inventory.offer_id,
+            "representation_id": inventory.representation_id,
+        }
+        user_ids = [user.id for user in users[:2]]
+    cache_hits = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if "already_participating" in statement:
+            cache_hits.append(context.cache_hit == context.dialect.CACHE_HIT)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for user_id in user_ids:
+            response = client.post(
+                "/participations/join-event",
+                json={"user_id": user_id, "quantity": 1, **line},
+            )
+            assert response.status_code == 201
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    # The check of the second join is not compiled again, whoever joins
+    assert cache_hits[-1]
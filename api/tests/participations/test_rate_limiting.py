@@ -0,0 +1,196 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common.ratelimit import (
+    AdmissionController,
+    Bucket,
+    MemoryBucketStore,
+    RateLimiter,
+    SharedBucketStore,
+    admission_controller,
+    rate_limiter,
+)
+from common.metrics import metrics
+
+USER1 = "8c3f51c2-4a4e-4a55-9a51-1f0bd6d44d01"
+USER2 = "8c3f51c2-4a4e-4a55-9a51-1f0bd6d44d02"
+
+
+def rank_request(client: TestClient, user_id: str):
+    return client.post(
+        "/participations/check-waiting-status",
+        json={
+            "user_id": user_id,
+            "representation_id": "rep_001",
+            "offer_id": "off_001",
+        },
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> None:
+    metrics.reset()
+
+
+def test_token_buckets() -> None:
+    limiter = RateLimiter(
+        MemoryBucketStore(), user_rate=1, user_burst=2, ip_rate=100, ip_burst=100
+    )
+    assert limiter.check("1.2.3.4", "user1") == 0
+    assert limiter.check("1.2.3.4", "user1") == 0
+    assert 0 < limiter.check("1.2.3.4", "user1") <= 1
+    assert limiter.check("1.2.3.4", "user2") == 0
+
+
+def test_rejected_request_takes_no_token() -> None:
+    limiter = RateLimiter(
+        MemoryBucketStore(), user_rate=0.01, user_burst=1, ip_rate=0.01, ip_burst=2
+    )
+    assert limiter.check("1.2.3.4", "user1") == 0
+    # Rejected by the bucket of the user, the one of the IP is left untouched
+    assert limiter.check("1.2.3.4", "user1") > 0
+    assert limiter.check("1.2.3.4", "user2") == 0
+    assert limiter.check("1.2.3.4", "user3") > 0
+
+
+def test_shared_buckets_are_shared_between_instances(tmp_path) -> None:
+    path = str(tmp_path / "buckets")
+    worker1 = SharedBucketStore(path)
+    worker2 = SharedBucketStore(path)
+    assert worker1.take([("user:1", 0.1, 2)]) == 0
+    assert worker2.take([("user:1", 0.1, 2)]) == 0
+    assert worker1.take([("user:1", 0.1, 2)]) > 9
+    assert worker2.take([("user:2", 0.1, 2)]) == 0
+
+
+def test_locked_shared_store_fails_open(tmp_path) -> None:
+    path = str(tmp_path / "buckets")
+    store = SharedBucketStore(path, timeout=0.1)
+    # Another worker holds the lock of the file
+    holder = sqlite3.connect(path)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.perf_counter()
+        assert store.take([("user:1", 0.1, 1)]) == 0
+        assert time.perf_counter() - start < 1
+    finally:
+        holder.rollback()
+        holder.close()
+    assert metrics.get("ratelimit.store_timeouts") == 1
+    assert store.take([("user:1", 0.1, 1)]) == 0
+    assert store.take([("user:1", 0.1, 1)]) > 0
+
+
+def test_blocking_store_taken_off_the_event_loop() -> None:
+    class SlowStore(MemoryBucketStore):
+        blocking = True
+
+        def take(self, buckets: list[Bucket]) -> float:
+            time.sleep(0.2)
+            return super().take(buckets)
+
+    limiter = RateLimiter(
+        SlowStore(), user_rate=1, user_burst=2, ip_rate=100, ip_burst=100
+    )
+
+    async def check_while_ticking() -> int:
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        assert await limiter.check_async("1.2.3.4", "user1") == 0
+        ticker.cancel()
+        return ticks
+
+    # The loop kept running while the tokens were taken
+    assert asyncio.run(check_while_ticking()) > 10
+
+
+def test_rate_limited_per_user(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rate_limiter, "user_burst", 2)
+    monkeypatch.setattr(rate_limiter, "user_rate", 0.01)
+    # Not in the waiting list, but allowed to ask
+    assert rank_request(client, USER1).status_code == 404
+    assert rank_request(client, USER1).status_code == 404
+    response = rank_request(client, USER1)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert rank_request(client, USER2).status_code == 404
+    assert metrics.get("ratelimit.rejected") == 1
+
+
+def test_rate_limited_per_ip(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rate_limiter, "ip_burst", 2)
+    monkeypatch.setattr(rate_limiter, "ip_rate", 0.01)
+    assert rank_request(client, USER1).status_code == 404
+    assert rank_request(client, USER2).status_code == 404
+    assert rank_request(client, USER2).status_code == 429
+
+
+def test_invalid_body_left_to_the_route(client: TestClient) -> None:
+    response = client.post(
+        "/participations/join-event",
+        content=b"not json",
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 422
+
+
+def test_invalid_line_left_to_the_route(client: TestClient) -> None:
+    response = client.post(
+        "/participations/cancel",
+        json={
+            "user_id": USER1,
+            "representation_id": ["rep_001"],
+            "offer_id": "off_001",
+        },
+    )
+    assert response.status_code == 422
+
+
+def test_admission_control(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(admission_controller, "max_in_flight", 1)
+    payload = {
+        "user_id": USER1,
+        "representation_id": "rep_001",
+        "offer_id": "off_001",
+        "quantity": 1,
+    }
+    line = ("rep_001", "off_001")
+    # A request is being processed on the line
+    assert admission_controller.enter(line)
+    try:
+        response = client.post("/participations/join-event", json=payload)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        other_line = {**payload, "offer_id": "off_002"}
+        response = client.post("/participations/join-event", json=other_line)
+        assert response.status_code == 404
+    finally:
+        admission_controller.leave(line)
+    response = client.post("/participations/join-event", json=payload)
+    assert response.status_code == 404
+    assert admission_controller.in_flight(line) == 0
+    assert metrics.get("admission.rejected") == 1
+
+
+def test_admission_controller_capacity() -> None:
+    admission = AdmissionController(max_in_flight=2, retry_after=1)
+    assert admission.enter(("rep", "off"))
+    assert admission.enter(("rep", "off"))
+    assert not admission.enter(("rep", "off"))
+    admission.leave(("rep", "off"))
+    assert admission.enter(("rep", "off"))
@@ -0,0 +1,168 @@
+import time
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, create_engine
+
+import common.dependencies
+from common.db.models import Heartbeat
+from common.db.replica import ReplicaRouter, sync_replica
+from common.metrics import metrics
+from config import engine
+from events.models import Offer, Representation
+from participations.models import Participation, ParticipationStatus
+from tests.utils import session_add
+from users.models import User
+
+
+@pytest.fixture
+def replica_path(tmp_path) -> str:
+    return str(tmp_path / "replica")
+
+
+@pytest.fixture
+def replica(replica_path: str, monkeypatch: pytest.MonkeyPatch) -> ReplicaRouter:
+    router = ReplicaRouter(
+        engine,
+        create_engine(f"sqlite:///{replica_path}"),
+        max_lag=60,
+        check_interval=0,
+    )
+    monkeypatch.setattr(common.dependencies, "get_replica_router", lambda: router)
+    metrics.reset()
+    return router
+
+
+@pytest.fixture
+def line_ids(
+    test_engine: Engine,
+    users: list[User],
+    representations: list[Representation],
+    offers: list[Offer],
+) -> tuple[list[str], str, str]:
+    with Session(test_engine) as session:
+        session_add(session, [*users, representations[0], offers[0]])
+        return [user.id for user in users], representations[0].id, offers[0].id
+
+
+def join_waiting_list(
+    test_engine: Engine, user_id: str, line: tuple[str, str], waiting_at: datetime
+) -> None:
+    representation_id, offer_id = line
+    with Session(test_engine) as session:
+        session.add(
+            Participation(
+                user_id=user_id,
+                offer_id=offer_id,
+                representation_id=representation_id,
+                status=ParticipationStatus.WAIT_LIST,
+                waiting_at=waiting_at,
+                quantity=1,
+            )
+        )
+        session.commit()
+
+
+def check_rank(
+    client: TestClient, user_id: str, line: tuple[str, str]
+) -> tuple[int, int]:
+    representation_id, offer_id = line
+    response = client.post(
+        "/participations/check-waiting-status",
+        json={
+            "user_id": user_id,
+            "representation_id": representation_id,
+            "offer_id": offer_id,
+        },
+    )
+    assert response.status_code == 200
+    return response.json()["position"], response.json()["total"]
+
+
+def test_rank_is_read_on_fresh_replica(
+    client: TestClient,
+    test_engine: Engine,
+    line_ids: tuple[list[str], str, str],
+    replica: ReplicaRouter,
+    replica_path: str,
+) -> None:
+    (user1, user2, _), *line = line_ids
+    join_waiting_list(test_engine, user1, line, datetime(2025, 1, 2))
+    sync_replica(engine, replica_path)
+    assert replica.lag() is None
+    replica.measure()
+    # Not synced yet, the rank read on the replica misses it
+    join_waiting_list(test_engine, user2, line, datetime(2025, 1, 1))
+    assert check_rank(client, user1, line) == (1, 1)
+    assert metrics.get("replica.reads") == 1
+    sync_replica(engine, replica_path)
+    assert check_rank(client, user1, line) == (2, 2)
+
+
+def test_rank_falls_back_to_primary_when_replica_lags(
+    client: TestClient,
+    test_engine: Engine,
+    line_ids: tuple[list[str], str, str],
+    replica: ReplicaRouter,
+    replica_path: str,
+) -> None:
+    (user1, user2, _), *line = line_ids
+    join_waiting_list(test_engine, user1, line, datetime(2025, 1, 2))
+    sync_replica(engine, replica_path)
+    replica.measure()
+    join_waiting_list(test_engine, user2, line, datetime(2025, 1, 1))
+    replica.max_lag = 0
+    assert check_rank(client, user1, line) == (2, 2)
+    assert metrics.get("replica.fallbacks") == 1
+    assert metrics.get("replica.reads") == 0
+
+
+def test_unreachable_replica_falls_back_to_primary(
+    client: TestClient,
+    test_engine: Engine,
+    line_ids: tuple[list[str], str, str],
+    replica: ReplicaRouter,
+) -> None:
+    (user1, *_), *line = line_ids
+    join_waiting_list(test_engine, user1, line, datetime(2025, 1, 2))
+    # The replica was never synced, it has no heartbeat table
+    assert replica.measure() is None
+    assert replica.lag() is None
+    assert check_rank(client, user1, line) == (1, 1)
+    assert metrics.get("replica.fallbacks") == 1
+
+
+def test_lag_measured_in_the_background(
+    replica: ReplicaRouter, replica_path: str
+) -> None:
+    sync_replica(engine, replica_path)
+    replica.check_interval = 0.05
+    replica.start()
+    try:
+        deadline = time.monotonic() + 5
+        while replica.lag() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        lag = replica.lag()
+        assert lag is not None
+    finally:
+        replica.shutdown(timeout=5)
+    # The last measure ages while the replica is not synced
+    time.sleep(0.05)
+    assert replica.lag() > lag
+
+
+def test_one_heartbeat_per_interval(replica: ReplicaRouter, replica_path: str) -> None:
+    sync_replica(engine, replica_path)
+    workers = [
+        ReplicaRouter(engine, replica.replica, max_lag=60, check_interval=60)
+        for _ in range(3)
+    ]
+    with Session(engine) as session:
+        beat_at = session.get(Heartbeat, 1).beat_at
+    for worker in workers:
+        assert worker.measure() is not None
+    # Written by sync_replica less than an interval ago, no worker writes it
+    with Session(engine) as session:
+        assert session.get(Heartbeat, 1).beat_at == beat_at
@@ -8,7 +8,7 @@ from sqlalchemy.exc import NoResultFound
 from sqlmodel import Session, select
 
 from events.models import Offer, Representation, Inventory
-from participations.models import Participation
+from participations.models import Participation, ParticipationStatus
 from tests.utils import session_add
 from users.models import User
 
@@ -46,6 +46,7 @@ def test_join_waiting_list_ok(
             "quantity": 1,
             "confirmed_at": None,
             "pending_at": None,
+            "pending_expires_at": None,
             "waiting_at": datetime(2025, 1, 1).isoformat(),
             "user": {
                 "id": str(user.id),
@@ -140,7 +141,7 @@ def test_join_participation_already_exists(
             user_id=user.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            confirmed=True,
+            status=ParticipationStatus.CONFIRMED,
             quantity=1,
         )
         session.add(participation)
@@ -294,7 +295,7 @@ def test_leave_waiting_list_ok(
             user_id=user.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime.now(),
             quantity=1,
         )
@@ -319,7 +320,7 @@ def test_leave_waiting_list_ok(
                     Participation.user_id == user.id,
                     Participation.offer_id == offer.id,
                     Participation.representation_id == representation.id,
-                    Participation.wait_list == True,
+                    Participation.status == ParticipationStatus.WAIT_LIST,
                 )
             ).one()
 
@@ -354,7 +355,7 @@ def test_leave_waiting_list_not_in_list(
             user_id=user.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            confirmed=True,
+            status=ParticipationStatus.CONFIRMED,
             confirmed_at=datetime.now(),
             quantity=1,
         )
@@ -392,7 +393,7 @@ def test_check_waiting_status(
             user_id=user1.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            confirmed=True,
+            status=ParticipationStatus.CONFIRMED,
             confirmed_at=datetime(2025, 1, 1),
             quantity=1,
         )
@@ -400,7 +401,7 @@ def test_check_waiting_status(
             user_id=user2.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime(2025, 1, 2),
             quantity=1,
         )
@@ -408,7 +409,7 @@ def test_check_waiting_status(
             user_id=user3.id,
             offer_id=offer.id,
             representation_id=representation.id,
-            wait_list=True,
+            status=ParticipationStatus.WAIT_LIST,
             waiting_at=datetime(2025, 1, 2, 10),
             quantity=1,
         )
@@ -0,0 +1,64 @@
+import os
+import shutil
+import socket
+import subprocess
+
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import SQLModel, create_engine, text
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """
+    Url of a PostgreSQL database: the one given by TEST_POSTGRES_URL if set (for
+    an instance started by the test harness), else a temporary cluster created
+    with the initdb and pg_ctl found in PG_BIN or in the PATH
+    """
+    pytest.importorskip("psycopg")
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if url:
+        yield url
+        return
+    pg_bin = os.environ.get("PG_BIN", "")
+    initdb = shutil.which("initdb", path=pg_bin or None)
+    pg_ctl = shutil.which("pg_ctl", path=pg_bin or None)
+    if not initdb or not pg_ctl:
+        pytest.skip("No PostgreSQL server available, set TEST_POSTGRES_URL or PG_BIN")
+    if os.geteuid() == 0:
+        pytest.skip("PostgreSQL clusters cannot be run as root, set TEST_POSTGRES_URL")
+    data = tmp_path_factory.mktemp("postgres")
+    port = free_port()
+    subprocess.run(
+        [initdb, "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [pg_ctl, "-D", data, "-o", f"-p {port} -k {data}", "-l", data / "log"]
+        + ["-w", "start"],
+        check=True,
+        capture_output=True,
+    )
+    yield f"postgresql+psycopg://postgres@127.0.0.1:{port}/postgres"
+    subprocess.run([pg_ctl, "-D", data, "-m", "fast", "stop"], capture_output=True)
+
+
+@pytest.fixture
+def pg_engine(postgres_url: str) -> Engine:
+    engine = create_engine(postgres_url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    with engine.begin() as connection:
+        tables = ", ".join(
+            f'"{table.name}"' for table in SQLModel.metadata.sorted_tables
+        )
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    engine.dispose()
@@ -0,0 +1,150 @@
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Engine, inspect
+from sqlmodel import Session, select
+
+from benchmarks.utils import seed_line
+from common.db.dialects import DialectQueries
+from events.models import Inventory
+from participations import fast_lane
+from participations.archive import archive_finished
+from participations.models import Participation, ParticipationStatus
+from tests.utils import post_all
+
+UNIQUE_LINE = ["user_id", "representation_id", "offer_id"]
+
+
+def waiting(user_id: str, line: tuple[str, str], hour: int) -> dict:
+    representation_id, offer_id = line
+    return {
+        "user_id": user_id,
+        "representation_id": representation_id,
+        "offer_id": offer_id,
+        "status": ParticipationStatus.WAIT_LIST,
+        "waiting_at": datetime(2025, 1, 1, hour),
+        "quantity": 1,
+    }
+
+
+def test_user_ids_are_native_uuids(pg_engine: Engine) -> None:
+    inspector = inspect(pg_engine)
+    columns = {column["name"]: column for column in inspector.get_columns("user")}
+    assert str(columns["id"]["type"]) == "UUID"
+    columns = {c["name"]: c for c in inspector.get_columns("participation")}
+    assert str(columns["user_id"]["type"]) == "UUID"
+
+
+def test_insert_ignoring_conflict(pg_engine: Engine) -> None:
+    user_ids, *line = seed_line(pg_engine, users=1, stock=0)
+    queries = DialectQueries(pg_engine.dialect.name)
+    with Session(pg_engine) as session:
+        values = waiting(user_ids[0], line, 1)
+        participation = queries.insert_ignoring_conflict(
+            session, Participation, values, UNIQUE_LINE
+        )
+        assert participation.id is not None
+        assert participation.user_id == user_ids[0]
+        session.commit()
+        assert (
+            queries.insert_ignoring_conflict(
+                session, Participation, values, UNIQUE_LINE
+            )
+            is None
+        )
+        session.commit()
+        assert len(session.exec(select(Participation)).all()) == 1
+
+
+def test_lock_first_skips_locked_rows(pg_engine: Engine) -> None:
+    user_ids, *line = seed_line(pg_engine, users=2, stock=0)
+    queries = DialectQueries(pg_engine.dialect.name)
+    with Session(pg_engine) as session:
+        session.add_all(
+            [
+                Participation(**waiting(user_ids[0], line, 1)),
+                Participation(**waiting(user_ids[1], line, 2)),
+            ]
+        )
+        session.commit()
+    query = queries.lock_first(select(Participation).order_by(Participation.waiting_at))
+    with Session(pg_engine) as session1, Session(pg_engine) as session2:
+        first = session1.exec(query).first()
+        assert first.user_id == user_ids[0]
+        # The first of the waiting list is being promoted by session1
+        second = session2.exec(query).first()
+        assert second.user_id == user_ids[1]
+
+
+def test_fast_lane_on_postgres(pg_engine: Engine) -> None:
+    user_ids, *line = seed_line(pg_engine, users=3, stock=0)
+    with Session(pg_engine) as session:
+        session.add_all(
+            [
+                Participation(**waiting(user_id, line, hour))
+                for hour, user_id in enumerate(user_ids)
+            ]
+        )
+        session.commit()
+        rank = fast_lane.waiting_rank(session, user_ids[1], *line)
+        assert (rank["user"]["id"], rank["position"], rank["total"]) == (
+            user_ids[1],
+            2,
+            3,
+        )
+        (participation,) = fast_lane.user_participations(session, user_ids[1])
+        assert (participation["position"], participation["total"]) == (2, 3)
+        assert fast_lane.promote_waiting(session, *line, 2, datetime(2025, 1, 2)) == 0
+        session.commit()
+        statuses = session.exec(
+            select(Participation.status).order_by(Participation.waiting_at)
+        ).all()
+        assert statuses == [
+            ParticipationStatus.PENDING,
+            ParticipationStatus.PENDING,
+            ParticipationStatus.WAIT_LIST,
+        ]
+
+
+def test_archive_on_postgres(pg_engine: Engine) -> None:
+    start = datetime(2025, 3, 1, 20)
+    user_ids, *line = seed_line(pg_engine, users=3, stock=0, start=start)
+    with Session(pg_engine) as session:
+        session.add_all(
+            [Participation(**waiting(user_id, line, 1)) for user_id in user_ids]
+        )
+        session.commit()
+    report = archive_finished(pg_engine, datetime(2025, 4, 1), batch_size=2)
+    assert report["archived"] == 3
+    assert report["periods"] == {"2025-03": 3}
+    with Session(pg_engine) as session:
+        assert session.exec(select(Participation)).all() == []
+
+
+def test_concurrent_workers_on_postgres(
+    pg_engine: Engine, postgres_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stock = 10
+    user_ids, representation_id, offer_id = seed_line(pg_engine, 20, stock)
+    payloads = [
+        {
+            "user_id": user_id,
+            "representation_id": representation_id,
+            "offer_id": offer_id,
+            "quantity": 1,
+        }
+        for user_id in user_ids
+    ]
+    # The workers import the app configured for the PostgreSQL database
+    monkeypatch.setenv("DB_URL", postgres_url)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=4, mp_context=context) as pool:
+        chunks = [payloads[i::4] for i in range(4)]
+        results = pool.map(post_all, ["/participations/join-event"] * 4, chunks)
+        codes = Counter(code for codes in results for code in codes)
+    assert codes == {201: stock, 500: len(user_ids) - stock}
+    with Session(pg_engine) as session:
+        assert session.exec(select(Inventory.available_stock)).one() == 0
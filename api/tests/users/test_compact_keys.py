@@ -0,0 +1,31 @@
+from uuid import uuid4
+
+from sqlalchemy import Column, MetaData, Table, text
+from sqlmodel import create_engine, select
+
+from common.db.models import UUIDString
+
+
+def test_compact_uuid_is_stored_as_16_bytes() -> None:
+    engine = create_engine("sqlite://")
+    table = Table("account", MetaData(), Column("id", UUIDString(compact=True)))
+    table.create(engine)
+    user_id = str(uuid4())
+    with engine.begin() as connection:
+        connection.execute(table.insert().values(id=user_id))
+        stored = connection.execute(text("SELECT typeof(id), length(id) FROM account"))
+        assert stored.one() == ("blob", 16)
+        assert connection.scalar(select(table.c.id)) == user_id
+        query = select(table.c.id).where(table.c.id == user_id)
+        assert connection.scalar(query) == user_id
+
+
+def test_uuid_is_stored_as_string_by_default() -> None:
+    engine = create_engine("sqlite://")
+    table = Table("account", MetaData(), Column("id", UUIDString()))
+    table.create(engine)
+    user_id = str(uuid4())
+    with engine.begin() as connection:
+        connection.execute(table.insert().values(id=user_id))
+        stored = connection.execute(text("SELECT id FROM account"))
+        assert stored.scalar() == user_id
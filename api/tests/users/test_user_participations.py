@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from sqlmodel import Session
+
+from config import engine
+from events.models import Inventory
+from participations.models import Participation, ParticipationStatus
+from tests.utils import session_add
+from users.models import User
+
+
+def test_user_participations(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, [*users, *inventories])
+        user1, user2, user3 = users
+        full_line, open_line, other_line = inventories
+        for hour, user in enumerate([user2, user1, user3]):
+            session.add(
+                Participation(
+                    user_id=user.id,
+                    representation_id=full_line.representation_id,
+                    offer_id=full_line.offer_id,
+                    status=ParticipationStatus.WAIT_LIST,
+                    waiting_at=datetime(2025, 1, 1, hour),
+                    quantity=1,
+                )
+            )
+        session.add(
+            Participation(
+                user_id=user1.id,
+                representation_id=open_line.representation_id,
+                offer_id=open_line.offer_id,
+                status=ParticipationStatus.PENDING,
+                pending_at=datetime(2025, 1, 2),
+                quantity=2,
+            )
+        )
+        session.add(
+            Participation(
+                user_id=user1.id,
+                representation_id=other_line.representation_id,
+                offer_id=other_line.offer_id,
+                status=ParticipationStatus.CONFIRMED,
+                confirmed_at=datetime(2025, 1, 3),
+                quantity=1,
+            )
+        )
+        session.commit()
+        user_id = str(user1.id)
+        first_user_id = str(user2.id)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"/users/{user_id}/participations")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # The user, then every participation with the ranks
+    assert len(statements) == 2
+    participations = response.json()
+    assert [
+        (
+            entry["representation"]["id"],
+            entry["offer"]["id"],
+            entry["confirmed"],
+            entry["pending"],
+            entry["wait_list"],
+            entry["position"],
+            entry["total"],
+        )
+        for entry in participations
+    ] == [
+        ("rep_001", "off_001", False, False, True, 2, 3),
+        ("rep_002", "off_001", False, True, False, None, None),
+        ("rep_003", "off_003", True, False, False, None, None),
+    ]
+    assert participations[0]["representation"]["event"]["id"] == "ev_001"
+    assert participations[0]["offer"]["type"] == {"label": "ticket"}
+    assert participations[1]["quantity"] == 2
+    assert participations[1]["pending_at"] == "2025-01-02T00:00:00"
+    response = client.get(f"/users/{first_user_id}/participations")
+    assert [entry["position"] for entry in response.json()] == [1]
+
+
+def test_user_participations_unknown_user(client: TestClient) -> None:
+    response = client.get("/users/00000000-0000-0000-0000-000000000000/participations")
+    assert response.status_code == 404
@@ -7,3 +7,17 @@ def session_add(session: Session, instances: SQLModel | list[SQLModel]) -> None:
         return
     for elt in instances:
         session.add(elt)
+
+
+def post_all(path: str, payloads: list[dict]) -> list[int]:
+    """
+    Post every payload to the given route of the app, meant to be run in a
+    separate process to emulate a worker of the multi-process server mode
+    :return: The status codes of the responses
+    """
+    from fastapi.testclient import TestClient
+
+    from app import app
+
+    client = TestClient(app)
+    return [client.post(path, json=payload).status_code for payload in payloads]
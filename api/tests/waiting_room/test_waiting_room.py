@@ -0,0 +1,256 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from sqlmodel import Session
+
+import config
+from events.models import Inventory
+from exceptions import BusyStoreError, InvalidTokenError, UnsetVarError
+from tests.utils import session_add
+from users.models import User
+from waiting_room.room import (
+    MemoryRoomStore,
+    RoomStore,
+    SharedRoomStore,
+    WaitingRoom,
+    build_waiting_room,
+    waiting_room,
+)
+from waiting_room.tokens import sign, verify
+
+USER1 = "8c3f51c2-4a4e-4a55-9a51-1f0bd6d44d01"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def build_room(
+    clock: FakeClock,
+    shard: int = 0,
+    shards: int = 1,
+    store: RoomStore | None = None,
+) -> WaitingRoom:
+    return WaitingRoom(
+        store or MemoryRoomStore(),
+        "secret",
+        shard,
+        shards,
+        rate=2,
+        min_rate=1,
+        max_rate=4,
+        target_latency=0.1,
+        token_ttl=60,
+        clock=clock,
+    )
+
+
+@pytest.fixture
+def room(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(waiting_room, "enabled", True)
+    monkeypatch.setattr(waiting_room, "clock", clock)
+    monkeypatch.setattr(waiting_room, "store", MemoryRoomStore())
+    return clock
+
+
+def test_tokens() -> None:
+    token = sign({"pos": 1}, b"secret", ttl=60)
+    assert verify(token, b"secret")["pos"] == 1
+    with pytest.raises(InvalidTokenError):
+        verify(token, b"other")
+    body, signature = token.split(".")
+    forged = sign({"pos": 0}, b"other", ttl=60).split(".")[0]
+    with pytest.raises(InvalidTokenError):
+        verify(f"{forged}.{signature}", b"secret")
+    with pytest.raises(InvalidTokenError):
+        verify("garbage", b"secret")
+    with pytest.raises(InvalidTokenError):
+        verify(sign({"pos": 1}, b"secret", ttl=-1), b"secret")
+
+
+def test_shards_interleave_positions() -> None:
+    clock = FakeClock()
+    shard0 = build_room(clock, shard=0, shards=2)
+    shard1 = build_room(clock, shard=1, shards=2)
+    assert shard0.enter("a", "rep_001")["position"] == 1
+    assert shard1.enter("b", "rep_001")["position"] == 2
+    assert shard0.enter("c", "rep_001")["position"] == 3
+    # Entering again keeps the position
+    assert shard0.enter("a", "rep_001")["position"] == 1
+    assert shard0.enter("d", "rep_002")["position"] == 1
+
+
+def test_admission_follows_the_rate() -> None:
+    clock = FakeClock()
+    room = build_room(clock)
+    tokens = [room.enter(str(user), "rep_001")["token"] for user in range(5)]
+    assert room.check_admission(tokens[0], "0", "rep_001") == pytest.approx(0.5)
+    clock.now = 1
+    assert room.check_admission(tokens[1], "1", "rep_001") == 0
+    assert room.check_admission(tokens[2], "2", "rep_001") == pytest.approx(0.5)
+    with pytest.raises(InvalidTokenError):
+        room.check_admission(tokens[2], "1", "rep_001")
+    with pytest.raises(InvalidTokenError):
+        room.check_admission(tokens[2], "2", "rep_002")
+    # Admissions do not pile up past the last position
+    clock.now = 30
+    assert room.status(tokens[4])["admitted_until"] == 5
+    sixth = room.enter("5", "rep_001")
+    assert sixth["admitted_until"] == 5
+    assert sixth["estimated_wait"] == pytest.approx(0.5)
+
+
+def test_workers_share_the_queues(tmp_path) -> None:
+    clock = FakeClock()
+    path = str(tmp_path / "waiting_room")
+    worker1 = build_room(clock, store=SharedRoomStore(path))
+    worker2 = build_room(clock, store=SharedRoomStore(path))
+    assert worker1.enter("a", "rep_001")["position"] == 1
+    assert worker2.enter("b", "rep_001")["position"] == 2
+    assert worker2.enter("a", "rep_001")["position"] == 1
+    token = worker1.enter("c", "rep_001")["token"]
+    clock.now = 1
+    # Admitted by the worker which did not issue the token
+    assert worker2.check_admission(token, "c", "rep_001") == pytest.approx(0.5)
+    clock.now = 1.5
+    assert worker2.check_admission(token, "c", "rep_001") == 0
+    worker2.record_latency("rep_001", 2)
+    assert worker1.admission_rate("rep_001") == pytest.approx(1.4)
+
+
+def test_locked_shared_store_is_busy(tmp_path) -> None:
+    path = str(tmp_path / "waiting_room")
+    room = build_room(FakeClock(), store=SharedRoomStore(path, timeout=0.1))
+    # Another worker holds the lock of the file
+    holder = sqlite3.connect(path)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(BusyStoreError):
+            room.enter("a", "rep_001")
+    finally:
+        holder.rollback()
+        holder.close()
+    assert room.enter("a", "rep_001")["position"] == 1
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_idle_queues_are_evicted(shared: bool, tmp_path) -> None:
+    clock = FakeClock()
+    store = (
+        SharedRoomStore(str(tmp_path / "waiting_room")) if shared else MemoryRoomStore()
+    )
+    room = build_room(clock, store=store)
+    room.enter("a", "rep_001")
+    room.enter("b", "rep_002")
+    clock.now = 40
+    room.enter("c", "rep_002")
+    # The tokens of rep_001 have all expired
+    clock.now = 90
+    assert room.enter("d", "rep_003")["position"] == 1
+    assert store.state("rep_001", clock.now) is None
+    assert store.state("rep_002", clock.now) is not None
+    assert room.enter("c", "rep_002")["position"] == 2
+
+
+def test_several_workers_require_a_shared_configuration(tmp_path) -> None:
+    path = str(tmp_path / "waiting_room")
+    with pytest.raises(UnsetVarError):
+        build_waiting_room(True, "memory", path, "secret", workers=2)
+    with pytest.raises(UnsetVarError):
+        build_waiting_room(True, "shared", path, "", workers=2)
+    assert build_waiting_room(True, "shared", path, "secret", workers=2).store.blocking
+    assert not build_waiting_room(True, "memory", path, "", workers=1).store.blocking
+
+
+def test_rate_adapts_to_the_latency() -> None:
+    room = build_room(FakeClock())
+    room.record_latency("rep_001", 0.01)
+    room.record_latency("rep_001", 0.01)
+    room.record_latency("rep_001", 0.01)
+    assert room.admission_rate("rep_001") == 4
+    room.record_latency("rep_001", 2)
+    assert room.admission_rate("rep_001") == pytest.approx(2.8)
+    for _ in range(10):
+        room.record_latency("rep_001", 2)
+    assert room.admission_rate("rep_001") == 1
+
+
+def test_enter_does_not_query_the_database(client: TestClient, room) -> None:
+    statements = []
+
+    def record(*args) -> None:
+        statements.append(args[2])
+
+    event.listen(config.engine, "before_cursor_execute", record)
+    try:
+        response = client.post(
+            "/waiting-room/enter",
+            json={"user_id": USER1, "representation_id": "rep_001"},
+        )
+        assert response.status_code == 201
+        assert response.json()["position"] == 1
+        response = client.post(
+            "/waiting-room/status", json={"token": response.json()["token"]}
+        )
+        assert response.status_code == 200
+        assert response.json()["estimated_wait"] == pytest.approx(1 / waiting_room.rate)
+    finally:
+        event.remove(config.engine, "before_cursor_execute", record)
+    assert statements == []
+    response = client.post("/waiting-room/status", json={"token": "garbage"})
+    assert response.status_code == 403
+
+
+def test_join_event_requires_admission(
+    client: TestClient,
+    test_engine: Engine,
+    users: list[User],
+    inventories: list[Inventory],
+    room,
+) -> None:
+    with Session(test_engine) as session:
+        session_add(session, users)
+        user_ids = [str(user.id) for user in users]
+    payload = {
+        "user_id": user_ids[0],
+        "representation_id": "rep_003",
+        "offer_id": "off_003",
+        "quantity": 1,
+    }
+    response = client.post("/participations/join-event", json=payload)
+    assert response.status_code == 403
+    tokens = [
+        client.post(
+            "/waiting-room/enter",
+            json={"user_id": user_id, "representation_id": "rep_003"},
+        ).json()["token"]
+        for user_id in user_ids
+    ]
+    response = client.post(
+        "/participations/join-event",
+        json=payload,
+        headers={"X-Waiting-Room-Token": tokens[1]},
+    )
+    assert response.status_code == 403
+    response = client.post(
+        "/participations/join-event",
+        json=payload,
+        headers={"X-Waiting-Room-Token": tokens[0]},
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    room.now = 1
+    response = client.post(
+        "/participations/join-event",
+        json=payload,
+        headers={"X-Waiting-Room-Token": tokens[0]},
+    )
+    assert response.status_code == 201
+    assert waiting_room.store._queues["rep_003"].latency is not None
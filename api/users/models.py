@@ -3,7 +3,8 @@ from uuid import uuid4
 
 from sqlmodel import Relationship, SQLModel, Field
 
-from common.db.models import Model
+from common.db.models import Model, UUIDString
+from config import COMPACT_KEYS
 
 
 def generate_uuid_str() -> str:
@@ -11,8 +12,13 @@ def generate_uuid_str() -> str:
 
 
 class User(SQLModel, table=True):
-    # I'd rather use UUID, but sqlite can't really manage UUIDs
-    id: str = Field(default_factory=generate_uuid_str, primary_key=True)
+    # Native UUID on PostgreSQL, but sqlite can't really manage UUIDs (see
+    # COMPACT_KEYS)
+    id: str = Field(
+        default_factory=generate_uuid_str,
+        primary_key=True,
+        sa_type=UUIDString(compact=COMPACT_KEYS),
+    )
     email: str = Field(max_length=255)
     firstname: str = Field(max_length=255)
     lastname: str = Field(max_length=255)
@@ -1,13 +1,34 @@
-from fastapi import APIRouter, Depends
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
-from common.dependencies import get_session
+from common.dependencies import get_read_session
+from participations import fast_lane
+from participations.serializers import UserParticipationSerializer
 from users.models import User
 
 router = APIRouter(prefix="/users")
 
 
 @router.get("/", response_model=list[User])
-def get_users(session: Session = Depends(get_session)):
+def get_users(session: Session = Depends(get_read_session)):
     results = session.exec(select(User)).all()
     return results
+
+
+@router.get(
+    "/{user_id}/participations", response_model=list[UserParticipationSerializer]
+)
+def get_user_participations(
+    user_id: UUID, session: Session = Depends(get_read_session)
+):
+    """
+    API route to list the confirmed, pending and waiting participations of a user,
+    with the rank of those on a waiting list. The ranks of every line are read
+    together (see fast_lane.user_participations), and tolerate staleness like
+    check-waiting-status
+    """
+    if session.get(User, str(user_id)) is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return fast_lane.user_participations(session, str(user_id))
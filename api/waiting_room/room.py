@@ -0,0 +1,639 @@
+"""
+Virtual waiting room in front of join-event.
+
+Arriving users get a position in the queue of a representation, in a signed
+token. The positions are admitted to join-event at a rate per representation,
+which adapts to the latency of join-event: it is decreased multiplicatively
+while the latency is above the target, and increased additively below it.
+
+Nothing is stored in the database. The queues are kept by a store: in memory for
+a single process, or in a SQLite file shared by the workers of an instance
+("shared"), so that every worker hands out positions from the same counter and
+admits them at the same pace. Each instance serves one shard of the positions
+(the n-th position handed out by shard k of N is n * N + k + 1), so the room
+scales by adding instances behind a load balancer.
+
+A queue is evicted once nobody entered it for the lifetime of a token: every
+token issued for it has expired, the representation is over or idle.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Callable
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+from common.metrics import metrics
+from common.ratelimit import buffer_body, run_blocking, too_many_requests
+from config import (
+    WAITING_ROOM_ENABLED,
+    WAITING_ROOM_MAX_RATE,
+    WAITING_ROOM_MIN_RATE,
+    WAITING_ROOM_RATE,
+    WAITING_ROOM_SECRET,
+    WAITING_ROOM_SHARD,
+    WAITING_ROOM_SHARDS,
+    WAITING_ROOM_SHARED_PATH,
+    WAITING_ROOM_STORE,
+    WAITING_ROOM_TARGET_LATENCY,
+    WAITING_ROOM_TOKEN_TTL,
+    WORKERS,
+)
+from exceptions import BusyStoreError, InvalidTokenError, UnsetVarError
+from waiting_room.tokens import sign, verify
+
+JOIN_EVENT_PATH = "/participations/join-event"
+TOKEN_HEADER = b"x-waiting-room-token"
+# Weight of the last measure in the moving average of the latency
+LATENCY_SMOOTHING = 0.2
+RATE_DECREASE = 0.7
+RATE_INCREASE = 1.0
+# Seconds between two evictions of the expired queues
+EVICTION_INTERVAL = 60
+
+
+class RepresentationQueue:
+    """
+    Queue of a representation, in one shard
+    """
+
+    def __init__(self, rate: float, now: float):
+        self.positions: dict[str, int] = {}
+        # Positions handed out by the shard
+        self.entered = 0
+        self.last_position = 0
+        self.admitted = 0.0
+        self.rate = rate
+        self.updated_at = now
+        self.latency: float | None = None
+        self.entered_at = now
+
+
+def admitted_until(queue: RepresentationQueue, now: float) -> float:
+    """
+    Get the last position admitted in a queue
+    """
+    # The admissions do not pile up while nobody is waiting
+    return min(
+        queue.admitted + queue.rate * (now - queue.updated_at), queue.last_position
+    )
+
+
+def enter_queue(queue: RepresentationQueue, now: float, shard: int, shards: int) -> int:
+    """
+    Hand out the next position of a queue
+    :return: The position
+    """
+    # The admissions until now are counted before the queue gets longer
+    queue.admitted = admitted_until(queue, now)
+    queue.updated_at = now
+    position = queue.entered * shards + shard + 1
+    queue.entered += 1
+    queue.last_position = position
+    return position
+
+
+def adapt(
+    queue: RepresentationQueue,
+    now: float,
+    seconds: float,
+    min_rate: float,
+    max_rate: float,
+    target_latency: float,
+) -> None:
+    """
+    Adapt the admission rate of a queue to the latency of a join
+    """
+    queue.admitted = admitted_until(queue, now)
+    queue.updated_at = now
+    queue.latency = (
+        seconds
+        if queue.latency is None
+        else LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * queue.latency
+    )
+    if queue.latency > target_latency:
+        queue.rate = max(min_rate, queue.rate * RATE_DECREASE)
+    else:
+        queue.rate = min(max_rate, queue.rate + RATE_INCREASE)
+
+
+class MemoryRoomStore:
+    """
+    Queues of the representations kept by this process only
+    """
+
+    # Never waits, it is used on the event loop
+    blocking = False
+
+    def __init__(self):
+        self._queues: dict[str, RepresentationQueue] = {}
+        self._lock = threading.Lock()
+
+    def enter(
+        self,
+        representation_id: str,
+        user_id: str,
+        now: float,
+        shard: int,
+        shards: int,
+        rate: float,
+    ) -> tuple[int, float, float]:
+        """
+        Give a position in the queue of a representation to a user, the same one if
+        the user already has one
+        :return: The position, the last admitted position and the rate
+        """
+        with self._lock:
+            queue = self._queues.get(representation_id)
+            if queue is None:
+                queue = RepresentationQueue(rate, now)
+                self._queues[representation_id] = queue
+            position = queue.positions.get(user_id)
+            if position is None:
+                position = enter_queue(queue, now, shard, shards)
+                queue.positions[user_id] = position
+            queue.entered_at = now
+            return position, admitted_until(queue, now), queue.rate
+
+    def state(self, representation_id: str, now: float) -> tuple[float, float] | None:
+        """
+        Get the last admitted position and the rate of the queue of a
+        representation, None if it has no queue
+        """
+        with self._lock:
+            queue = self._queues.get(representation_id)
+            if queue is None:
+                return None
+            return admitted_until(queue, now), queue.rate
+
+    def update(
+        self,
+        representation_id: str,
+        now: float,
+        rate: float,
+        change: Callable[[RepresentationQueue], None],
+    ) -> None:
+        """
+        Change the queue of a representation, created at a rate if it has none
+        """
+        with self._lock:
+            queue = self._queues.get(representation_id)
+            if queue is None:
+                queue = RepresentationQueue(rate, now)
+                self._queues[representation_id] = queue
+            change(queue)
+
+    def evict(self, before: float) -> int:
+        """
+        Drop the queues nobody entered since a time
+        :return: The number of queues dropped
+        """
+        with self._lock:
+            expired = [
+                representation_id
+                for representation_id, queue in self._queues.items()
+                if queue.entered_at < before
+            ]
+            for representation_id in expired:
+                del self._queues[representation_id]
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queues.clear()
+
+
+class SharedRoomStore:
+    """
+    Queues of the representations kept in a SQLite file, shared by every worker
+    process of the app
+    """
+
+    # Waits for the lock of the file, it is used in a thread
+    blocking = True
+    QUEUE_COLUMNS = (
+        "entered",
+        "last_position",
+        "admitted",
+        "rate",
+        "updated_at",
+        "latency",
+        "entered_at",
+    )
+
+    def __init__(self, path: str, timeout: float = 1.0):
+        """
+        :param path: Path of the SQLite file
+        :param timeout: Seconds the lock of the file is waited for
+        """
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS room_queue ("
+                "representation_id TEXT PRIMARY KEY, entered INTEGER NOT NULL, "
+                "last_position INTEGER NOT NULL, admitted REAL NOT NULL, "
+                "rate REAL NOT NULL, updated_at REAL NOT NULL, latency REAL, "
+                "entered_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_room_queue_entered_at "
+                "ON room_queue (entered_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS room_position ("
+                "representation_id TEXT NOT NULL, user_id TEXT NOT NULL, "
+                "position INTEGER NOT NULL, "
+                "PRIMARY KEY (representation_id, user_id))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _read(
+        self, connection: sqlite3.Connection, representation_id: str
+    ) -> RepresentationQueue | None:
+        row = connection.execute(
+            f"SELECT {', '.join(self.QUEUE_COLUMNS)} FROM room_queue "
+            "WHERE representation_id = ?",
+            (representation_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        queue = RepresentationQueue(0, 0)
+        for column, value in zip(self.QUEUE_COLUMNS, row):
+            setattr(queue, column, value)
+        return queue
+
+    def _write(
+        self,
+        connection: sqlite3.Connection,
+        representation_id: str,
+        queue: RepresentationQueue,
+    ) -> None:
+        connection.execute(
+            f"INSERT OR REPLACE INTO room_queue "
+            f"(representation_id, {', '.join(self.QUEUE_COLUMNS)}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                representation_id,
+                *(getattr(queue, column) for column in self.QUEUE_COLUMNS),
+            ),
+        )
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], object]):
+        connection = self._connection()
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                return work(connection)
+        except sqlite3.OperationalError as error:
+            if "database is locked" not in str(error):
+                raise
+            metrics.increment("waiting_room.store_timeouts")
+            raise BusyStoreError("The waiting room store is busy") from error
+
+    def enter(
+        self,
+        representation_id: str,
+        user_id: str,
+        now: float,
+        shard: int,
+        shards: int,
+        rate: float,
+    ) -> tuple[int, float, float]:
+        def work(connection: sqlite3.Connection) -> tuple[int, float, float]:
+            queue = self._read(connection, representation_id)
+            if queue is None:
+                queue = RepresentationQueue(rate, now)
+            row = connection.execute(
+                "SELECT position FROM room_position "
+                "WHERE representation_id = ? AND user_id = ?",
+                (representation_id, user_id),
+            ).fetchone()
+            if row is None:
+                position = enter_queue(queue, now, shard, shards)
+                connection.execute(
+                    "INSERT INTO room_position (representation_id, user_id, position) "
+                    "VALUES (?, ?, ?)",
+                    (representation_id, user_id, position),
+                )
+            else:
+                position = row[0]
+            queue.entered_at = now
+            self._write(connection, representation_id, queue)
+            return position, admitted_until(queue, now), queue.rate
+
+        return self._transaction(work)
+
+    def state(self, representation_id: str, now: float) -> tuple[float, float] | None:
+        try:
+            queue = self._read(self._connection(), representation_id)
+        except sqlite3.OperationalError as error:
+            metrics.increment("waiting_room.store_timeouts")
+            raise BusyStoreError("The waiting room store is busy") from error
+        if queue is None:
+            return None
+        return admitted_until(queue, now), queue.rate
+
+    def update(
+        self,
+        representation_id: str,
+        now: float,
+        rate: float,
+        change: Callable[[RepresentationQueue], None],
+    ) -> None:
+        def work(connection: sqlite3.Connection) -> None:
+            queue = self._read(connection, representation_id)
+            if queue is None:
+                queue = RepresentationQueue(rate, now)
+            change(queue)
+            self._write(connection, representation_id, queue)
+
+        self._transaction(work)
+
+    def evict(self, before: float) -> int:
+        def work(connection: sqlite3.Connection) -> int:
+            connection.execute(
+                "DELETE FROM room_position WHERE representation_id IN "
+                "(SELECT representation_id FROM room_queue WHERE entered_at < ?)",
+                (before,),
+            )
+            return connection.execute(
+                "DELETE FROM room_queue WHERE entered_at < ?", (before,)
+            ).rowcount
+
+        return self._transaction(work)
+
+    def clear(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM room_position")
+            connection.execute("DELETE FROM room_queue")
+
+
+RoomStore = MemoryRoomStore | SharedRoomStore
+
+
+class WaitingRoom:
+    def __init__(
+        self,
+        store: RoomStore,
+        secret: str,
+        shard: int,
+        shards: int,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        target_latency: float,
+        token_ttl: int,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.secret = secret.encode()
+        self.shard = shard
+        self.shards = shards
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.token_ttl = token_ttl
+        self.enabled = enabled
+        # Wall clock time, shared by the processes of a shared store
+        self.clock = clock
+        self._evicted_at: float | None = None
+
+    def _evict(self, now: float) -> None:
+        if self._evicted_at is not None and now - self._evicted_at < EVICTION_INTERVAL:
+            return
+        self._evicted_at = now
+        evicted = self.store.evict(now - self.token_ttl)
+        metrics.increment("waiting_room.evicted", evicted)
+
+    def ticket(self, token: str, position: int, representation_id: str) -> dict:
+        """
+        Describe the state of a position in the queue of a representation
+        :return: The token, the position, the last admitted position, and the
+        estimated seconds before the admission
+        """
+        state = self.store.state(representation_id, self.clock())
+        # The queue of a valid token is only evicted once the token expired
+        admitted, rate = state or (0.0, self.rate)
+        return {
+            "token": token,
+            "position": position,
+            "admitted_until": int(admitted),
+            "estimated_wait": max(position - admitted, 0) / rate,
+        }
+
+    def enter(self, user_id: str, representation_id: str) -> dict:
+        """
+        Give a position in the queue of a representation to a user, the same one if
+        the user already has one in this shard
+        :param user_id: The id of the user
+        :param representation_id: The id of the representation
+        :return: The ticket of the user, see ticket
+        :raise BusyStoreError: If the shared store could not be locked in time
+        """
+        now = self.clock()
+        self._evict(now)
+        position, admitted, rate = self.store.enter(
+            representation_id, user_id, now, self.shard, self.shards, self.rate
+        )
+        metrics.increment("waiting_room.entered")
+        token = sign(
+            {"user_id": user_id, "rep": representation_id, "pos": position},
+            self.secret,
+            self.token_ttl,
+        )
+        return {
+            "token": token,
+            "position": position,
+            "admitted_until": int(admitted),
+            "estimated_wait": max(position - admitted, 0) / rate,
+        }
+
+    def status(self, token: str) -> dict:
+        """
+        Get the ticket of a token
+        :raise InvalidTokenError: If the token was not issued by the room
+        """
+        payload = verify(token, self.secret)
+        return self.ticket(token, payload["pos"], payload["rep"])
+
+    def check_admission(
+        self, token: str | None, user_id: str | None, representation_id: str | None
+    ) -> float:
+        """
+        Check that a token admits a user to join a representation
+        :return: 0 if the user is admitted, else the estimated seconds to wait
+        :raise InvalidTokenError: If the token is missing, was not issued by the room
+        or was issued for another user or representation
+        """
+        if token is None:
+            raise InvalidTokenError("Missing token")
+        payload = verify(token, self.secret)
+        if payload["user_id"] != user_id or payload["rep"] != representation_id:
+            raise InvalidTokenError("Token issued for another participation")
+        ticket = self.ticket(token, payload["pos"], representation_id)
+        if ticket["position"] <= ticket["admitted_until"]:
+            return 0.0
+        return ticket["estimated_wait"]
+
+    def record_latency(self, representation_id: str, seconds: float) -> None:
+        """
+        Adapt the admission rate of a representation to the latency of a join
+        :param representation_id: The id of the representation
+        :param seconds: The time taken by the join
+        """
+        now = self.clock()
+        self.store.update(
+            representation_id,
+            now,
+            self.rate,
+            lambda queue: adapt(
+                queue,
+                now,
+                seconds,
+                self.min_rate,
+                self.max_rate,
+                self.target_latency,
+            ),
+        )
+
+    def admission_rate(self, representation_id: str) -> float:
+        state = self.store.state(representation_id, self.clock())
+        return self.rate if state is None else state[1]
+
+
+class WaitingRoomMiddleware:
+    """
+    ASGI middleware letting only the users admitted by the waiting room through
+    join-event, and measuring its latency
+    """
+
+    def __init__(self, app, room: WaitingRoom):
+        self.app = app
+        self.room = room
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            not self.room.enabled
+            or scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] != JOIN_EVENT_PATH
+        ):
+            await self.app(scope, receive, send)
+            return
+        body, receive = await buffer_body(receive)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            payload = {}
+        token = dict(scope["headers"]).get(TOKEN_HEADER)
+        representation_id = payload.get("representation_id")
+        blocking = self.room.store.blocking
+        try:
+            wait = await run_blocking(
+                blocking,
+                self.room.check_admission,
+                None if token is None else token.decode(),
+                str(UUID(str(payload.get("user_id")))),
+                representation_id,
+            )
+        except (InvalidTokenError, ValueError):
+            response = JSONResponse(
+                status_code=403,
+                content={"detail": "A valid waiting room token is required"},
+            )
+            await response(scope, receive, send)
+            return
+        except BusyStoreError:
+            response = too_many_requests("The waiting room is busy", 1)
+            await response(scope, receive, send)
+            return
+        if wait:
+            metrics.increment("waiting_room.early")
+            response = too_many_requests("You have not been admitted yet", wait)
+            await response(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            try:
+                await run_blocking(
+                    blocking,
+                    self.room.record_latency,
+                    representation_id,
+                    time.perf_counter() - start,
+                )
+            except BusyStoreError:
+                # The rate adapts on the next join
+                pass
+
+
+def build_waiting_room(
+    enabled: bool, kind: str, shared_path: str, secret: str, workers: int
+) -> WaitingRoom:
+    """
+    Build the waiting room described by the configuration
+    :param enabled: Whether join-event requires a token of the room
+    :param kind: Store of the queues, "memory" or "shared"
+    :param shared_path: Path of the SQLite file used by the shared store
+    :param secret: Key signing the tokens
+    :param workers: Number of worker processes of the app
+    :raise UnsetVarError: If the room is enabled for several workers without a
+    shared store or a configured secret
+    """
+    if enabled and workers > 1:
+        # Each worker would hand out and admit positions of its own, and sign
+        # with a key of its own
+        if kind != "shared":
+            raise UnsetVarError(
+                'WAITING_ROOM_STORE must be "shared" with several workers'
+            )
+        if not secret:
+            raise UnsetVarError("WAITING_ROOM_SECRET must be set with several workers")
+    store = SharedRoomStore(shared_path) if kind == "shared" else MemoryRoomStore()
+    return WaitingRoom(
+        store,
+        # Without a configured secret, the tokens are only valid in this process
+        secret or secrets.token_hex(32),
+        WAITING_ROOM_SHARD,
+        WAITING_ROOM_SHARDS,
+        WAITING_ROOM_RATE,
+        WAITING_ROOM_MIN_RATE,
+        WAITING_ROOM_MAX_RATE,
+        WAITING_ROOM_TARGET_LATENCY,
+        WAITING_ROOM_TOKEN_TTL,
+        enabled=enabled,
+    )
+
+
+waiting_room = build_waiting_room(
+    WAITING_ROOM_ENABLED,
+    WAITING_ROOM_STORE,
+    WAITING_ROOM_SHARED_PATH,
+    WAITING_ROOM_SECRET,
+    WORKERS,
+)
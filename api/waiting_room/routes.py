@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException
+
+from exceptions import BusyStoreError, InvalidTokenError
+from waiting_room.room import waiting_room
+from waiting_room.serializers import (
+    WaitingRoomEnterSerializer,
+    WaitingRoomStatusSerializer,
+    WaitingRoomTicketSerializer,
+)
+
+router = APIRouter(prefix="/waiting-room")
+
+
+@router.post("/enter", response_model=WaitingRoomTicketSerializer, status_code=201)
+def enter(data: WaitingRoomEnterSerializer):
+    """
+    API route to take a position in the waiting room of a representation. The token
+    returned must be sent in the X-Waiting-Room-Token header of join-event once the
+    position is admitted. The database is not queried.
+    """
+    try:
+        return waiting_room.enter(str(data.user_id), data.representation_id)
+    except BusyStoreError:
+        raise HTTPException(status_code=503, detail="The waiting room is busy")
+
+
+@router.post("/status", response_model=WaitingRoomTicketSerializer)
+def status(data: WaitingRoomStatusSerializer):
+    """
+    API route to check how far the waiting room of a representation is from
+    admitting a token
+    """
+    try:
+        return waiting_room.status(data.token)
+    except InvalidTokenError:
+        raise HTTPException(
+            status_code=403, detail="A valid waiting room token is required"
+        )
+    except BusyStoreError:
+        raise HTTPException(status_code=503, detail="The waiting room is busy")
@@ -0,0 +1,19 @@
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class WaitingRoomEnterSerializer(BaseModel):
+    user_id: UUID
+    representation_id: str
+
+
+class WaitingRoomStatusSerializer(BaseModel):
+    token: str
+
+
+class WaitingRoomTicketSerializer(BaseModel):
+    token: str
+    position: int
+    admitted_until: int
+    estimated_wait: float
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from exceptions import InvalidTokenError
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign(payload: dict, secret: bytes, ttl: int) -> str:
+    """
+    Build a token carrying a payload, signed with HMAC-SHA256
+    :param payload: JSON serializable content of the token
+    :param secret: The signing key
+    :param ttl: Seconds the token is valid for
+    :return: The token
+    """
+    body = _encode(json.dumps({**payload, "exp": int(time.time()) + ttl}).encode())
+    signature = hmac.new(secret, body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_encode(signature)}"
+
+
+def verify(token: str, secret: bytes) -> dict:
+    """
+    Check the signature and the expiry of a token
+    :param token: A token built by sign
+    :param secret: The signing key
+    :return: The payload of the token
+    :raise InvalidTokenError: If the token was not signed with the key, or expired
+    """
+    try:
+        body, signature = token.split(".")
+        expected = hmac.new(secret, body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_decode(signature), expected):
+            raise InvalidTokenError("Invalid signature")
+        payload = json.loads(_decode(body))
+    except (ValueError, TypeError) as err:
+        raise InvalidTokenError("Malformed token") from err
+    if payload.get("exp", 0) < time.time():
+        raise InvalidTokenError("Expired token")
+    return payload